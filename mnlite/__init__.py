@@ -4,6 +4,8 @@ import json
 import flask
 import flask_cors
 from mnlite import mnode
+from mnlite import inventory
+from mnlite import shaindex
 import opersist.utils
 
 def initialize_instance(instance_path):
@@ -82,11 +84,14 @@ def create_app(test_config=None):
                 node_info = mnode.getNode(mn_config["config"])
                 if node_info is not None:
                     mn_config["node_id"] = node_info["node"]["node_id"]
+                    mn_config["max_page_size"] = node_info.get(
+                        "max_page_size", mnode.PAGE_SIZE
+                    )
                     mn_config["persistence"] = mnode.getPersistence(abs_path, node_info)
-                    # The persistence layer is returned open and initialized
-                    # Close it since it will be used on a different thread
-                    # when services requests
-                    mn_config["persistence"].close()
+                    # The persistence layer is returned open and initialized.
+                    # Keep the engine for the life of the process and release
+                    # the session since requests are serviced on other threads.
+                    mn_config["persistence"].removeSession()
 
                     # db_engine, db_session = mnode.setupDB(mn_config["config"])
                     # mn_config["db_engine"] = db_engine
@@ -122,32 +127,14 @@ def create_app(test_config=None):
             return json.dumps(jobj, indent=2)
         return ""
 
+    app.config["inventory"] = inventory.Inventory(
+        app.config["m_nodes"],
+        refresh_interval=app.config.get("INVENTORY_REFRESH", 300),
+    )
+
     @app.route("/")
-    def inventory():
-        nodes = []
-        for mn_name, mn_config in app.config["m_nodes"].items():
-            node_info = mnode.getNode(mn_config["config"])
-            entry = {
-                    "name": mn_name,
-                    "node_id": mn_config["node_id"],
-                    "config": mn_config["config"],
-                    "sitemap": node_info["spider"]["sitemap_urls"][0],
-                    "oldest": "",
-                    "newest": "",
-                    "count": 0
-                }
-            op = None
-            try:
-                op = mn_config["persistence"]
-                op.open()
-                stats = op.basicStatsThings()
-                #entry["numrecords"] = op.countThings()
-                entry.update(stats)
-            except Exception as e:
-                app.logger.error(e)
-            finally:
-                op.close()
-            nodes.append(entry)
+    def inventoryPage():
+        nodes = app.config["inventory"].entries()
         return flask.render_template("index.html", nodes=nodes)
 
 
@@ -168,36 +155,33 @@ def create_app(test_config=None):
                 links.append((url, rule.endpoint))
         return "<pre>" + json.dumps(links, indent=2) + "</pre>"
 
+    app.config["sha256_index"] = shaindex.Sha256Index(
+        app.config["m_nodes"],
+        refresh_interval=app.config.get("SHA256_INDEX_REFRESH", 10),
+    )
+    app.config["sha256_index"].build()
+
     @app.route("/sha256/<sha_256>")
     def getItemBySha256(sha_256):
-        #def getPersistence(abs_path, node_config):
-        sha_256 = sha_256.replace("sha256:", "")
-        for mn_name, mn_config in app.config["m_nodes"].items():
-            op = None
-            app.logger.info("Item %s from %s", sha_256, mn_name)
-            try:
-                op = mn_config["persistence"]
-                op.open()
-                obj = op.getThingSha256(sha_256)
-                if obj is not None:
-                    response = flask.make_response(obj.content)
-                    response.mimetype = obj.media_type_name
-                    obj_path = op.contentAbsPath(obj.content)
-                    fldr = os.path.dirname(obj_path)
-                    fname = os.path.basename(obj_path)
-                    return flask.send_from_directory(
-                        fldr,
-                        fname,
-                        mimetype=obj.media_type_name,
-                        as_attachment=False,
-                        attachment_filename=obj.file_name,
-                        last_modified=obj.t_content_modified,
-                    )
-            except Exception as e:
-                app.logger.error(e)
-            finally:
-                if op is not None:
-                    op.close()
+        sha_256 = sha_256.replace("sha256:", "").lower()
+        mn_name = app.config["sha256_index"].lookup(sha_256)
+        if mn_name is None:
+            flask.abort(404)
+        app.logger.info("Item %s from %s", sha_256, mn_name)
+        op = None
+        try:
+            op = app.config["m_nodes"][mn_name]["persistence"]
+            op.open()
+            obj = op.getThingSha256(sha_256)
+            if obj is not None:
+                return mnode.sendBlob(
+                    op.contentAbsPath(obj.content), obj, immutable=True
+                )
+        except Exception as e:
+            app.logger.error(e)
+        finally:
+            if op is not None:
+                op.removeSession()
         flask.abort(404)
 
 
@@ -0,0 +1,123 @@
+"""
+Inventory of the member nodes served by the app for the "/" dashboard.
+
+Per node statistics are computed by a background thread and served from
+memory, so the dashboard does not query the node databases per request.
+A node whose statistics can not be computed keeps its last entry, marked
+stale with the error.
+"""
+
+import logging
+import threading
+import opersist.utils
+from mnlite import mnode
+
+
+class Inventory(object):
+
+    L = logging.getLogger("Inventory")
+
+    def __init__(self, m_nodes: dict, refresh_interval: float = 300.0):
+        """
+        Args:
+            m_nodes: The app m_nodes configuration, name -> mn_config
+            refresh_interval: Seconds between refreshes of the statistics
+        """
+        self._m_nodes = m_nodes
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stopped = threading.Event()
+
+    def _nodeEntry(self, mn_name, mn_config):
+        node_info = mnode.getNode(mn_config["config"])
+        entry = {
+            "name": mn_name,
+            "node_id": mn_config["node_id"],
+            "config": mn_config["config"],
+            "sitemap": node_info["spider"]["sitemap_urls"][0],
+            "oldest": "",
+            "newest": "",
+            "count": 0,
+            "updated": "",
+            "stale": False,
+            "error": None,
+        }
+        op = mn_config["persistence"]
+        if op is None:
+            return entry
+        try:
+            op.open()
+            entry.update(op.basicStatsThings())
+            entry["updated"] = opersist.utils.datetimeToJsonStr(opersist.utils.dtnow())
+        finally:
+            op.removeSession()
+        return entry
+
+    def _staleEntry(self, mn_name, mn_config, error):
+        """
+        The previous entry of a node marked stale, or an empty one if the
+        node has not been inventoried yet.
+        """
+        with self._lock:
+            entry = self._entries.get(mn_name)
+        if entry is None:
+            entry = {
+                "name": mn_name,
+                "node_id": mn_config.get("node_id"),
+                "config": mn_config.get("config"),
+                "sitemap": "",
+                "oldest": "",
+                "newest": "",
+                "count": 0,
+                "updated": "",
+            }
+        return dict(entry, stale=True, error=str(error))
+
+    def refresh(self):
+        """
+        Recompute the entries of all nodes.
+
+        A node that fails keeps its previous entry and update time, marked
+        stale with the error.
+        """
+        for mn_name, mn_config in self._m_nodes.items():
+            try:
+                entry = self._nodeEntry(mn_name, mn_config)
+            except Exception as e:
+                self.L.error("Inventory of %s failed: %s", mn_name, e)
+                entry = self._staleEntry(mn_name, mn_config, e)
+            with self._lock:
+                self._entries[mn_name] = entry
+
+    def _run(self):
+        while not self._stopped.wait(self.refresh_interval):
+            self.refresh()
+
+    def stop(self):
+        """
+        Stop the refresher thread after its current refresh.
+        """
+        self._stopped.set()
+
+    def entries(self):
+        """
+        Get the inventory entries, refreshing once if not yet available.
+
+        The refresher thread is started on first use rather than at app
+        creation so that it runs in each worker process.
+
+        Returns:
+            list of dict
+        """
+        if self._refresher is None:
+            with self._lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(
+                        target=self._run, name="InventoryRefresh", daemon=True
+                    )
+                    self._refresher.start()
+            self.refresh()
+        with self._lock:
+            return [self._entries[k] for k in self._m_nodes if k in self._entries]
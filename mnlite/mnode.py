@@ -1,19 +1,34 @@
 import os
 import re
+import copy
 import json
+import time
+import threading
+import base64
+import datetime
 import logging
+import urllib.parse
 import flask
+import werkzeug.wsgi
 import click
 import sqlalchemy
 import sqlalchemy.orm
 import opersist
 import opersist.utils
 import opersist.models
+import opersist.models.logentry
+import opersist.flob
 
 m_node = flask.Blueprint("m_node", __name__, template_folder="templates/mnode")
 
 XML_TYPE = "text/xml"
 PAGE_SIZE = 100
+# Cache lifetime of content that never changes for a URL
+IMMUTABLE_MAX_AGE = 31536000
+# Subject of requests, clients are not authenticated
+PUBLIC_SUBJECT = opersist.OPersist.PUBLIC_SUBJECT
+# Rows fetched from the database per round trip when streaming listings
+STREAM_BATCH_SIZE = 1000
 
 DEFAULT_NODE_CONFIG = {
     "node": {
@@ -37,6 +52,7 @@ DEFAULT_NODE_CONFIG = {
     "content_database": "sqlite:///content.db",
     "log_database": "sqlite:///eventlog.db",
     "data_folder": "data",
+    "max_page_size": PAGE_SIZE,
     "created": None,
     "default_submitter": None,
     "default_owner": None,
@@ -67,10 +83,58 @@ def getBaseUrlFromRequest():
     return base_url
 
 
+# Seconds between checks of node.json for changes
+NODE_CHECK_INTERVAL = 2.0
+_node_cache = {}
+_node_cache_lock = threading.Lock()
+
+
+def _cachedNode(config_path):
+    """
+    Get the cache entry of a node.json, reloaded when the file changes.
+
+    The modification time is checked at most every NODE_CHECK_INTERVAL
+    seconds.
+
+    Returns:
+        dict with the parsed "config" and "rendered" templates, or None
+    """
+    now = time.monotonic()
+    with _node_cache_lock:
+        entry = _node_cache.get(config_path)
+        if entry is not None and now - entry["checked"] < NODE_CHECK_INTERVAL:
+            return entry
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except FileNotFoundError:
+        reloadNode(config_path)
+        return None
+    if entry is None or entry["mtime"] != mtime:
+        with open(config_path, "r") as config_src:
+            config = json.load(config_src)
+        entry = {"mtime": mtime, "config": config, "rendered": {}}
+    entry["checked"] = now
+    with _node_cache_lock:
+        _node_cache[config_path] = entry
+    return entry
+
+
+def reloadNode(config_path=None):
+    """
+    Drop the cached node.json of config_path, or of all nodes if None.
+    """
+    with _node_cache_lock:
+        if config_path is None:
+            _node_cache.clear()
+        else:
+            _node_cache.pop(config_path, None)
+
+
 def getNode(config_path):
-    if not os.path.exists(config_path):
+    entry = _cachedNode(config_path)
+    if entry is None:
         return None
-    node_config = json.load(open(config_path, "r"))
+    node_config = copy.deepcopy(entry["config"])
     if node_config["node"].get("base_url", None) is None:
         try:
             node_config["node"]["base_url"] = getBaseUrlFromRequest()
@@ -79,9 +143,34 @@ def getNode(config_path):
     return node_config
 
 
+def renderNodeTemplate(template_name):
+    """
+    Render a template of the node document of the request, cached until
+    node.json changes.
+    """
+    config_path = flask.g.mn_config["config"]
+    entry = _cachedNode(config_path)
+    node = entry["config"]["node"]
+    base_url = node.get("base_url", None)
+    if base_url is None:
+        base_url = getBaseUrlFromRequest()
+    key = (template_name, base_url)
+    rendered = entry["rendered"].get(key)
+    if rendered is None:
+        node = getNode(config_path)["node"]
+        rendered = flask.render_template(
+            template_name, mnode=node, schedule=node["schedule"]
+        )
+        entry["rendered"][key] = rendered
+    return rendered
+
+
 def getPersistence(abs_path, node_config):
     op = opersist.OPersist(
-        abs_path, db_url=node_config["content_database"], config_file="node.json"
+        abs_path,
+        db_url=node_config["content_database"],
+        config_file="node.json",
+        engine_profile="serve",
     )
     op.open()
     return op
@@ -352,7 +441,10 @@ def mnodeBeforeRequest():
 @m_node.after_request
 def mnodeAfterRequest(response):
     """
-    Closes the persistence layer associated with this mnode request
+    Releases the persistence session associated with this mnode request.
+
+    The engine and connection pool of the node stay open for the life of
+    the process.
 
     Args:
         response: The response
@@ -364,12 +456,22 @@ def mnodeAfterRequest(response):
     L.debug("mnodeAfterRequest")
     if "op" in flask.g:
         try:
-            flask.g.op.close()
+            flask.g.op.removeSession()
         except Exception as e:
             L.error(e)
     return response
 
 
+@m_node.teardown_request
+def mnodeTeardownRequest(exception=None):
+    """
+    Ensures the session is released when a request fails before
+    mnodeAfterRequest is reached.
+    """
+    if exception is not None and "op" in flask.g:
+        flask.g.op.removeSession()
+
+
 def d1_exception(name, error_code, detail_code, description, pid=None, trace=None):
     # match = re.match(r"/(.*)/v2/", flask.request.url_rule.rule)
     # node_id = f"urn:node:{match.group(1)}"
@@ -427,11 +529,7 @@ def getCapabilitiesImpl():
     # mn_config = getMNodeConfig()
     L.debug("MN CONFIG = %s", flask.g.mn_config)
     try:
-        node = getNode(flask.g.mn_config["config"])["node"]
-        schedule = node["schedule"]
-        response = flask.make_response(
-            flask.render_template("node_template.xml", mnode=node, schedule=schedule)
-        )
+        response = flask.make_response(renderNodeTemplate("node_template.xml"))
         response.mimetype = XML_TYPE
         return response, 200
     except Exception as e:
@@ -465,7 +563,8 @@ def _page():
     identifier = flask.request.args.get("identifier", None)
     format_id = flask.request.args.get("formatId", None)
     replica_status = flask.request.args.get("replicaStatus", None)
-    
+    cursor = flask.request.args.get("cursor", None)
+
     _filter = {"field":None, "op": None, "val": None}
     _filter["field"] = flask.request.args.get("filters[0][field]", None)
     _filter["op"] = flask.request.args.get("filters[0][type]", None)
@@ -491,20 +590,12 @@ def _page():
     start = (page-1)*count
     if start < 0:
         start = 0
-    if count > PAGE_SIZE:
-        count = PAGE_SIZE
+    if count > maxPageSize():
+        count = maxPageSize()
 
-    columns = [
-        "identifier",
-        "checksum_md5",
-        "date_modified",
-        "size_bytes",
-        "format_id",
-        "source",
-    ]
     db = flask.g.op.getSession()
     olist = db.query(opersist.models.thing.Thing).options(
-        sqlalchemy.orm.load_only(*columns)
+        *opersist.models.thing.listingOptions()
     )
     if _filter["field"] is not None:
         identifier = _filter["val"]
@@ -523,12 +614,27 @@ def _page():
         olist = olist.filter(
             opersist.models.thing.Thing.format_id.like(format_id + "%")
         )
-    total_records = olist.count()
-    records = olist.order_by(opersist.models.thing.Thing.date_modified.desc())[
-        start : start + count
-    ]
+    if identifier is None:
+        total_records = flask.g.op.countThingsFiltered(
+            format_id=format_id, from_date=from_date, to_date=to_date
+        )
+    else:
+        total_records = olist.count()
+    olist = orderListing(olist)
+    if cursor is not None:
+        try:
+            records = seekListing(olist, cursor).limit(count).all()
+        except ValueError as e:
+            return d1_InvalidRequest(
+                detail_code=1540, description="cursor is not valid", trace=str(e)
+            )
+    else:
+        records = olist[start : start + count]
     last_page = total_records / count
-    return flask.jsonify({"last_page":last_page, "data":[r.asJsonDict() for r in records],"total_rows":total_records})
+    next_cursor = None
+    if count > 0 and len(records) == count:
+        next_cursor = encodeCursor(records[-1])
+    return flask.jsonify({"last_page":last_page, "data":[r.asJsonDict() for r in records],"total_rows":total_records, "next_cursor":next_cursor})
 
 
 
@@ -560,12 +666,47 @@ def getLogRecords():
     )
     event = flask.request.args.get("event", None)
     id_filter = flask.request.args.get("idFilter", None)
-    start = flask.request.args.get("start", None)
-    count = flask.request.args.get("count", None)
+    cursor = flask.request.args.get("cursor", None)
+    try:
+        start = int(flask.request.args.get("start", 0))
+        count = int(flask.request.args.get("count", PAGE_SIZE))
+        after_id = None if cursor is None else int(cursor)
+    except ValueError as e:
+        return d1_InvalidRequest(
+            detail_code=1480, description="start, count and cursor must be integer", trace=str(e)
+        )
     msg = f"getLogRecords: {from_date} {to_date} {event} {id_filter} {start} {count}"
     L.debug("params = %s", msg)
-    # TODO: implement getLogRecords
-    return d1_NotImplemented(description="getLogRecords", detail_code=1461, trace=msg)
+    event_log = flask.g.op.getEventLog()
+    if event_log is None:
+        return d1_NotImplemented(description="getLogRecords", detail_code=1461, trace=msg)
+    if start < 0:
+        start = 0
+    if count > maxPageSize():
+        count = maxPageSize()
+    total_records, records = event_log.getRecords(
+        from_date=from_date,
+        to_date=to_date,
+        event=event,
+        id_filter=id_filter,
+        start=start,
+        count=count,
+        after_id=after_id,
+    )
+    response = flask.make_response(
+        flask.render_template(
+            "logrecords_template.xml",
+            records_count=len(records),
+            records_start=start if after_id is None else 0,
+            records_total=total_records,
+            records=records,
+            node_id=flask.g.mn_config["node_id"],
+        )
+    )
+    response.mimetype = XML_TYPE
+    if count > 0 and len(records) == count:
+        response.headers["Link"] = f'<{nextPageUrl(str(records[-1].entry_id))}>; rel="next"'
+    return response
 
 
 @m_node.route(
@@ -579,11 +720,7 @@ def monitorPing():
     # return d1_NotImplemented(description="ping", detail_code=2041)
     L = flask.current_app.logger
     try:
-        node = getNode(flask.g.mn_config["config"])["node"]
-        schedule = node["schedule"]
-        response = flask.make_response(
-            flask.render_template("ping_template.html", mnode=node)
-        )
+        response = flask.make_response(renderNodeTemplate("ping_template.html"))
         return response, 200
     except Exception as e:
         return d1_ServiceFailure(detail_code=2042, description="ping", trace=e)
@@ -600,9 +737,295 @@ def monitorPing():
     ],
 )
 def describe(identifier):
-    # TODO: implement describe
+    """
+    MNRead.describe, system metadata summary of an object as HTTP headers.
+
+    Errors are reported in DataONE-Exception headers since HEAD responses
+    have no body.
+    """
     L = flask.current_app.logger
-    return d1_NotImplemented(description="describe", detail_code=1361, pid=identifier)
+    obj = flask.g.op.describeThing(identifier)
+    if obj is None:
+        response = flask.Response(status=404)
+        response.headers["DataONE-Exception-Name"] = "NotFound"
+        response.headers["DataONE-Exception-DetailCode"] = "1380"
+        response.headers["DataONE-Exception-Description"] = "Not found"
+        response.headers["DataONE-Exception-PID"] = identifier
+        return response
+    response = flask.Response(status=200, mimetype=obj.media_type_name)
+    response.headers["DataONE-formatId"] = (
+        obj.format_id if obj.format_id is not None else "application/octet-stream"
+    )
+    response.headers["DataONE-Checksum"] = f"MD5,{obj.checksum_md5}"
+    response.headers["DataONE-SerialVersion"] = str(
+        obj.serial_version if obj.serial_version is not None else 1
+    )
+    response.content_length = obj.size_bytes
+    response.last_modified = obj.date_modified
+    response.set_etag(obj.checksum_sha256)
+    return response
+
+
+def encodeCursor(record):
+    """
+    Opaque cursor for the listing position following record.
+    """
+    v = f"{record.date_modified.isoformat()}|{record.checksum_sha256}"
+    return base64.urlsafe_b64encode(v.encode("utf-8")).decode("ascii")
+
+
+def decodeCursor(cursor):
+    """
+    (date_modified, checksum_sha256) from a cursor, ValueError if not valid.
+    """
+    try:
+        v = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        date_modified, _, checksum_sha256 = v.partition("|")
+        return datetime.datetime.fromisoformat(date_modified), checksum_sha256
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def orderListing(olist):
+    """
+    Order a Thing query newest first, with checksum_sha256 as tie breaker
+    so that the order is stable and matches ix_thing_date_modified_sha256.
+    """
+    Thing = opersist.models.thing.Thing
+    return olist.order_by(Thing.date_modified.desc(), Thing.checksum_sha256.desc())
+
+
+def seekListing(olist, cursor):
+    """
+    Restrict an ordered Thing query to the records following cursor.
+    """
+    Thing = opersist.models.thing.Thing
+    date_modified, checksum_sha256 = decodeCursor(cursor)
+    return olist.filter(
+        sqlalchemy.or_(
+            Thing.date_modified < date_modified,
+            sqlalchemy.and_(
+                Thing.date_modified == date_modified,
+                Thing.checksum_sha256 < checksum_sha256,
+            ),
+        )
+    )
+
+
+def pageListing(olist, first, last):
+    """
+    Restrict an ordered Thing query to the records from first to last.
+
+    Args:
+        olist: Query ordered by orderListing
+        first: (date_modified, checksum_sha256) of the first record of the page
+        last: (date_modified, checksum_sha256) of the last record of the page
+    """
+    Thing = opersist.models.thing.Thing
+    return olist.filter(
+        sqlalchemy.or_(
+            Thing.date_modified < first[0],
+            sqlalchemy.and_(
+                Thing.date_modified == first[0],
+                Thing.checksum_sha256 <= first[1],
+            ),
+        ),
+        sqlalchemy.or_(
+            Thing.date_modified > last[0],
+            sqlalchemy.and_(
+                Thing.date_modified == last[0],
+                Thing.checksum_sha256 >= last[1],
+            ),
+        ),
+    )
+
+
+def nextPageUrl(cursor):
+    """
+    URL of the current request with start replaced by cursor.
+    """
+    args = flask.request.args.to_dict()
+    args.pop("start", None)
+    args.pop("page", None)
+    args["cursor"] = cursor
+    return f"{flask.request.base_url}?{urllib.parse.urlencode(args)}"
+
+
+def _utcNaive(dt):
+    if dt is None:
+        return None
+    if dt.tzinfo is not None and dt.tzinfo.utcoffset(dt) is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt.replace(microsecond=0)
+
+
+def notModified(etag, last_modified=None):
+    """
+    Check the conditional request headers against the validators of a
+    resource.
+
+    If-None-Match takes precedence over If-Modified-Since as in RFC 7232.
+
+    Args:
+        etag: Strong entity tag of the resource
+        last_modified: datetime the resource was last modified
+
+    Returns:
+        A 304 response if the client copy is current, otherwise None
+    """
+    request = flask.request
+    if request.if_none_match:
+        if not request.if_none_match.contains(etag):
+            return None
+    elif request.if_modified_since is None or last_modified is None:
+        return None
+    elif _utcNaive(last_modified) > _utcNaive(request.if_modified_since):
+        return None
+    return setValidators(flask.Response(status=304), etag, last_modified)
+
+
+def setValidators(response, etag, last_modified=None):
+    """
+    Set ETag and Last-Modified on response.
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def metaEtag(obj):
+    """
+    ETag for the system metadata of a Thing, changes with date_modified.
+
+    Unlike Last-Modified the full resolution of date_modified is kept, so
+    a change within the same second still yields a new ETag.
+    """
+    dt = obj.date_modified
+    if dt.tzinfo is not None and dt.tzinfo.utcoffset(dt) is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    stamp = dt.isoformat(timespec="microseconds").replace(":", "")
+    return f"{obj.checksum_sha256}-{stamp}"
+
+
+def sendBlob(obj_path, obj, as_attachment=False, immutable=False):
+    """
+    Response delivering the blob of a Thing without reading it in Python.
+
+    With X_ACCEL_REDIRECT set in the app config to the internal location
+    of the instance folder (e.g. "/_instance"), or with USE_X_SENDFILE, the
+    body is left for the fronting proxy to send. Otherwise the file is
+    handed to wsgi.file_wrapper, so servers supporting it use sendfile.
+    Range and conditional requests are honoured. Precompressed variants
+    of the blob are sent to clients accepting their encoding, except when
+    delivery is left to the proxy.
+
+    Args:
+        obj_path: Absolute path of the blob
+        obj: The Thing
+        as_attachment: Send Content-Disposition attachment
+        immutable: Content will never change for this URL
+
+    Returns:
+        Response
+    """
+    app = flask.current_app
+    response = app.response_class(mimetype=obj.media_type_name)
+    etag = obj.checksum_sha256
+    x_accel = app.config.get("X_ACCEL_REDIRECT")
+    if x_accel is not None:
+        rel_path = os.path.relpath(obj_path, app.instance_path)
+        response.headers["X-Accel-Redirect"] = urllib.parse.quote(
+            f"{x_accel.rstrip('/')}/{rel_path}"
+        )
+    elif app.config.get("USE_X_SENDFILE", False):
+        response.headers["X-Sendfile"] = obj_path
+    else:
+        content_path, encoding = negotiateEncoding(obj_path)
+        fsize = os.path.getsize(content_path)
+        response.response = werkzeug.wsgi.wrap_file(
+            flask.request.environ, open(content_path, "rb")
+        )
+        response.direct_passthrough = True
+        response.content_length = fsize
+        response.accept_ranges = "bytes"
+        response.vary.add("Accept-Encoding")
+        if encoding is not None:
+            response.content_encoding = encoding
+            etag = f"{obj.checksum_sha256}-{encoding}"
+    if as_attachment and obj.file_name is not None:
+        try:
+            obj.file_name.encode("ascii")
+            response.headers.set("Content-Disposition", "attachment", filename=obj.file_name)
+        except UnicodeEncodeError:
+            response.headers.set(
+                "Content-Disposition",
+                "attachment",
+                filename=obj.file_name.encode("ascii", "ignore").decode(),
+                **{"filename*": f"UTF-8''{urllib.parse.quote(obj.file_name)}"},
+            )
+    setValidators(response, etag, obj.t_content_modified)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    if response.direct_passthrough:
+        return response.make_conditional(
+            flask.request.environ, accept_ranges=True, complete_length=fsize
+        )
+    return response.make_conditional(flask.request.environ)
+
+
+def negotiateEncoding(obj_path):
+    """
+    Choose the stored variant of a blob to send for the Accept-Encoding
+    of the request.
+
+    Returns:
+        path of the file to send, Content-Encoding or None for the original
+    """
+    accept = flask.request.accept_encodings
+    for encoding in opersist.flob.ENCODING_SUFFIXES:
+        if accept.quality(encoding) > 0:
+            variant_path = opersist.flob.variantPath(obj_path, encoding)
+            if os.path.exists(variant_path):
+                return variant_path, encoding
+    return obj_path, None
+
+
+def logRead(identifier):
+    """
+    Record a read of identifier by the client of the request.
+    """
+    flask.g.op.logEvent(
+        identifier,
+        opersist.models.logentry.EVENT_READ,
+        ip_address=flask.request.remote_addr,
+        user_agent=flask.request.user_agent.string,
+        subject=PUBLIC_SUBJECT,
+    )
+
+
+def maxPageSize():
+    """
+    Largest page of a listing for the mnode of the request, set by
+    max_page_size in node.json.
+    """
+    return flask.g.mn_config.get("max_page_size", PAGE_SIZE)
+
+
+def streamRecords(page):
+    """
+    Iterate the records of a listing query as rows arrive.
+
+    The session used by the query is closed once the records are consumed
+    since streaming continues after the request session is released.
+    """
+    try:
+        for record in page.yield_per(STREAM_BATCH_SIZE):
+            yield record
+    finally:
+        page.session.close()
 
 
 def streamTemplate(template_name, **context):
@@ -625,6 +1048,7 @@ def listObjects(db):
     identifier = flask.request.args.get("identifier", None)
     format_id = flask.request.args.get("formatId", None)
     replica_status = flask.request.args.get("replicaStatus", None)
+    cursor = flask.request.args.get("cursor", None)
     try:
         start = int(flask.request.args.get("start", 0))
     except ValueError as e:
@@ -643,8 +1067,8 @@ def listObjects(db):
         )
     if start < 0:
         start = 0
-    if count > PAGE_SIZE:
-        count = PAGE_SIZE
+    if count > maxPageSize():
+        count = maxPageSize()
 
     columns = [
         "identifier",
@@ -654,9 +1078,7 @@ def listObjects(db):
         "format_id",
     ]
     db = flask.g.op.getSession()
-    olist = db.query(opersist.models.thing.Thing).options(
-        sqlalchemy.orm.load_only(*columns)
-    )
+    olist = db.query(opersist.models.thing.Thing)
     if from_date is not None:
         olist = olist.filter(opersist.models.thing.Thing.date_modified >= from_date)
     if to_date is not None:
@@ -672,20 +1094,54 @@ def listObjects(db):
         olist = olist.filter(
             opersist.models.thing.Thing.format_id.like(format_id + "%")
         )
-    total_records = olist.count()
-    records = olist.order_by(opersist.models.thing.Thing.date_modified.desc())[
-        start : start + count
-    ]
-    return flask.Response(
+    if identifier is None:
+        total_records = flask.g.op.countThingsFiltered(
+            format_id=format_id, from_date=from_date, to_date=to_date
+        )
+    else:
+        total_records = olist.count()
+    olist = orderListing(olist)
+    if cursor is not None:
+        try:
+            olist = seekListing(olist, cursor)
+        except ValueError as e:
+            return d1_InvalidRequest(
+                detail_code=1540, description="cursor is not valid", trace=str(e)
+            )
+        start = 0
+    # Only the keys of the page are read up front, one row past the page
+    # tells if there is a next page
+    Thing = opersist.models.thing.Thing
+    keys = (
+        olist.with_entities(Thing.date_modified, Thing.checksum_sha256)
+        .offset(start)
+        .limit(count + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(keys) > count:
+        keys = keys[:count]
+        if count > 0:
+            next_cursor = encodeCursor(keys[-1])
+    records = []
+    if len(keys) > 0:
+        page = pageListing(olist, keys[0], keys[-1]).options(
+            sqlalchemy.orm.load_only(*columns)
+        )
+        records = streamRecords(page.limit(len(keys)))
+    response = flask.Response(
         streamTemplate(
             "mnode/objectlist_template.xml",
-            records_count=len(records),
+            records_count=len(keys),
             records_start=start,
             records_total=total_records,
             records=records,
         ),
         content_type=XML_TYPE,
     )
+    if next_cursor is not None:
+        response.headers["Link"] = f'<{nextPageUrl(next_cursor)}>; rel="next"'
+    return response
 
 
 # get
@@ -709,18 +1165,16 @@ def getObject(identifier):
     obj = flask.g.op.getThingPIDorSID(identifier)
     if obj is None:
         return d1_NotFound(pid=identifier, detail_code=1002)
-    response = flask.make_response(obj.content)
-    response.mimetype = obj.media_type_name
-    obj_path = flask.g.op.contentAbsPath(obj.content)
-    fldr = os.path.dirname(obj_path)
-    fname = os.path.basename(obj_path)
-    return flask.send_from_directory(
-        fldr,
-        fname,
-        mimetype=obj.media_type_name,
+    not_modified = notModified(obj.checksum_sha256, obj.t_content_modified)
+    if not_modified is not None:
+        return not_modified
+    logRead(obj.identifier)
+    return sendBlob(
+        flask.g.op.contentAbsPath(obj.content),
+        obj,
         as_attachment=True,
-        attachment_filename=obj.file_name,
-        last_modified=obj.t_content_modified,
+        # Only a PID always refers to the same bytes, a SID follows the series
+        immutable=(identifier == obj.identifier),
     )
 
 
@@ -736,6 +1190,9 @@ def getChecksum(identifier):
     obj = flask.g.op.getThingPIDorSID(identifier)
     if obj is None:
         return d1_NotFound(pid=identifier, detail_code=1041)
+    not_modified = notModified(obj.checksum_sha256, obj.t_content_modified)
+    if not_modified is not None:
+        return not_modified
     _checksum = None
     checksum_algorithm = flask.request.args.get("checksumAlgorithm", "").upper()
     try:
@@ -749,6 +1206,7 @@ def getChecksum(identifier):
             flask.render_template("checksum_template.xml", algorithm=checksum_algorithm, checksum=_checksum)
         )
         response.mimetype = XML_TYPE
+        setValidators(response, obj.checksum_sha256, obj.t_content_modified)
         return response, 200
     except Exception as e:
         return d1_ServiceFailure(
@@ -781,6 +1239,24 @@ def getMeta(identifier):
     obj = flask.g.op.getThingPIDorSID(identifier)
     if obj is None:
         return d1_NotFound(pid=identifier, detail_code=1041)
+    not_modified = notModified(metaEtag(obj), obj.date_modified)
+    if not_modified is not None:
+        return not_modified
+    cache = flask.g.op.sysmeta_cache
+    sysmeta_xml = cache.get(obj.checksum_sha256, obj.date_modified)
+    if sysmeta_xml is None:
+        sysmeta_xml = renderSysmeta(obj)
+        cache.put(obj.checksum_sha256, obj.date_modified, sysmeta_xml)
+    logRead(obj.identifier)
+    response = flask.make_response(sysmeta_xml)
+    response.mimetype = XML_TYPE
+    return setValidators(response, metaEtag(obj), obj.date_modified)
+
+
+def renderSysmeta(obj):
+    """
+    Render the system metadata document of a Thing.
+    """
     sysm = obj.asJsonDict()
     sysm["checksum_algorithm"] = "MD5"
     sysm["checksum"] = obj.checksum_md5
@@ -790,11 +1266,7 @@ def getMeta(identifier):
         sysm["origin_member_node"] = flask.g.mn_config["node_id"]
     if sysm["authoritative_member_node"] is None:
         sysm["authoritative_member_node"] = flask.g.mn_config["node_id"]
-    response = flask.make_response(
-        flask.render_template("systemmetadata_template.xml", sysm=sysm)
-    )
-    response.mimetype = XML_TYPE
-    return response
+    return flask.render_template("systemmetadata_template.xml", sysm=sysm)
 
 
 # synchronizationFailed
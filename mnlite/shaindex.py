@@ -0,0 +1,155 @@
+"""
+Process wide index from sha256 to the member node holding the content.
+
+The index is a single sorted bytes buffer of fixed size records, the 32
+byte digest followed by a 2 byte node number, searched by bisection.
+Things added after the buffer was built are picked up incrementally into
+a dict when a lookup misses.
+"""
+
+import time
+import bisect
+import logging
+import threading
+import sqlalchemy
+import opersist.models.thing
+
+RECORD_SIZE = 34
+
+
+class _Digests(object):
+    """
+    Sequence view of the digests in an index buffer, for bisect.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def __len__(self):
+        return len(self._buffer) // RECORD_SIZE
+
+    def __getitem__(self, i):
+        offset = i * RECORD_SIZE
+        return self._buffer[offset : offset + 32]
+
+
+class Sha256Index(object):
+
+    L = logging.getLogger("Sha256Index")
+
+    def __init__(self, m_nodes: dict, refresh_interval: float = 10.0):
+        """
+        Args:
+            m_nodes: The app m_nodes configuration, name -> mn_config
+            refresh_interval: Minimum seconds between incremental refreshes
+        """
+        self._m_nodes = m_nodes
+        self.refresh_interval = refresh_interval
+        self._names = []
+        self._buffer = b""
+        self._recent = {}
+        self._last_added = {}
+        self._last_refresh = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buffer) // RECORD_SIZE + len(self._recent)
+
+    def _readNode(self, mn_name, mn_config):
+        """
+        Iterate the digests of things added to a node since the last read.
+        """
+        op = mn_config["persistence"]
+        if op is None:
+            return
+        try:
+            op.open()
+            last_added = self._last_added.get(mn_name)
+            newest = op.getSession().query(
+                sqlalchemy.func.max(opersist.models.thing.Thing.t_added)
+            ).scalar()
+            for checksum_sha256 in op.getChecksumsSha256(added_after=last_added):
+                yield bytes.fromhex(checksum_sha256)
+            if newest is not None:
+                self._last_added[mn_name] = newest
+        finally:
+            op.removeSession()
+
+    def build(self):
+        """
+        Build the index from all the nodes.
+
+        Returns:
+            int, number of entries
+        """
+        records = []
+        names = []
+        last_added = self._last_added
+        self._last_added = {}
+        try:
+            for mn_name, mn_config in self._m_nodes.items():
+                node = len(names).to_bytes(2, "big")
+                names.append(mn_name)
+                for digest in self._readNode(mn_name, mn_config):
+                    records.append(digest + node)
+        except Exception:
+            self._last_added = last_added
+            raise
+        records.sort()
+        with self._lock:
+            self._names = names
+            self._buffer = b"".join(records)
+            self._recent = {}
+            self._last_refresh = time.monotonic()
+        self.L.info("Indexed %s things of %s nodes", len(records), len(names))
+        return len(records)
+
+    def refresh(self):
+        """
+        Add things added to the nodes since the last build or refresh.
+
+        Returns:
+            int, number of entries added
+        """
+        n = 0
+        for mn_name, mn_config in self._m_nodes.items():
+            try:
+                for digest in self._readNode(mn_name, mn_config):
+                    with self._lock:
+                        self._recent[digest] = mn_name
+                    n += 1
+            except Exception as e:
+                self.L.error("Index refresh of %s failed: %s", mn_name, e)
+        self._last_refresh = time.monotonic()
+        return n
+
+    def _probe(self, digest):
+        with self._lock:
+            name = self._recent.get(digest)
+            if name is not None:
+                return name
+            digests = _Digests(self._buffer)
+            i = bisect.bisect_left(digests, digest)
+            if i < len(digests) and digests[i] == digest:
+                offset = i * RECORD_SIZE + 32
+                return self._names[int.from_bytes(self._buffer[offset : offset + 2], "big")]
+        return None
+
+    def lookup(self, sha256: str):
+        """
+        Get the name of the node holding the thing with sha256.
+
+        Returns:
+            node name or None
+        """
+        try:
+            digest = bytes.fromhex(sha256)
+        except ValueError:
+            return None
+        if len(digest) != 32:
+            return None
+        name = self._probe(digest)
+        if name is None and time.monotonic() - self._last_refresh > self.refresh_interval:
+            self.refresh()
+            name = self._probe(digest)
+        return name
@@ -1,20 +1,26 @@
 import os
 import logging
+import datetime
+import threading
 try:
     import orjson as json
 except ModuleNotFoundError:
     import json
 
-import tempfile
 import sqlalchemy.exc
 import sqlalchemy.orm.exc
 import sqlalchemy.event
 from . import utils
 from . import flob
+from . import sysmetacache
+from . import eventlog
 from . import models
 from .models import subject
 from .models import accessrule
 from .models import thing
+from .models import thingstats
+from .models import logentry
+from .models import crawlstatus
 from time import sleep
 
 
@@ -39,18 +45,34 @@ class OPersist(object):
     PUBLIC_SUBJECT = "public"
     PUBLIC_SUBJECT_NAME = "Anonymous user"
 
-    def __init__(self, fs_path, db_url=None, config_file=CONFIG_FILE):
+    def __init__(
+        self, fs_path, db_url=None, config_file=CONFIG_FILE, engine_profile=None
+    ):
+        """
+        Args:
+            fs_path: Folder of the instance
+            db_url: Database URL used when creating a new instance
+            config_file: Name of the configuration file in fs_path
+            engine_profile: Name of the engine profile (see models.ENGINE_PROFILES),
+                defaults to "engine_profile" in the configuration file if set.
+        """
         self._L = logging.getLogger(self.__class__.__name__)
         self.fs_path = fs_path
         self.db_url = db_url if db_url is not None else DEFAULT_DATABASE
+        self.engine_profile = engine_profile
+        self._profile = models.getEngineProfile(None)
         self._path_root = os.path.abspath(fs_path)
         self._blob_path = os.path.join(self._path_root, OPersist.BLOB_PATH)
         self._conf_path = os.path.join(self._path_root, config_file)
         self._engine = None
         self._session = None
         self._ostore = None
+        self.sysmeta_cache = None
+        self._event_log = None
+        self._event_log_lock = threading.Lock()
         self._default_owner = None
         self._default_submitter = None
+        self._identifiers_indexed = False
 
     def getConfig(self):
         if not os.path.exists(self._conf_path):
@@ -80,36 +102,107 @@ class OPersist(object):
                         "created": utils.datetimeToJsonStr(utils.dtnow()),
                         "default_submitter": None,
                         "default_owner": None,
+                        # New stores index identifiers as things are added
+                        "identifiers_indexed": True,
                     }
                     self.setConfig(conf)
                 else:
                     raise ValueError(f"No OPersist instance at {self._path_root}")
             with utils.pushd(self._path_root):
-                self._engine = models.getEngine(conf["content_database"])
-                self._session = models.getSession(self._engine)
-                # sqlalchemy.event.listen(models.thing.Thing, 'pickle', self._on_pickle)
-                self._ostore = flob.FLOB(conf["data_folder"])
+                profile_name = self.engine_profile or conf.get("engine_profile")
+                self._profile = models.getEngineProfile(
+                    profile_name, conf.get("engine_profiles", {}).get(profile_name)
+                )
+                self._L.debug("Engine profile %s: %s", profile_name, self._profile)
+                self._engine = models.getEngine(conf["content_database"], self._profile)
+                self._session = self._newSession()
+                self._ostore = flob.FLOB(conf["data_folder"], encodings=conf.get("blob_encodings"))
+                self._newSysmetaCache(conf)
             # Ensure the public subject is available
             subj = self.getPublicReadAccessRule()
+            if self._profile.get("migrate", True):
+                self._migrate()
         else:
-            conf = self.getConfig()
-            with utils.pushd(self._path_root):
-                if self._session is None:
-                    self._session = models.getSession(self._engine)
-                    # sqlalchemy.event.listen(models.thing.Thing, 'pickle', self._on_pickle)
-                if self._ostore is None:
-                    self._ostore = flob.FLOB(conf["data_folder"])
+            # Engine and schema are already set up, just make sure the
+            # session registry and blob store are available.
+            if self._session is None:
+                self._session = self._newSession()
+            if self._ostore is None:
+                conf = self.getConfig()
+                with utils.pushd(self._path_root):
+                    self._ostore = flob.FLOB(conf["data_folder"], encodings=conf.get("blob_encodings"))
+                    self._newSysmetaCache(conf)
+
+    def _migrate(self):
+        """
+        Bring the content of a store up to date with the current models.
+
+        Runs on open() unless the engine profile sets "migrate" to False,
+        as the read mostly "serve" profile does.
+        """
+        # Stores created before statistics were maintained
+        if self._thingStatsMissing():
+            self.rebuildThingStats()
+        self.refreshThingStatsBounds()
+
+    def _thingStatsMissing(self):
+        """
+        True if there are things but no statistics, as in stores created
+        before thing_stats existed that have not been migrated yet.
+        """
+        if self._session.query(thingstats.ThingStats).first() is not None:
+            return False
+        return self._session.query(models.thing.Thing).first() is not None
+
+    def _newSession(self):
+        session = models.getSession(self._engine)
+        # sqlalchemy.event.listen(models.thing.Thing, 'pickle', self._on_pickle)
+        # Keep thing_stats current with every change to things
+        sqlalchemy.event.listen(session, "before_flush", thingstats.updateThingStats)
+        sqlalchemy.event.listen(session, "before_flush", self._invalidateSysmeta)
+        return session
+
+    def _newSysmetaCache(self, conf):
+        if self.sysmeta_cache is None:
+            self.sysmeta_cache = sysmetacache.SysmetaCache(
+                self._ostore,
+                max_entries=conf.get("sysmeta_cache_size", 1024),
+                on_disk=conf.get("sysmeta_cache_disk", False),
+            )
+
+    def _invalidateSysmeta(self, session, flush_context, instances):
+        """
+        before_flush listener dropping cached system metadata of changed things.
+        """
+        if self.sysmeta_cache is None:
+            return
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, models.thing.Thing):
+                self.sysmeta_cache.invalidate(obj.checksum_sha256)
+
+    def _retryDelay(self, attempt):
+        """
+        Seconds to wait before retry number attempt of a locked write.
+        """
+        delay = self._profile["retry_delay"] * (2 ** attempt)
+        return min(delay, self._profile["retry_max_delay"])
 
     def getSession(self):
         assert self._session is not None
         return self._session
 
     def removeSession(self):
-        pass
-        # self.close()
-        # print("Remove Session")
-        # if not self._session is None:
-        #    self._session.remove()
+        """
+        Release the session of the current thread, keeping the engine open.
+
+        The session is a scoped_session, so this closes only the session used
+        by the calling thread and returns its connection to the pool. The
+        next use of the session on the thread starts a new one. Use this
+        instead of close() when the instance is kept open for the life of a
+        process, as in the mnlite server.
+        """
+        if not self._session is None:
+            self._session.remove()
 
     def commit(self):
         self._session.flush()
@@ -124,6 +217,50 @@ class OPersist(object):
         if not self._ostore is None:
             self._ostore.close()
             self._ostore = None
+        self.sysmeta_cache = None
+        if not self._event_log is None:
+            self._event_log.close()
+            self._event_log = None
+
+    def getEventLog(self):
+        """
+        Get the event log of the instance, started on first use.
+
+        Returns:
+            EventLog or None if no log_database is configured
+        """
+        if self._event_log is None:
+            with self._event_log_lock:
+                if self._event_log is None:
+                    conf = self.getConfig()
+                    db_url = conf.get("log_database")
+                    if db_url is None:
+                        return None
+                    with utils.pushd(self._path_root):
+                        self._event_log = eventlog.EventLog(
+                            db_url,
+                            batch_size=conf.get("log_batch_size", 500),
+                            flush_interval=conf.get("log_flush_interval", 1.0),
+                            retention_days=conf.get("log_retention_days", 365),
+                            profile=self._profile,
+                        )
+        return self._event_log
+
+    def logEvent(self, identifier, event, ip_address=None, user_agent=None, subject=None):
+        """
+        Record an event for identifier in the event log, if one is configured.
+
+        The event is written asynchronously.
+        """
+        event_log = self.getEventLog()
+        if event_log is not None:
+            event_log.log(
+                identifier,
+                event,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                subject=subject,
+            )
 
     def getOrCreate(self, model, create_method="", create_method_kwargs=None, **kwargs):
         """
@@ -301,10 +438,84 @@ class OPersist(object):
         assert self._session is not None
         self._ostore.remove(sha256)
         the_thing = self._session.query(models.thing.Thing).get(sha256)
+        identifier = the_thing.identifier
         self._session.delete(the_thing)
         self._session.commit()
+        self.logEvent(identifier, logentry.EVENT_DELETE)
         self._L.info("Object %s removed.", sha256)
 
+    def _newThing(
+        self,
+        sha256: str,
+        content: str,
+        size_bytes: int,
+        hashes: dict,
+        identifier: str = None,
+        format_id: str = None,
+        submitter: str = None,
+        owner: str = None,
+        access_rules: list = None,
+        series_id: str = None,
+        alt_identifiers: list = None,
+        media_type: str = None,
+        file_name: str = None,
+        source: str = None,
+        metadata: dict = None,
+        obsoletes=None,
+        date_uploaded=None,
+    ):
+        """
+        Create a new, not yet added, Thing instance for content in the blob store.
+
+        Submitter and owner are resolved to Subjects, falling back to the
+        configured defaults. Public read is applied when access_rules is None.
+
+        Returns:
+            instance of thing
+        """
+        the_thing = models.thing.Thing(checksum_sha256=sha256, content=content)
+        the_thing.size_bytes = size_bytes
+        if submitter is None:
+            submitter = self.getDefaultSubmitter()
+        elif isinstance(submitter, str):
+            submitter = self.getSubject(submitter)
+        self._L.debug("Using submitter: %s", submitter)
+        if owner is None:
+            owner = self.getDefaultOwner()
+        elif isinstance(owner, str):
+            owner = self.getSubject(owner)
+        if owner is None:
+            owner = submitter
+        self._L.debug("Using rights_holder: %s", owner)
+        the_thing.checksum_md5 = hashes["md5"]
+        the_thing.checksum_sha1 = hashes["sha1"]
+        the_thing.source = source
+        the_thing.file_name = file_name
+        the_thing.media_type_name = media_type
+        the_thing.identifier = identifier
+        the_thing.date_uploaded = date_uploaded
+        the_thing.format_id = format_id
+        the_thing.submitter = submitter
+        the_thing.rights_holder = owner
+        the_thing.series_id = series_id
+        the_thing.identifiers = []
+        the_thing.access_policy = []
+        the_thing._meta = metadata
+        the_thing.obsoletes = obsoletes
+        if date_uploaded is None:
+            the_thing.date_uploaded = utils.dtnow()
+        if alt_identifiers is not None:
+            # remove duplicates
+            alt_identifiers = list(set(alt_identifiers))
+            current_identifiers = list(the_thing.identifiers)
+            the_thing.identifiers = list(set(alt_identifiers + current_identifiers))
+        if access_rules is None:
+            the_thing.access_policy.append(self.getPublicReadAccessRule())
+        else:
+            the_thing.access_policy = access_rules
+        the_thing.indexIdentifiers()
+        return the_thing
+
     def addThing(
         self,
         fname: str,
@@ -353,6 +564,8 @@ class OPersist(object):
         # Add to blob
         self._L.debug("Persisting %s", identifier)
         self._L.debug("Path = %s", fname)
+        if metadata is None:
+            metadata = {}
         blob_metadata = metadata
         blob_metadata["file_name"] = os.path.basename(fname)
         blob_metadata["media_type"] = media_type
@@ -360,18 +573,61 @@ class OPersist(object):
         if source is not None:
             blob_metadata["source"] = source
         if hashes is None:
-            hashes = utils.computeChecksumsFile(
-                fname,
-                calc_md5=True,
-                calc_sha1=True,
-                calc_sha256=True,
-            )
+            hashes = utils.fileChecksums(fname)
         fldr_dest, sha256, fn_dest = self._ostore.addFilePath(
             fname, hash=hashes["sha256"], metadata=blob_metadata
         )
-        self._L.debug("Adding database entry...")
         if source is None:
             source = os.path.abspath(fname)
+        return self._persistThing(
+            sha256,
+            fn_dest,
+            os.stat(self.contentAbsPath(fn_dest)).st_size,
+            hashes,
+            identifier,
+            format_id=format_id,
+            submitter=submitter,
+            owner=owner,
+            access_rules=access_rules,
+            series_id=series_id,
+            alt_identifiers=alt_identifiers,
+            media_type=media_type,
+            file_name=blob_metadata["file_name"],
+            source=source,
+            metadata=metadata,
+            obsoletes=obsoletes,
+            date_uploaded=date_uploaded,
+        )
+
+    def _persistThing(
+        self,
+        sha256: str,
+        content: str,
+        size_bytes: int,
+        hashes: dict,
+        identifier: str,
+        format_id: str = None,
+        submitter: str = None,
+        owner: str = None,
+        access_rules: list = None,
+        series_id: str = None,
+        alt_identifiers: list = None,
+        media_type: str = None,
+        file_name: str = None,
+        source: str = None,
+        metadata: dict = None,
+        obsoletes=None,
+        date_uploaded=None,
+    ):
+        """
+        Add the database entry for a blob already written to the store.
+
+        The blob is removed from the store if the entry can not be added.
+
+        Returns:
+            instance of thing, False on a database read/write error, or None
+        """
+        self._L.debug("Adding database entry...")
         # Add to database
         try:
             # Check content state before creating
@@ -441,64 +697,45 @@ class OPersist(object):
                 self._L.warning(f"OBSOLETED = {obsoletes} in series {series_id}")
                 self._L.debug(f"Obsoleted item sysmeta: {match}")
 
-            blob_fname = os.path.join(self._path_root, self._blob_path, fn_dest)
-            the_thing = models.thing.Thing(checksum_sha256=sha256, content=fn_dest)
-            the_thing.size_bytes = os.stat(blob_fname).st_size
-            if submitter is None:
-                submitter = self.getDefaultSubmitter()
-            elif isinstance(submitter, str):
-                submitter = self.getSubject(submitter)
-            self._L.debug("Using submitter: %s", submitter)
-            if owner is None:
-                owner = self.getDefaultOwner()
-            elif isinstance(owner, str):
-                owner = self.getSubject(owner)
-            if owner is None:
-                owner = submitter
-            self._L.debug("Using rights_holder: %s", owner)
-            the_thing.checksum_md5 = hashes["md5"]
-            the_thing.checksum_sha1 = hashes["sha1"]
-            the_thing.source = source
-            the_thing.file_name = blob_metadata["file_name"]
-            the_thing.media_type_name = blob_metadata["media_type"]
-            the_thing.identifier = blob_metadata["identifier"]
-            the_thing.date_uploaded = date_uploaded
-            the_thing.format_id = format_id
-            the_thing.submitter = submitter
-            the_thing.rights_holder = owner
-            the_thing.series_id = series_id
-            the_thing.identifiers = []
-            the_thing.access_policy = []
-            the_thing._meta = metadata
-            the_thing.obsoletes = obsoletes
-            if date_uploaded is None:
-                the_thing.date_uploaded = utils.dtnow()
-            if alt_identifiers is not None:
-                # remove duplicates
-                alt_identifiers = list(set(alt_identifiers))
-                current_identifiers = list(the_thing.identifiers)
-                the_thing.identifiers = list(set(alt_identifiers + current_identifiers))
-            if access_rules is None:
-                the_thing.access_policy.append(self.getPublicReadAccessRule())
-            else:
-                the_thing.access_policy = access_rules
+            the_thing = self._newThing(
+                sha256,
+                content,
+                size_bytes,
+                hashes,
+                identifier=identifier,
+                format_id=format_id,
+                submitter=submitter,
+                owner=owner,
+                access_rules=access_rules,
+                series_id=series_id,
+                alt_identifiers=alt_identifiers,
+                media_type=media_type,
+                file_name=file_name,
+                source=source,
+                metadata=metadata,
+                obsoletes=obsoletes,
+                date_uploaded=date_uploaded,
+            )
             self._L.debug(the_thing)
             self._session.add(the_thing)
+            submitter_id = the_thing.submitterSubject()
             self.commit()
+            self.logEvent(identifier, logentry.EVENT_CREATE, subject=submitter_id)
             self._L.info(f"Persisted {identifier}")
             return the_thing
         except sqlalchemy.exc.OperationalError as e:
             # this situation denotes a database read/write issue
             # such as "database is locked"
-            # Return false to restart the session and try again
+            # Return false so the caller may retry
             self._L.error(e)
-            self._L.error("Caught sqlalchemy.exc.OperationalError; attempting session restart...")
+            self._session.rollback()
             status = self._ostore.remove(sha256)
             self._L.debug("Remove status = %s", status)
             return False
         except Exception as e:
             self._L.error("Failed to store entry in database.")
             self._L.error(e)
+            self._session.rollback()
             status = self._ostore.remove(sha256)
             self._L.debug("Remove status = %s", status)
         return None
@@ -523,11 +760,12 @@ class OPersist(object):
         """
         Adds the thing of bytes to the store.
 
-        Ths implementation saves to a temporary file and delegates
-        remaining operations to addThing.
+        Checksums are computed from obj in memory if not provided, and the
+        bytes are written once directly to their final location in the
+        blob store.
 
         Args:
-            obj:
+            obj: bytes of the thing
             identifier:
             hashes:
             format_id:
@@ -542,17 +780,30 @@ class OPersist(object):
             obsoletes:
 
         Returns:
-
+            instance of thing, or None on failure
         """
-        ftmp = tempfile.NamedTemporaryFile(delete=False)
-        ftmp_path = ftmp.name
-        ftmp.write(obj)
-        ftmp.close()
-        try:
-            thingAdd = self.addThing(
-                ftmp_path,
-                identifier=identifier,
-                hashes=hashes,
+        assert self._session is not None
+        self._L.debug("Persisting %s", identifier)
+        if metadata is None:
+            metadata = {}
+        blob_metadata = metadata
+        blob_metadata["media_type"] = media_type
+        blob_metadata["identifier"] = identifier
+        if source is not None:
+            blob_metadata["source"] = source
+        if hashes is None:
+            hashes, _ = utils.bytesChecksums(obj)
+
+        def _addBytes():
+            fldr_dest, sha256, fn_dest = self._ostore.add(
+                obj, hash=hashes["sha256"], metadata=blob_metadata
+            )
+            return self._persistThing(
+                sha256,
+                fn_dest,
+                len(obj),
+                hashes,
+                identifier,
                 format_id=format_id,
                 submitter=submitter,
                 owner=owner,
@@ -565,48 +816,232 @@ class OPersist(object):
                 obsoletes=obsoletes,
                 date_uploaded=date_uploaded,
             )
-            if thingAdd == False:
-                self._L.info("Entering session recovery loop")
-                while True:
-                    if self._session:
-                        self._L.info("Closing old database connection session")
-                        self.close()
-                    self._L.info("Opening new database connection session")
-                    self.open(allow_create=False)
-                    self._L.info("Retrying persist with new session...")
-                    thingAdd = self.addThing(
-                        ftmp_path,
-                        identifier=identifier,
-                        hashes=hashes,
-                        format_id=format_id,
-                        submitter=submitter,
-                        owner=owner,
-                        access_rules=access_rules,
-                        series_id=series_id,
-                        alt_identifiers=alt_identifiers,
-                        media_type=media_type,
-                        source=source,
-                        metadata=metadata,
-                        obsoletes=obsoletes,
-                        date_uploaded=date_uploaded,
+
+        thingAdd = _addBytes()
+        attempt = 0
+        while thingAdd == False and attempt < self._profile["write_retries"]:
+            delay = self._retryDelay(attempt)
+            attempt += 1
+            self._L.info(
+                "Retrying persist of %s in %.1fs (%s of %s)",
+                identifier,
+                delay,
+                attempt,
+                self._profile["write_retries"],
+            )
+            sleep(delay)
+            thingAdd = _addBytes()
+        if thingAdd == False:
+            self._L.error(f"Could not store item, database unavailable: {identifier}")
+            return None
+        return thingAdd
+
+    def addThingsBatch(self, items: list):
+        """
+        Adds many things to the store in a single transaction.
+
+        Each entry of items is a dict with the keyword arguments accepted by
+        addThingBytes, with the content under "obj". Series, identifier and
+        obsoletes constraints are checked with one query per constraint for
+        the whole batch rather than per item. Items that fail validation are
+        skipped and reported, the remainder are committed together. The batch
+        is retried following the engine profile retry policy if the database
+        is locked.
+
+        Later items in the same series obsolete earlier items in the batch.
+
+        Args:
+            items: list of dict, each with at least "obj" and "identifier"
+
+        Returns:
+            list of dict {identifier, thing, error} in the order of items. thing
+            is the persisted Thing or None, error is None or a message.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._addThingsBatch(items)
+            except sqlalchemy.exc.OperationalError as e:
+                if attempt >= self._profile["write_retries"]:
+                    self._L.error("Could not store batch, database unavailable: %s", e)
+                    return [
+                        {"identifier": item.get("identifier"), "thing": None, "error": str(e)}
+                        for item in items
+                    ]
+                delay = self._retryDelay(attempt)
+                attempt += 1
+                self._L.info("Retrying batch in %.1fs (%s of %s)", delay, attempt, self._profile["write_retries"])
+                sleep(delay)
+
+    def _addThingsBatch(self, items: list):
+        """
+        Single attempt of addThingsBatch.
+
+        Raises sqlalchemy.exc.OperationalError if the commit fails because the
+        database is locked, after the blobs of the batch have been removed.
+        """
+        assert self._session is not None
+        Thing = models.thing.Thing
+        results = []
+        for item in items:
+            results.append(
+                {"identifier": item.get("identifier"), "thing": None, "error": None}
+            )
+        if len(items) == 0:
+            return results
+
+        identifiers = set()
+        series_ids = set()
+        obsoletes = set()
+        for item in items:
+            if item.get("identifier") is not None:
+                identifiers.add(item["identifier"])
+            if item.get("series_id") is not None:
+                series_ids.add(item["series_id"])
+            if item.get("obsoletes") is not None:
+                obsoletes.add(item["obsoletes"])
+
+        # Set based lookups of the existing state of the store
+        used_as_sid = set()
+        for row in self._session.query(Thing.series_id).filter(
+            Thing.series_id.in_(identifiers | obsoletes)
+        ):
+            used_as_sid.add(row.series_id)
+        used_as_pid = set()
+        for row in self._session.query(Thing.identifier).filter(
+            Thing.identifier.in_(series_ids | identifiers)
+        ):
+            used_as_pid.add(row.identifier)
+        # Most recent thing in each series, candidates for obsolescence
+        series_heads = {}
+        if len(series_ids) > 0:
+            Q = self._session.query(Thing).filter(Thing.series_id.in_(series_ids))
+            for t in Q.order_by(Thing.date_modified.desc()):
+                series_heads.setdefault(t.series_id, t)
+        obsoleted = {}
+        wanted = obsoletes | set([t.identifier for t in series_heads.values()])
+        if len(wanted) > 0:
+            Q = self._session.query(Thing).filter(Thing.identifier.in_(wanted))
+            for t in Q:
+                obsoleted[t.identifier] = t
+
+        added = []
+        batch_sha256 = set()
+        for i, item in enumerate(items):
+            identifier = item.get("identifier")
+            series_id = item.get("series_id")
+            obsoletes_pid = item.get("obsoletes")
+            obj = item["obj"]
+            stored = None
+            try:
+                # Checked here rather than failing the whole batch on commit
+                if item.get("source") is None:
+                    raise ValueError(f"No source for '{identifier}'")
+                if identifier in used_as_sid:
+                    raise ValueError(
+                        f"Identifier '{identifier}' is used as a series_id"
+                    )
+                if identifier in used_as_pid:
+                    raise ValueError(f"Identifier '{identifier}' already exists")
+                if series_id is not None and series_id in used_as_pid:
+                    raise ValueError(
+                        f"series_id '{series_id}' is used as an identifier"
+                    )
+                if obsoletes_pid is not None and obsoletes_pid in used_as_sid:
+                    raise ValueError(
+                        f"Value of obsoletes must not be a series_id, {obsoletes_pid}"
                     )
-                    if thingAdd:
-                        self._L.info("Successfully stored under new session.")
-                        break
-                    elif thingAdd == None:
-                        self._L.error(f"Could not store item under new session: {identifier}")
-                        break
-                    else:
-                        self._L.error("Could not recover database session.")
-                    if self._session:
-                        self._L.info("Closing open database connection session.")
-                        self.close()
-                    self._L.info('Sleeping for 10 seconds.')
-                    sleep(10)
-                    self._L.info('Trying again...')
-            return thingAdd
-        finally:
-            os.unlink(ftmp_path)
+                hashes = item.get("hashes")
+                if hashes is None:
+                    hashes, _ = utils.bytesChecksums(obj)
+                sha256 = hashes["sha256"]
+                if sha256 in batch_sha256:
+                    raise ValueError(f"Duplicate content in batch: {sha256}")
+                match = None
+                if obsoletes_pid is not None:
+                    match = obsoleted.get(obsoletes_pid)
+                elif series_id is not None:
+                    match = series_heads.get(series_id)
+                    if match is not None:
+                        obsoletes_pid = match.identifier
+                if match is not None and series_id is not None:
+                    if match.series_id is not None and match.series_id != series_id:
+                        raise ValueError(
+                            f"Obsoleted item {match.identifier} is in series "
+                            f"{match.series_id}, not {series_id}"
+                        )
+                metadata = item.get("metadata")
+                if metadata is None:
+                    metadata = {}
+                metadata["media_type"] = item.get("media_type")
+                metadata["identifier"] = identifier
+                if item.get("source") is not None:
+                    metadata["source"] = item["source"]
+                fldr_dest, sha256, fn_dest = self._ostore.add(
+                    obj, hash=sha256, metadata=metadata
+                )
+                stored = sha256
+                the_thing = self._newThing(
+                    sha256,
+                    fn_dest,
+                    len(obj),
+                    hashes,
+                    identifier=identifier,
+                    format_id=item.get("format_id"),
+                    submitter=item.get("submitter"),
+                    owner=item.get("owner"),
+                    access_rules=item.get("access_rules"),
+                    series_id=series_id,
+                    alt_identifiers=item.get("alt_identifiers"),
+                    media_type=item.get("media_type"),
+                    file_name=item.get("file_name"),
+                    source=item.get("source"),
+                    metadata=metadata,
+                    obsoletes=obsoletes_pid,
+                    date_uploaded=item.get("date_uploaded"),
+                )
+            except Exception as e:
+                self._L.error("Batch item %s rejected: %s", identifier, e)
+                results[i]["error"] = str(e)
+                if stored is not None:
+                    # A partly built Thing may have been cascaded into the
+                    # session, it must not be committed with the batch
+                    for pending in list(self._session.new):
+                        if isinstance(pending, Thing) and pending.checksum_sha256 == stored:
+                            self._session.expunge(pending)
+                    self._ostore.remove(stored)
+                continue
+            batch_sha256.add(sha256)
+            if match is not None:
+                match.obsoleted_by = identifier
+                match.date_modified = utils.dtnow()
+                self._L.warning(f"OBSOLETED = {match.identifier} in series {series_id}")
+            if identifier is not None:
+                used_as_pid.add(identifier)
+                obsoleted[identifier] = the_thing
+            if series_id is not None:
+                used_as_sid.add(series_id)
+                series_heads[series_id] = the_thing
+            self._session.add(the_thing)
+            added.append((i, the_thing))
+        created = [(t.identifier, t.submitterSubject()) for i, t in added]
+        try:
+            self.commit()
+        except Exception as e:
+            self._L.error("Failed to commit batch of %s things: %s", len(added), e)
+            self._session.rollback()
+            for i, the_thing in added:
+                self._ostore.remove(the_thing.checksum_sha256)
+                results[i]["error"] = str(e)
+            if models.isLockError(e):
+                raise
+            return results
+        for i, the_thing in added:
+            results[i]["thing"] = the_thing
+        for identifier, submitter_id in created:
+            self.logEvent(identifier, logentry.EVENT_CREATE, subject=submitter_id)
+        self._L.info("Persisted batch of %s things", len(added))
+        return results
 
     def registerIdentifier(
         self,
@@ -790,6 +1225,37 @@ class OPersist(object):
             o = Q.first()
         return o
 
+    def describeThing(self, identifier):
+        """
+        Get the columns needed to describe a thing by PID or most recent SID.
+
+        Only the thing table is read, no related objects are loaded.
+
+        Returns:
+            Row with identifier, checksum_sha256, checksum_md5, size_bytes,
+            format_id, media_type_name, date_modified, serial_version, or None
+        """
+        assert self._session is not None
+        Thing = models.thing.Thing
+        Q = self._session.query(
+            Thing.identifier,
+            Thing.checksum_sha256,
+            Thing.checksum_md5,
+            Thing.size_bytes,
+            Thing.format_id,
+            Thing.media_type_name,
+            Thing.date_modified,
+            Thing.serial_version,
+        )
+        o = Q.filter(Thing.identifier == identifier).first()
+        if o is None:
+            o = (
+                Q.filter(Thing.series_id == identifier)
+                .order_by(Thing.date_modified.desc())
+                .first()
+            )
+        return o
+
     def getThingPIDorFirstSeriesObj(self, identifier):
         # get by pid or first object in series
         o = self.getThingPID(identifier)
@@ -823,19 +1289,33 @@ class OPersist(object):
     def getThingsIdentifier(self, identifier):
         # match PID or SID or related identifiers, order by date_modified
         assert self._session is not None
-        Q = self._session.query(models.thing.Thing).filter(
-            sqlalchemy.or_(
-                models.thing.Thing.identifiers.contains(identifier),
-                models.thing.Thing.series_id == identifier,
-                models.thing.Thing.identifier == identifier,
+        if not self._identifiersIndexed():
+            # Scan the things until the store is migrated
+            Q = self._session.query(models.thing.Thing).filter(
+                sqlalchemy.or_(
+                    models.thing.Thing.identifiers.contains(identifier),
+                    models.thing.Thing.series_id == identifier,
+                    models.thing.Thing.identifier == identifier,
+                )
             )
+            return Q.order_by(models.thing.Thing.date_modified.desc())
+        TI = models.thing.ThingIdentifier
+        matches = self._session.query(TI.checksum_sha256).filter(
+            TI.identifier == identifier
+        )
+        Q = self._session.query(models.thing.Thing).filter(
+            models.thing.Thing.checksum_sha256.in_(matches)
         )
         return Q.order_by(models.thing.Thing.date_modified.desc())
 
     def getThingsSIDOrAltIdentifier(self, series_id, alt_ids:list=[]):
         """
         Get the most recent object in the series or with an alt identifier.
-        
+
+        Matching uses the indexed thing_identifier table, so series_id matches
+        the series_id or an alternate identifier of a thing, and alt_ids
+        match alternate identifiers.
+
         Args:
             series_id: Series ID or PID of the object in the SO database
             alt_ids: List of alternative identifiers to match (limit 1000)
@@ -845,35 +1325,291 @@ class OPersist(object):
         """
         # match SID or identifiers, minus obsoleted datasets, order by date_modified
         assert self._session is not None
+        TI = models.thing.ThingIdentifier
+        alt_ids = alt_ids[:1000] if isinstance(alt_ids, list) else []
+        matches = self._session.query(TI.checksum_sha256).filter(
+            sqlalchemy.or_(
+                sqlalchemy.and_(
+                    TI.identifier == series_id,
+                    TI.role.in_([models.thing.ROLE_SID, models.thing.ROLE_ALT]),
+                ),
+                sqlalchemy.and_(
+                    TI.identifier.in_(alt_ids),
+                    TI.role == models.thing.ROLE_ALT,
+                ),
+            )
+        )
         Q = self._session.query(models.thing.Thing).filter(
             sqlalchemy.and_(
                 # exclude obsoleted datasets
                 models.thing.Thing.obsoleted_by == None,
-                # and match SID or alt identifiers
-                sqlalchemy.or_(
-                    models.thing.Thing.identifiers.contains(series_id),
-                    models.thing.Thing.series_id == series_id,
-                    sqlalchemy.or_(
-                        *[models.thing.Thing.identifiers.contains(alt_id) for alt_id in (alt_ids[:1000] if isinstance(alt_ids, list) else [])]
-                    ),
-                ),
+                models.thing.Thing.checksum_sha256.in_(matches),
             )
         )
         return Q.order_by(models.thing.Thing.date_modified.desc()).first()
 
+    def indexThingIdentifiers(self, rebuild=False, batch_size=1000):
+        """
+        Populate the thing_identifier table for things that have no entries.
+
+        This migrates stores created before the table existed. Things are
+        processed in batches ordered by checksum_sha256, committing each batch.
+        Once done the store is marked as indexed in the configuration.
+
+        Args:
+            rebuild: Remove all existing entries first
+            batch_size: Number of things per transaction
+
+        Returns:
+            int, number of things indexed
+        """
+        assert self._session is not None
+        Thing = models.thing.Thing
+        TI = models.thing.ThingIdentifier
+        if rebuild:
+            self._session.query(TI).delete(synchronize_session=False)
+            self.commit()
+        indexed = sqlalchemy.exists().where(TI.checksum_sha256 == Thing.checksum_sha256)
+        Q = self._session.query(
+            Thing.checksum_sha256, Thing.identifier, Thing.series_id, Thing.identifiers
+        ).filter(~indexed)
+        n = 0
+        last = ""
+        while True:
+            rows = (
+                Q.filter(Thing.checksum_sha256 > last)
+                .order_by(Thing.checksum_sha256)
+                .limit(batch_size)
+                .all()
+            )
+            if len(rows) == 0:
+                break
+            entries = []
+            for row in rows:
+                for v, r in models.thing.identifierIndexEntries(
+                    row.identifier, row.series_id, row.identifiers
+                ):
+                    entries.append(
+                        {"identifier": v, "role": r, "checksum_sha256": row.checksum_sha256}
+                    )
+            if len(entries) > 0:
+                self._session.execute(TI.__table__.insert(), entries)
+            self.commit()
+            n += len(rows)
+            last = rows[-1].checksum_sha256
+            self._L.info("Indexed identifiers of %s things", n)
+        self._setIdentifiersIndexed()
+        return n
+
+    def migrateThingIdentifiers(self):
+        """
+        Index the identifiers of things once for stores created before the
+        thing_identifier table existed.
+
+        Completion is recorded as "identifiers_indexed" in the configuration
+        by indexThingIdentifiers, so later calls return without scanning the
+        things.
+
+        Returns:
+            int, number of things indexed
+        """
+        if self._identifiersIndexed():
+            return 0
+        return self.indexThingIdentifiers()
+
+    def _identifiersIndexed(self):
+        """
+        True if the thing_identifier table covers every thing.
+
+        The configuration is read until the flag is seen, so a migration by
+        another process is picked up.
+        """
+        if not self._identifiers_indexed:
+            conf = self.getConfig()
+            if conf is not None:
+                self._identifiers_indexed = conf.get("identifiers_indexed", False)
+        return self._identifiers_indexed
+
+    def _setIdentifiersIndexed(self):
+        if self._identifiersIndexed():
+            return
+        conf = self.getConfig()
+        conf["identifiers_indexed"] = True
+        self.setConfig(conf)
+        self._identifiers_indexed = True
+
+    def getChecksumsSha256(self, batch_size=10000, added_after=None):
+        """
+        Iterate over the sha256 checksum of every thing in the store.
+
+        Args:
+            batch_size: Rows fetched per round trip
+            added_after: Only things with t_added after this datetime
+        """
+        assert self._session is not None
+        Q = self._session.query(models.thing.Thing.checksum_sha256)
+        if added_after is not None:
+            Q = Q.filter(models.thing.Thing.t_added > added_after)
+        for row in Q.yield_per(batch_size):
+            yield row.checksum_sha256
+
+    def rebuildThingStats(self, batch_size=10000):
+        """
+        Recompute the thing_stats table from the thing table.
+
+        Returns:
+            int, number of things counted
+        """
+        assert self._session is not None
+        Thing = models.thing.Thing
+        buckets = {}
+        n = 0
+        Q = self._session.query(Thing.format_id, Thing.date_modified, Thing.date_uploaded)
+        for row in Q.yield_per(batch_size):
+            key = (thingstats._formatId(row.format_id), thingstats.statsDay(row.date_modified))
+            bucket = buckets.setdefault(key, [0, None, None])
+            bucket[0] += 1
+            if row.date_uploaded is not None:
+                v = thingstats._naive(row.date_uploaded)
+                if bucket[1] is None or v < bucket[1]:
+                    bucket[1] = v
+                if bucket[2] is None or v > bucket[2]:
+                    bucket[2] = v
+            n += 1
+        self._session.query(thingstats.ThingStats).delete(synchronize_session=False)
+        for (format_id, day), (count, oldest, newest) in buckets.items():
+            self._session.add(
+                thingstats.ThingStats(
+                    format_id=format_id,
+                    day=day,
+                    count=count,
+                    oldest_uploaded=oldest,
+                    newest_uploaded=newest,
+                )
+            )
+        self.commit()
+        self._L.info("Rebuilt statistics for %s things in %s buckets", n, len(buckets))
+        return n
+
+    def countThingsFiltered(self, format_id=None, from_date=None, to_date=None):
+        """
+        Count things matching the listObjects filters using thing_stats.
+
+        Whole days within the range are summed from the statistics buckets,
+        partial days at the ends of the range are counted with the
+        date_modified index. Stores without statistics are counted from
+        the thing table until they are migrated.
+
+        Args:
+            format_id: prefix of formatId to match
+            from_date: date_modified >= from_date
+            to_date: date_modified < to_date
+
+        Returns:
+            int, number of things
+        """
+        assert self._session is not None
+        Thing = models.thing.Thing
+        S = thingstats.ThingStats
+        from_date = utils.datetimeFromSomething(from_date, assume_local=False)
+        to_date = utils.datetimeFromSomething(to_date, assume_local=False)
+
+        def _exact(lo, hi):
+            Q = self._session.query(sqlalchemy.func.count(Thing.checksum_sha256))
+            if lo is not None:
+                Q = Q.filter(Thing.date_modified >= lo)
+            if hi is not None:
+                Q = Q.filter(Thing.date_modified < hi)
+            if format_id is not None:
+                Q = Q.filter(thingstats.bucketFormatId().like(format_id + "%"))
+            return Q.scalar()
+
+        if self._thingStatsMissing():
+            return _exact(from_date, to_date)
+
+        Q = self._session.query(sqlalchemy.func.coalesce(sqlalchemy.func.sum(S.count), 0))
+        if format_id is not None:
+            Q = Q.filter(S.format_id.like(format_id + "%"))
+        if from_date is not None and to_date is not None:
+            if from_date >= to_date:
+                return 0
+            if thingstats.statsDay(from_date) == thingstats.statsDay(to_date):
+                return _exact(from_date, to_date)
+        total = 0
+        if from_date is not None:
+            d0 = thingstats.statsDay(from_date)
+            Q = Q.filter(S.day > d0)
+            total += _exact(from_date, thingstats.dayStart(d0) + datetime.timedelta(days=1))
+        if to_date is not None:
+            d1 = thingstats.statsDay(to_date)
+            Q = Q.filter(S.day < d1)
+            total += _exact(thingstats.dayStart(d1), to_date)
+        return total + Q.scalar()
+
     def countThings(self):
-        Q = self._session.query(models.thing.Thing)
-        return Q.count()
+        return self.countThingsFiltered()
+
+    def _staleStatsBounds(self):
+        """
+        Iterate (bucket, oldest, newest) for buckets whose date_uploaded
+        bounds were cleared by a removal, with the bounds recomputed.
+        """
+        Thing = models.thing.Thing
+        S = thingstats.ThingStats
+        stale = self._session.query(S).filter(S.oldest_uploaded == None, S.count > 0).all()
+        for bucket in stale:
+            lo = thingstats.dayStart(bucket.day)
+            Q = self._session.query(
+                sqlalchemy.func.min(Thing.date_uploaded), sqlalchemy.func.max(Thing.date_uploaded)
+            ).filter(
+                Thing.date_modified >= lo,
+                Thing.date_modified < lo + datetime.timedelta(days=1),
+                thingstats.bucketFormatId() == bucket.format_id,
+            )
+            oldest, newest = Q.one()
+            yield bucket, oldest, newest
+
+    def refreshThingStatsBounds(self):
+        """
+        Store recomputed date_uploaded bounds of buckets that had things removed.
+
+        Returns:
+            int, number of buckets updated
+        """
+        n = 0
+        for bucket, oldest, newest in self._staleStatsBounds():
+            bucket.oldest_uploaded, bucket.newest_uploaded = oldest, newest
+            n += 1
+        if n > 0:
+            self.commit()
+        return n
 
     def basicStatsThings(self):
+        """
+        Count and date_uploaded range of the things, without writing.
+        """
         stats = {}
-        Q = self._session.query(models.thing.Thing)
-        stats["count"] = Q.count()
-        newest = Q.order_by(models.thing.Thing.date_uploaded.desc()).limit(1).first()
-        oldest = Q.order_by(models.thing.Thing.date_uploaded.asc()).limit(1).first()
+        S = thingstats.ThingStats
+        Thing = models.thing.Thing
+        stats["count"] = self.countThings()
+        if self._thingStatsMissing():
+            oldest, newest = self._session.query(
+                sqlalchemy.func.min(Thing.date_uploaded),
+                sqlalchemy.func.max(Thing.date_uploaded),
+            ).one()
+        else:
+            oldest, newest = self._session.query(
+                sqlalchemy.func.min(S.oldest_uploaded), sqlalchemy.func.max(S.newest_uploaded)
+            ).filter(S.count > 0).one()
+            # Buckets that had things removed are recomputed, not stored
+            for bucket, lo, hi in self._staleStatsBounds():
+                if lo is not None and (oldest is None or lo < oldest):
+                    oldest = lo
+                if hi is not None and (newest is None or hi > newest):
+                    newest = hi
         if newest:
-            stats["newest"] = utils.datetimeToJsonStr(newest.date_uploaded)
-            stats["oldest"] = utils.datetimeToJsonStr(oldest.date_uploaded)
+            stats["newest"] = utils.datetimeToJsonStr(newest)
+            stats["oldest"] = utils.datetimeToJsonStr(oldest)
         else:
             stats["newest"] = ''
             stats["oldest"] = ''
@@ -27,8 +27,8 @@ LOG_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
 LOG_FORMAT = "%(asctime)s %(name)s:%(levelname)s: %(message)s"
 
 
-def getOpersistInstance(folder, db_url=None):
-    op = opersist.OPersist(folder, db_url=db_url)
+def getOpersistInstance(folder, db_url=None, engine_profile=None):
+    op = opersist.OPersist(folder, db_url=db_url, engine_profile=engine_profile)
     op.open()
     return op
 
@@ -44,8 +44,14 @@ def getOpersistInstance(folder, db_url=None):
 @click.option(
     "-f", "--folder", default=opersist.DEFAULT_STORE, help="Folder for opersist content"
 )
+@click.option(
+    "-p",
+    "--profile",
+    default=None,
+    help="Engine profile, e.g. serve, harvest, bulk-load",
+)
 @click.pass_context
-def main(ctx, verbosity, folder):
+def main(ctx, verbosity, folder, profile):
     ctx.ensure_object(dict)
     verbosity = verbosity.upper()
     logging.basicConfig(
@@ -57,6 +63,7 @@ def main(ctx, verbosity, folder):
     if verbosity not in LOG_LEVELS.keys():
         L.warning("%s is not a log level, set to INFO", verbosity)
     ctx.obj["folder"] = os.path.abspath(folder)
+    ctx.obj["profile"] = profile
 
 
 @main.command("init")
@@ -68,7 +75,7 @@ def initializeInstance(ctx):
     L = logging.getLogger("init")
     folder = ctx.obj["folder"]
     L.info("Setting up opersist in %s", folder)
-    op = getOpersistInstance(folder)
+    op = getOpersistInstance(folder, engine_profile=ctx.obj["profile"])
     print(json.dumps(op.getConfig(), indent="  "))
     op.close()
 
@@ -101,7 +108,7 @@ def subjects(ctx, name, subj, operation):
     '''
     L = logging.getLogger("subjects")
     folder = ctx.obj["folder"]
-    op = getOpersistInstance(folder)
+    op = getOpersistInstance(folder, engine_profile=ctx.obj["profile"])
     if operation in ["c", "create"]:
         new_subject = op.getSubject(subj, name=name, create_if_missing=True)
         print(new_subject)
@@ -157,7 +164,7 @@ def accessRules(ctx, perm, subj, ar_id, operation):
     '''
     L = logging.getLogger("accessRules")
     folder = ctx.obj["folder"]
-    op = getOpersistInstance(folder)
+    op = getOpersistInstance(folder, engine_profile=ctx.obj["profile"])
 
     # create a new access rule
     if operation in ["c", "create"]:
@@ -240,7 +247,7 @@ def things(ctx, operation, fname, sha256, identifier, format_id, series_id):
     '''
     L = logging.getLogger("things")
     folder = ctx.obj["folder"]
-    op = getOpersistInstance(folder)
+    op = getOpersistInstance(folder, engine_profile=ctx.obj["profile"])
 
     if operation in ["d", "delete"]:
         if sha256 is None:
@@ -276,6 +283,38 @@ def things(ctx, operation, fname, sha256, identifier, format_id, series_id):
         print(athing)
 
 
+@main.command("index")
+@click.pass_context
+@click.option(
+    "--rebuild", is_flag=True, default=False, help="Remove and rebuild all entries"
+)
+def indexIdentifiers(ctx, rebuild):
+    '''
+    Populate the identifier index for things added before it existed.
+    '''
+    L = logging.getLogger("index")
+    folder = ctx.obj["folder"]
+    op = getOpersistInstance(folder, engine_profile=ctx.obj["profile"])
+    n = op.indexThingIdentifiers(rebuild=rebuild)
+    L.info("Indexed identifiers of %s things", n)
+    op.close()
+
+
+@main.command("stats")
+@click.pass_context
+def rebuildStats(ctx):
+    '''
+    Recompute the thing statistics used for counts from the things.
+    '''
+    L = logging.getLogger("stats")
+    folder = ctx.obj["folder"]
+    op = getOpersistInstance(folder, engine_profile=ctx.obj["profile"])
+    n = op.rebuildThingStats()
+    L.info("Rebuilt statistics of %s things", n)
+    print(json.dumps(op.basicStatsThings(), indent="  "))
+    op.close()
+
+
 @main.command("rel")
 @click.pass_context
 def relations(ctx):
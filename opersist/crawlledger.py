@@ -0,0 +1,275 @@
+"""
+Per node ledger of sitemap locs and the outcome of their last retrieval.
+
+The ledger is loaded into memory when a crawl starts so that sitemap
+entries can be checked without a query per loc. A loc is unchanged when
+its sitemap lastmod is not newer than the lastmod recorded when it was
+last retrieved, that retrieval succeeded and its content is in the store.
+The ETag and Last-Modified validators of the response are kept in the info
+of the entry for revalidating locs that may have changed. Updates are
+buffered and written in batches.
+"""
+
+import time
+import datetime
+import logging
+import sqlalchemy
+import sqlalchemy.exc
+from . import utils
+from . import models
+from .models import crawlstatus
+
+# Maximum number of bound parameters per IN clause
+_IN_CHUNK = 500
+
+
+def _utc(dt):
+    """
+    Naive UTC datetime for dt, naive values are taken as UTC.
+    """
+    if dt is None:
+        return None
+    if dt.tzinfo is not None and dt.tzinfo.utcoffset(dt) is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _validators(info):
+    """
+    The validators held in the info of a ledger entry, or None.
+    """
+    if not info:
+        return None
+    validators = {k: info[k] for k in ("etag", "last_modified") if info.get(k)}
+    if len(validators) == 0:
+        return None
+    return validators
+
+
+class CrawlLedger(object):
+
+    L = logging.getLogger("CrawlLedger")
+
+    def __init__(self, op, batch_size: int = 500):
+        """
+        Args:
+            op: Open OPersist instance holding the ledger
+            batch_size: Number of pending updates written per transaction
+        """
+        self._op = op
+        self.batch_size = batch_size
+        # url -> (lastmod, status, content stored, validators)
+        self._entries = {}
+        self._pending = {}
+        self._crawl_info_id = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, batch_size=10000):
+        """
+        Read the ledger of the node into memory.
+
+        Returns:
+            int, number of entries
+        """
+        CS = crawlstatus.CrawlStatus
+        session = self._op.getSession()
+        Q = session.query(
+            CS.url, CS.lastmod, CS.status, CS.checksum_sha256, CS.info
+        )
+        entries = {}
+        for row in Q.yield_per(batch_size):
+            entries[row.url] = (
+                _utc(row.lastmod),
+                row.status,
+                row.checksum_sha256 is not None,
+                _validators(row.info),
+            )
+        self._entries = entries
+        return len(entries)
+
+    def isUnchanged(self, url: str, lastmod: datetime.datetime):
+        """
+        True if the content of url was stored at a lastmod not older than lastmod.
+
+        Locs without a lastmod are never considered unchanged.
+        """
+        if lastmod is None:
+            return False
+        entry = self._entries.get(url)
+        if entry is None:
+            return False
+        last_lastmod, status, stored, _ = entry
+        if status != 200 or not stored or last_lastmod is None:
+            return False
+        return _utc(lastmod) <= last_lastmod
+
+    def validators(self, url: str):
+        """
+        Validators of the last response from url, for a conditional request.
+
+        Only available when the content of that response is in the store.
+
+        Returns:
+            dict with "etag" and / or "last_modified" or None
+        """
+        entry = self._entries.get(url)
+        if entry is None or entry[1] != 200 or not entry[2]:
+            return None
+        return entry[3]
+
+    def recordResponse(
+        self,
+        url: str,
+        status: int,
+        lastmod: datetime.datetime = None,
+        etag: str = None,
+        last_modified: str = None,
+    ):
+        """
+        Record the retrieval of url.
+
+        Any previously recorded content is cleared until recordContent is
+        called for the new response.
+
+        Args:
+            url: The sitemap loc
+            status: HTTP status of the response
+            lastmod: The sitemap lastmod of the loc
+            etag: ETag header of the response
+            last_modified: Last-Modified header of the response
+        """
+        lastmod = _utc(lastmod)
+        info = {}
+        if etag is not None:
+            info["etag"] = etag
+        if last_modified is not None:
+            info["last_modified"] = last_modified
+        self._entries[url] = (lastmod, status, False, _validators(info))
+        self._record(
+            url,
+            t=utils.dtnow(),
+            status=status,
+            lastmod=lastmod,
+            checksum_sha256=None,
+            info=info,
+        )
+
+    def recordNotModified(self, url: str, lastmod: datetime.datetime = None):
+        """
+        Record a response to a conditional request for url confirming the
+        stored content is current.
+        """
+        entry = self._entries.get(url)
+        if entry is None:
+            return
+        lastmod = _utc(lastmod)
+        if lastmod is None or (entry[0] is not None and lastmod < entry[0]):
+            lastmod = entry[0]
+        self._entries[url] = (lastmod, entry[1], entry[2], entry[3])
+        self._record(url, t=utils.dtnow(), lastmod=lastmod)
+
+    def recordContent(self, url: str, checksum_sha256: str):
+        """
+        Record that the content retrieved from url is held in the store.
+        """
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries[url] = (entry[0], entry[1], True, entry[3])
+        self._record(url, checksum_sha256=checksum_sha256)
+
+    def _record(self, url, **values):
+        if self._crawl_info_id is not None:
+            values["crawl_info_id"] = self._crawl_info_id
+        self._pending.setdefault(url, {}).update(values)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write pending updates to the ledger in a single transaction.
+        """
+        if len(self._pending) == 0:
+            return
+        pending = self._pending
+        self._pending = {}
+        retries = self._op._profile["write_retries"]
+        attempt = 0
+        while True:
+            try:
+                self._write(pending)
+                return
+            except sqlalchemy.exc.OperationalError as e:
+                self._op.getSession().rollback()
+                if not models.isLockError(e) or attempt >= retries:
+                    self.L.error("Could not write %s ledger entries: %s", len(pending), e)
+                    return
+                delay = self._op._retryDelay(attempt)
+                attempt += 1
+                time.sleep(delay)
+
+    def _write(self, pending):
+        CS = crawlstatus.CrawlStatus
+        session = self._op.getSession()
+        urls = list(pending.keys())
+        existing = set()
+        for i in range(0, len(urls), _IN_CHUNK):
+            Q = session.query(CS.url).filter(CS.url.in_(urls[i : i + _IN_CHUNK]))
+            existing.update(row.url for row in Q)
+        updates = []
+        inserts = []
+        for url, values in pending.items():
+            if url in existing:
+                updates.append(dict(values, url=url))
+            else:
+                row = {
+                    "url": url,
+                    "t": None,
+                    "lastmod": None,
+                    "status": None,
+                    "checksum_sha256": None,
+                    "info": None,
+                    "crawl_info_id": self._crawl_info_id,
+                }
+                row.update(values)
+                inserts.append(row)
+        if len(updates) > 0:
+            session.bulk_update_mappings(CS, updates)
+        if len(inserts) > 0:
+            session.execute(CS.__table__.insert(), inserts)
+        self._op.commit()
+
+    def startCrawl(self, sitemap_url: str = None):
+        """
+        Record the start of a crawl, later updates refer to it.
+
+        Returns:
+            int, id of the CrawlInfo entry
+        """
+        session = self._op.getSession()
+        info = crawlstatus.CrawlInfo(sitemap_url=sitemap_url, t_start=utils.dtnow())
+        session.add(info)
+        self._op.commit()
+        self._crawl_info_id = info._id
+        return self._crawl_info_id
+
+    def finishCrawl(self, stats: dict = None):
+        """
+        Write pending updates and record the end of the crawl with its statistics.
+        """
+        self.flush()
+        if self._crawl_info_id is None:
+            return
+        scrapy_stats = {}
+        for k, v in (stats or {}).items():
+            if isinstance(v, datetime.datetime):
+                v = utils.datetimeToJsonStr(v)
+            scrapy_stats[k] = v
+        session = self._op.getSession()
+        info = session.query(crawlstatus.CrawlInfo).get(self._crawl_info_id)
+        if info is not None:
+            info.t_end = utils.dtnow()
+            info.scrapy_stats = scrapy_stats
+            self._op.commit()
+        self._crawl_info_id = None
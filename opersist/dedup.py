@@ -0,0 +1,94 @@
+"""
+In-memory index of the identifiers in an OPersist store, for deduplication.
+
+The series and alternate identifiers of things that are not obsoleted
+are held as sets of string hashes, so a check costs a couple of set
+lookups regardless of the size of the store. A hit is confirmed against
+the database, which resolves hash collisions and things obsoleted since
+the index was loaded.
+"""
+
+import time
+import logging
+from . import models
+from .models import thing
+
+
+class DedupIndex(object):
+
+    L = logging.getLogger("DedupIndex")
+
+    def __init__(self, op, refresh_interval: float = 60.0):
+        """
+        Args:
+            op: Open OPersist instance to index
+            refresh_interval: Minimum seconds between incremental refreshes
+        """
+        self._op = op
+        self.refresh_interval = refresh_interval
+        self._sids = set()
+        self._alts = set()
+        self._last_added = None
+        self._last_refresh = 0
+
+    def __len__(self):
+        return len(self._sids) + len(self._alts)
+
+    def refresh(self):
+        """
+        Add identifiers of things added since the last refresh.
+
+        Returns:
+            int, number of identifiers read
+        """
+        Thing = models.thing.Thing
+        TI = models.thing.ThingIdentifier
+        session = self._op.getSession()
+        Q = (
+            session.query(TI.identifier, TI.role, Thing.t_added)
+            .join(Thing, Thing.checksum_sha256 == TI.checksum_sha256)
+            .filter(Thing.obsoleted_by == None)
+            .filter(TI.role.in_([thing.ROLE_SID, thing.ROLE_ALT]))
+        )
+        if self._last_added is not None:
+            Q = Q.filter(Thing.t_added > self._last_added)
+        n = 0
+        for row in Q.yield_per(10000):
+            if row.role == thing.ROLE_SID:
+                self._sids.add(hash(row.identifier))
+            else:
+                self._alts.add(hash(row.identifier))
+            if self._last_added is None or row.t_added > self._last_added:
+                self._last_added = row.t_added
+            n += 1
+        self._last_refresh = time.monotonic()
+        self.L.debug("Read %s identifiers from %s", n, self._op.fs_path)
+        return n
+
+    def mayContain(self, series_id, alt_ids: list = None):
+        """
+        False if no thing matches series_id or alt_ids, True if one may.
+
+        Matching follows OPersist.getThingsSIDOrAltIdentifier.
+        """
+        if time.monotonic() - self._last_refresh > self.refresh_interval:
+            self.refresh()
+        if series_id is not None:
+            h = hash(series_id)
+            if h in self._sids or h in self._alts:
+                return True
+        for alt_id in alt_ids or []:
+            if hash(alt_id) in self._alts:
+                return True
+        return False
+
+    def match(self, series_id, alt_ids: list = None):
+        """
+        Get the most recent thing matching series_id or alt_ids.
+
+        Returns:
+            Thing or None
+        """
+        if not self.mayContain(series_id, alt_ids):
+            return None
+        return self._op.getThingsSIDOrAltIdentifier(series_id=series_id, alt_ids=alt_ids)
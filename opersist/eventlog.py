@@ -0,0 +1,219 @@
+"""
+Append-only event log of a node with a batched background writer.
+
+Events are queued by log() and inserted by a writer thread in batches, so
+the caller never waits on the log database. Entries older than the
+retention period are removed periodically by the writer.
+"""
+
+import time
+import queue
+import datetime
+import logging
+import threading
+import sqlalchemy
+import sqlalchemy.exc
+from . import utils
+from . import models
+from .models import logentry
+
+_STOP = object()
+
+
+class EventLog(object):
+
+    L = logging.getLogger("EventLog")
+
+    def __init__(
+        self,
+        db_url: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        retention_days: float = 365,
+        compact_interval: float = 3600.0,
+        max_pending: int = 100000,
+        profile: dict = None,
+    ):
+        """
+        Args:
+            db_url: SqlAlchemy URL of the log database
+            batch_size: Maximum number of entries inserted per transaction
+            flush_interval: Seconds to wait for more entries before writing
+            retention_days: Age of entries removed by compact(), None to keep all
+            compact_interval: Seconds between compactions by the writer
+            max_pending: Maximum number of queued entries, more are dropped
+            profile: Engine profile from models.getEngineProfile
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.compact_interval = compact_interval
+        self._engine = models.getEngine(
+            db_url, profile, metadata=logentry.LogBase.metadata
+        )
+        self._table = logentry.LogEntry.__table__
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self._last_compact = 0
+        self._writer = threading.Thread(
+            target=self._run, name="EventLogWriter", daemon=True
+        )
+        self._writer.start()
+
+    def log(
+        self,
+        identifier: str,
+        event: str,
+        ip_address: str = None,
+        user_agent: str = None,
+        subject: str = None,
+        date_logged: datetime.datetime = None,
+    ):
+        """
+        Queue an event for writing, never blocks.
+
+        Returns:
+            True if the event was queued, False if it was dropped
+        """
+        entry = {
+            "identifier": identifier,
+            "event": event,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "subject": subject,
+            "date_logged": date_logged if date_logged is not None else utils.dtnow(),
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                self.L.warning("Event log queue full, %s events dropped", self.dropped)
+            return False
+        return True
+
+    def flush(self):
+        """
+        Wait until all queued events are written.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Write queued events and stop the writer.
+        """
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._engine.dispose()
+
+    def _run(self):
+        running = True
+        while running:
+            batch = []
+            taken = 0
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                taken += 1
+                while item is not _STOP:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self._queue.get_nowait()
+                    taken += 1
+                if item is _STOP:
+                    running = False
+            except queue.Empty:
+                pass
+            try:
+                if len(batch) > 0:
+                    self._write(batch)
+                if (
+                    self.retention_days is not None
+                    and time.monotonic() - self._last_compact > self.compact_interval
+                ):
+                    self.compact()
+            except Exception as e:
+                self.L.error("Event log write failed: %s", e)
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+    def _write(self, batch, retries=5):
+        for attempt in range(retries + 1):
+            try:
+                with self._engine.begin() as conn:
+                    conn.execute(self._table.insert(), batch)
+                return
+            except sqlalchemy.exc.OperationalError as e:
+                if not models.isLockError(e) or attempt >= retries:
+                    raise
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+    def compact(self, retention_days: float = None):
+        """
+        Remove entries older than the retention period.
+
+        Returns:
+            int, number of entries removed
+        """
+        self._last_compact = time.monotonic()
+        if retention_days is None:
+            retention_days = self.retention_days
+        if retention_days is None:
+            return 0
+        cutoff = utils.dtnow() - datetime.timedelta(days=retention_days)
+        with self._engine.begin() as conn:
+            res = conn.execute(
+                self._table.delete().where(self._table.c.date_logged < cutoff)
+            )
+        if res.rowcount > 0:
+            self.L.info("Removed %s log entries before %s", res.rowcount, cutoff)
+        return res.rowcount
+
+    def getRecords(
+        self,
+        from_date: datetime.datetime = None,
+        to_date: datetime.datetime = None,
+        event: str = None,
+        id_filter: str = None,
+        start: int = 0,
+        count: int = 100,
+        after_id: int = None,
+    ):
+        """
+        Get a page of log entries in the order they were written.
+
+        Args:
+            from_date: date_logged >= from_date
+            to_date: date_logged < to_date
+            event: Event type to match
+            id_filter: Prefix of identifiers to match
+            start: Offset of the page, ignored if after_id is set
+            count: Maximum number of entries
+            after_id: Return entries following this entry_id
+
+        Returns:
+            total matching entries, list of entries
+        """
+        T = self._table
+        Q = sqlalchemy.select([T])
+        if from_date is not None:
+            Q = Q.where(T.c.date_logged >= from_date)
+        if to_date is not None:
+            Q = Q.where(T.c.date_logged < to_date)
+        if event is not None:
+            Q = Q.where(T.c.event == event)
+        if id_filter is not None:
+            Q = Q.where(T.c.identifier.like(id_filter + "%"))
+        with self._engine.connect() as conn:
+            total = conn.execute(
+                Q.with_only_columns([sqlalchemy.func.count()]).select_from(T)
+            ).scalar()
+            Q = Q.order_by(T.c.entry_id).limit(count)
+            if after_id is not None:
+                Q = Q.where(T.c.entry_id > after_id)
+            else:
+                Q = Q.offset(start)
+            records = conn.execute(Q).fetchall()
+        return total, records
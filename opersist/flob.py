@@ -8,20 +8,64 @@ characters of the sha256 hash hex digest.
 Each blob may have metadata stored under the same name but
 with the extension ".json". Any valid json-serializable
 informaiton may be included in the metadata.
+
+Blobs may also be stored precompressed next to the original, e.g.
+"<sha256>.bin.gz", for delivery with a Content-Encoding. Brotli and
+zstandard variants are available when the brotli and zstandard packages
+are installed.
 """
 
 import os
+import gzip
 import logging
 import hashlib
 import tempfile
 import pathlib
-import shutil
 import re
 
 try:
     import orjson as json
 except ModuleNotFoundError:
     import json
+try:
+    import brotli
+except ModuleNotFoundError:
+    brotli = None
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+ENCODING_SUFFIXES = {
+    "br": ".br",
+    "zstd": ".zst",
+    "gzip": ".gz",
+}
+"""Content-Encoding of precompressed variants and the suffix of their file"""
+
+
+def variantPath(blob_path: str, encoding: str):
+    """
+    Path of the variant of the blob at blob_path compressed with encoding.
+    """
+    return f"{blob_path}{ENCODING_SUFFIXES[encoding]}"
+
+
+def compress(b: bytes, encoding: str):
+    """
+    Compress bytes for a Content-Encoding.
+
+    Returns:
+        bytes, or None if the encoding is not available
+    """
+    if encoding == "gzip":
+        # mtime=0 so the variant depends only on the content
+        return gzip.compress(b, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(b)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=19).compress(b)
+    return None
 
 
 class FLOB(object):
@@ -31,8 +75,25 @@ class FLOB(object):
     BLOCK_SIZE = 65536
     SHA256_REGEX = re.compile(r"^[a-f0-9]{64}(:.+)?$", re.IGNORECASE)
 
-    def __init__(self, root_path: str = "."):
+    # Variants are not kept for blobs smaller than this
+    MIN_VARIANT_SIZE = 256
+
+    def __init__(self, root_path: str = ".", encodings: list = None):
+        """
+        Args:
+            root_path: Folder of the store
+            encodings: Content-Encodings of precompressed variants to store
+                with each blob, e.g. ["gzip", "br"]
+        """
         self.root_path = os.path.abspath(root_path)
+        self.encodings = []
+        for encoding in encodings or []:
+            if encoding not in ENCODING_SUFFIXES:
+                raise ValueError(f"Unsupported blob encoding: {encoding}")
+            if compress(b"", encoding) is None:
+                self.L.warning("Blob encoding %s is not available", encoding)
+                continue
+            self.encodings.append(encoding)
         os.makedirs(self.root_path, exist_ok=True)
 
     def close(self):
@@ -58,8 +119,50 @@ class FLOB(object):
         if os.path.exists(f_meta):
             os.unlink(f_meta)
             removed = removed + 2
+        for encoding in ENCODING_SUFFIXES:
+            f_variant = variantPath(f_name, encoding)
+            if os.path.exists(f_variant):
+                os.unlink(f_variant)
         return removed
 
+    def addVariants(self, hash: str, b: bytes = None):
+        """
+        Write the precompressed variants of a blob.
+
+        A variant is only kept if it is smaller than the blob.
+
+        Args:
+            hash: sha256 of the blob
+            b: content of the blob, read from the store if None
+
+        Returns:
+            list of encodings written
+        """
+        written = []
+        if len(self.encodings) == 0:
+            return written
+        hash = hash.strip().lower()
+        f_dest = os.path.join(
+            self.root_path, self.pathFromHash(hash), f"{hash}.{self.EXTENSION}"
+        )
+        if b is None:
+            with open(f_dest, "rb") as f_src:
+                b = f_src.read()
+        if len(b) < self.MIN_VARIANT_SIZE:
+            return written
+        for encoding in self.encodings:
+            cb = compress(b, encoding)
+            if cb is None or len(cb) >= len(b):
+                continue
+            f_variant = variantPath(f_dest, encoding)
+            with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(f_dest), suffix=".tmp", delete=False
+            ) as tmp_dest:
+                tmp_dest.write(cb)
+            os.replace(tmp_dest.name, f_variant)
+            written.append(encoding)
+        return written
+
     def add(
         self, b: bytes, hash: str = None, metadata: dict = None, allow_replace=False
     ):
@@ -78,9 +181,7 @@ class FLOB(object):
             fldr_dest, sha256, path_to_file
         """
         if hash is None:
-            sha = hashlib.sha256()
-            sha.update(b)
-            hash = sha.hexdigest()
+            hash = hashlib.sha256(b).hexdigest()
         else:
             hash = hash.strip().lower()
         fldr_dest = self.pathFromHash(hash)
@@ -90,8 +191,12 @@ class FLOB(object):
         f_dest = f"{f_base}.{self.EXTENSION}"
         if os.path.exists(f_dest) and not allow_replace:
             raise ValueError(f"opersist.flob.FLOB.addFile - Entry already exists: {hash}")
-        with open(f_dest, "wb") as fout:
-            fout.write(b)
+        # Write next to the destination and rename so readers never see a partial blob
+        with tempfile.NamedTemporaryFile(dir=abs_fldr, suffix=".tmp", delete=False) as tmp_dest:
+            tmpfile_name = tmp_dest.name
+            tmp_dest.write(b)
+        os.replace(tmpfile_name, f_dest)
+        self.addVariants(hash, b)
         if not metadata is None:
             with open(f"{f_base}.json", "w") as fout:
                 json.dump(metadata, fout, indent=2)
@@ -113,7 +218,8 @@ class FLOB(object):
         sha = hashlib.sha256()
         nbytes = 0
         tmpfile_name = None
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_dest:
+        # Stage on the same file system as the store so the final move is a rename
+        with tempfile.NamedTemporaryFile(dir=self.root_path, suffix=".tmp", delete=False) as tmp_dest:
             tmpfile_name = tmp_dest.name
             fbuf = fh.read(self.BLOCK_SIZE)
             while len(fbuf) > 0:
@@ -123,6 +229,7 @@ class FLOB(object):
                 nbytes += len(fbuf)
                 fbuf = fh.read(self.BLOCK_SIZE)
         if nbytes <= 0:
+            os.unlink(tmpfile_name)
             raise ValueError("opersist.flob.FLOB.addFile - No content in provided file handle")
         if hash is None:
             hash = sha.hexdigest()
@@ -134,7 +241,8 @@ class FLOB(object):
         if os.path.exists(f_dest) and not allow_replace:
             os.unlink(tmpfile_name)
             raise ValueError(f"opersist.flob.FLOB.addFile - Entry already exists: {hash}")
-        shutil.move(tmpfile_name, f_dest)
+        os.replace(tmpfile_name, f_dest)
+        self.addVariants(hash)
         if not metadata is None:
             with open(f"{f_base}.json", "w") as fout:
                 json.dump(metadata, fout, indent=2)
@@ -7,6 +7,7 @@ import sqlalchemy.schema
 import sqlalchemy.ext.compiler
 import sqlalchemy.types
 import sqlalchemy.dialects.postgresql
+import sqlalchemy.event
 
 __all__ = [
     "request",
@@ -17,6 +18,7 @@ __all__ = [
     "accessrule",
     "thing",
     "crawlstatus",
+    "logentry",
 ]
 
 _L = logging.getLogger("opersist.models")
@@ -36,25 +38,164 @@ def compile_binary_sqlite(type_, compiler, **kw):
     return "STRING"
 
 
-def createAll(engine):
+def createAll(engine, metadata=None):
     """
     Create the database tables etc if not aleady present.
 
     Args:
         engine: SqlAlchemy engine to use.
+        metadata: MetaData of the tables, defaults to Base.metadata
 
     Returns:
         nothing
     """
-    Base.metadata.create_all(engine)
+    if metadata is None:
+        metadata = Base.metadata
+    metadata.create_all(engine)
+    createMissingIndexes(engine, metadata)
 
 
-def getEngine(db_connection):
+def createMissingIndexes(engine, metadata=None):
+    """
+    Create indexes added to the models after their tables were created.
+
+    create_all only creates the indexes of new tables.
+
+    Args:
+        engine: SqlAlchemy engine to use.
+        metadata: MetaData of the tables, defaults to Base.metadata
+
+    Returns:
+        list of names of created indexes
+    """
+    if metadata is None:
+        metadata = Base.metadata
+    created = []
+    inspector = sqlalchemy.inspect(engine)
+    for table in metadata.sorted_tables:
+        existing = set([ix["name"] for ix in inspector.get_indexes(table.name)])
+        for index in table.indexes:
+            if index.name not in existing:
+                _L.info("Creating index %s on %s", index.name, table.name)
+                index.create(engine)
+                created.append(index.name)
+    return created
+
+
+SQLITE_PRAGMAS = ("journal_mode", "synchronous", "mmap_size", "cache_size", "busy_timeout")
+"""Profile entries applied as PRAGMA statements on each new sqlite connection"""
+
+ENGINE_PROFILES = {
+    # Web server, many concurrent readers and occasional writes
+    "serve": {
+        # Data migrations are left to the writers, see OPersist._migrate.
+        # Counts fall back to the thing table until statistics exist.
+        "migrate": False,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "busy_timeout": 5000,
+        "write_retries": 3,
+        "retry_delay": 0.1,
+        "retry_max_delay": 1.0,
+    },
+    # Crawler writing while the server reads
+    "harvest": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "busy_timeout": 30000,
+        "write_retries": 5,
+        "retry_delay": 0.5,
+        "retry_max_delay": 10.0,
+    },
+    # Initial load of a node with no concurrent readers
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,
+        "busy_timeout": 60000,
+        "write_retries": 5,
+        "retry_delay": 1.0,
+        "retry_max_delay": 30.0,
+    },
+}
+"""
+Named engine profiles. Entries may be overridden or added per node with
+the "engine_profiles" entry of node.json, e.g.::
+
+  "engine_profiles": {"serve": {"mmap_size": 0}}
+"""
+
+DEFAULT_RETRY_POLICY = {
+    "write_retries": 0,
+    "retry_delay": 0.5,
+    "retry_max_delay": 10.0,
+}
+
+
+def getEngineProfile(name, overrides=None):
+    """
+    Get the settings for a named engine profile.
+
+    Args:
+        name: Name of the profile, or None for the SQLAlchemy defaults
+        overrides: Optional dict of settings replacing those of the profile
+
+    Returns:
+        dict of profile settings
+    """
+    profile = dict(DEFAULT_RETRY_POLICY)
+    if name is None:
+        return profile
+    if name not in ENGINE_PROFILES and overrides is None:
+        raise ValueError(f"Unknown engine profile: {name}")
+    profile.update(ENGINE_PROFILES.get(name, {}))
+    if overrides is not None:
+        profile.update(overrides)
+    return profile
+
+
+def getEngine(db_connection, profile=None, metadata=None):
+    """
+    Create an engine and the database tables if necessary.
+
+    Args:
+        db_connection: SqlAlchemy database URL
+        profile: Optional dict from getEngineProfile. Entries named in
+            SQLITE_PRAGMAS are set on every new connection to a sqlite database.
+        metadata: MetaData of the tables to create, defaults to Base.metadata
+
+    Returns:
+        SqlAlchemy engine
+    """
     engine = sqlalchemy.create_engine(db_connection)
-    createAll(engine)
+    if profile is not None and engine.dialect.name == "sqlite":
+        pragmas = [(k, profile[k]) for k in SQLITE_PRAGMAS if profile.get(k) is not None]
+        if len(pragmas) > 0:
+
+            @sqlalchemy.event.listens_for(engine, "connect")
+            def setSqlitePragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for k, v in pragmas:
+                    cursor.execute(f"PRAGMA {k}={v}")
+                cursor.close()
+
+    createAll(engine, metadata)
     return engine
 
 
+def isLockError(e):
+    """
+    True if the exception e indicates the database is locked by another writer.
+    """
+    if not isinstance(e, sqlalchemy.exc.OperationalError):
+        return False
+    msg = str(e.orig).lower()
+    return "locked" in msg or "busy" in msg
+
+
 def getSession(engine):
     session = sqlalchemy.orm.scoped_session(
         sqlalchemy.orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
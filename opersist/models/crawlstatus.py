@@ -1,17 +1,15 @@
-import logging
-import os
-import time
+"""
+Implements the CrawlInfo and CrawlStatus ORM, the crawl ledger of a node.
+
+CrawlStatus holds one row per sitemap loc with the outcome of the most
+recent retrieval, so that a later crawl can skip locs that have not
+changed since (see opersist.crawlledger).
+"""
 
-try:
-    import orjson as json
-except ModuleNotFoundError:
-    import json
-import dateparser
 import sqlalchemy
-import sqlalchemy.ext.declarative
 import sqlalchemy.orm
-import sqlalchemy.exc
-import sqlalchemy.event
+import opersist.models
+import opersist.utils
 
 
 class CrawlInfo(opersist.models.Base):
@@ -35,6 +33,16 @@ class CrawlInfo(opersist.models.Base):
         default=None,
         doc="Sitemap crawled",
     )
+    t_start = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=True),
+        default=opersist.utils.dtnow,
+        doc="When the crawl started",
+    )
+    t_end = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=True),
+        default=None,
+        doc="When the crawl finished",
+    )
     scrapy_stats = sqlalchemy.Column(
         sqlalchemy.JSON(sqlalchemy.String),
         default={},
@@ -44,13 +52,15 @@ class CrawlInfo(opersist.models.Base):
 
 class CrawlStatus(opersist.models.Base):
     """
-    Status of a crawl operation
+    Status of the most recent retrieval of a sitemap loc
 
-    crawl_id
     url
-    timestamp
+    t
+    lastmod
     status
+    checksum_sha256
     info - JSON
+    crawl_info_id
     """
 
     __tablename__ = "crawlstatus"
@@ -61,8 +71,18 @@ class CrawlStatus(opersist.models.Base):
         default=opersist.utils.dtnow,
         doc="When the content was accessed",
     )
-    status = sqlalchemy.String(
-        index=True, default="UNKNOWN", doc="Status string for response"
+    lastmod = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=True),
+        default=None,
+        doc="Sitemap lastmod of the loc when retrieved, UTC",
+    )
+    status = sqlalchemy.Column(
+        sqlalchemy.Integer, index=True, default=None, doc="HTTP status of the response"
+    )
+    checksum_sha256 = sqlalchemy.Column(
+        sqlalchemy.String,
+        default=None,
+        doc="sha256 of the content stored from the response, if any",
     )
     info = sqlalchemy.Column(
         sqlalchemy.JSON(sqlalchemy.String),
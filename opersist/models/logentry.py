@@ -0,0 +1,52 @@
+"""
+Implements the LogEntry ORM, the DataONE event log of a node.
+
+Log entries are kept in their own database (log_database in node.json),
+so the tables are declared on LogBase rather than opersist.models.Base.
+"""
+
+import sqlalchemy
+import sqlalchemy.ext.declarative
+import opersist.utils
+
+LogBase = sqlalchemy.ext.declarative.declarative_base()
+
+EVENT_CREATE = "create"
+EVENT_READ = "read"
+EVENT_UPDATE = "update"
+EVENT_DELETE = "delete"
+
+
+class LogEntry(LogBase):
+    __tablename__ = "log_entry"
+    entry_id = sqlalchemy.Column(
+        sqlalchemy.Integer,
+        primary_key=True,
+        autoincrement=True,
+        doc="Sequential id of the entry, also the paging key",
+    )
+    identifier = sqlalchemy.Column(
+        sqlalchemy.String, nullable=False, index=True, doc="PID of the object"
+    )
+    event = sqlalchemy.Column(
+        sqlalchemy.String, nullable=False, doc="DataONE event type, e.g. read"
+    )
+    date_logged = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=True),
+        nullable=False,
+        default=opersist.utils.dtnow,
+        index=True,
+        doc="When the event occurred",
+    )
+    ip_address = sqlalchemy.Column(
+        sqlalchemy.String, nullable=True, doc="Address of the client"
+    )
+    user_agent = sqlalchemy.Column(
+        sqlalchemy.String, nullable=True, doc="User agent of the client"
+    )
+    subject = sqlalchemy.Column(
+        sqlalchemy.String, nullable=True, doc="Subject of the client"
+    )
+    __table_args__ = (
+        sqlalchemy.Index("ix_log_entry_event_date_logged", "event", "date_logged"),
+    )
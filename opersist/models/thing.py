@@ -17,6 +17,51 @@ import opersist.models.accessrule
 
 DEFAULT_FORMATID = "application/octet-stream"
 
+# Roles of entries in the thing_identifier table
+ROLE_PID = "pid"
+ROLE_SID = "sid"
+ROLE_ALT = "alt"
+
+
+class ThingIdentifier(opersist.models.Base):
+    """
+    Index of identifiers associated with a Thing.
+
+    One row per identifier and role (pid, sid, or alt for entries of
+    Thing.identifiers), keyed for lookup by identifier value.
+    """
+
+    __tablename__ = "thing_identifier"
+
+    identifier = sqlalchemy.Column(
+        sqlalchemy.String, primary_key=True, doc="Identifier value"
+    )
+    role = sqlalchemy.Column(
+        sqlalchemy.String, primary_key=True, doc="Role of the identifier, pid | sid | alt"
+    )
+    checksum_sha256 = sqlalchemy.Column(
+        sqlalchemy.String,
+        sqlalchemy.ForeignKey("thing.checksum_sha256"),
+        primary_key=True,
+        index=True,
+        doc="Thing the identifier is associated with",
+    )
+
+
+def identifierIndexEntries(identifier, series_id, identifiers):
+    """
+    List of (identifier, role) for the thing_identifier rows of a Thing.
+    """
+    entries = []
+    if identifier is not None:
+        entries.append((identifier, ROLE_PID))
+    if series_id is not None:
+        entries.append((series_id, ROLE_SID))
+    for alt_id in set(identifiers or []):
+        if alt_id is not None:
+            entries.append((alt_id, ROLE_ALT))
+    return entries
+
 
 class Thing(opersist.models.Base):
 
@@ -60,6 +105,7 @@ class Thing(opersist.models.Base):
     t_added = sqlalchemy.Column(
         sqlalchemy.DateTime(timezone=True),
         default=opersist.utils.dtnow,
+        index=True,
         doc="When the content was added to the database",
     )
 
@@ -187,7 +233,14 @@ class Thing(opersist.models.Base):
         default=None,
         doc="Additional information pertinent to this record",
     )
-    __table_args__ = (sqlalchemy.CheckConstraint("identifier != series_id"),)
+    identifier_index = sqlalchemy.orm.relationship(
+        "ThingIdentifier", cascade="all, delete-orphan"
+    )
+    __table_args__ = (
+        sqlalchemy.CheckConstraint("identifier != series_id"),
+        # Supports keyset pagination of listings ordered by date_modified
+        sqlalchemy.Index("ix_thing_date_modified_sha256", "date_modified", "checksum_sha256"),
+    )
 
     @sqlalchemy.orm.validates("identifier", "series_id", "format_id")
     def validate_identifier(self, key, value):
@@ -202,6 +255,25 @@ class Thing(opersist.models.Base):
                     )
         return value
 
+    def indexIdentifiers(self):
+        """
+        Set identifier_index from the identifier, series_id and identifiers.
+        """
+        self.identifier_index = [
+            ThingIdentifier(identifier=v, role=r, checksum_sha256=self.checksum_sha256)
+            for v, r in identifierIndexEntries(
+                self.identifier, self.series_id, self.identifiers
+            )
+        ]
+
+    def submitterSubject(self):
+        """
+        Subject string of the submitter, also before the thing is flushed.
+        """
+        if self.submitter is None:
+            return self.submitter_id
+        return self.submitter.subject
+
     def asJsonDict(self):
         res = {
             "identifier": self.identifier,
@@ -257,6 +329,25 @@ class Thing(opersist.models.Base):
         return json.dumps(self.asJsonDict())
 
 
+def listingOptions():
+    """
+    Query options for serializing many Things with asJsonDict.
+
+    Columns are loaded with the rows and the subjects and access rules
+    of the page are loaded with one query per relationship, so the
+    number of queries does not grow with the number of rows.
+    """
+    AccessRule = opersist.models.accessrule.AccessRule
+    return [
+        sqlalchemy.orm.defer(Thing._meta),
+        sqlalchemy.orm.selectinload(Thing.submitter),
+        sqlalchemy.orm.selectinload(Thing.rights_holder),
+        sqlalchemy.orm.selectinload(Thing.access_policy).selectinload(
+            AccessRule.subjects
+        ),
+    ]
+
+
 @sqlalchemy.event.listens_for(Thing, "before_insert")
 def doThingChecks(mapper, connect, target):
     logging.debug("At doThingChecks: %s", target)
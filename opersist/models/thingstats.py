@@ -0,0 +1,177 @@
+"""
+Implements the ThingStats ORM, counts of things maintained on write.
+
+Counts are bucketed by format_id and the UTC day of date_modified so that
+totals for listings filtered by formatId and date_modified ranges can be
+computed without counting rows of the thing table.
+"""
+
+import datetime
+import collections
+import sqlalchemy
+import sqlalchemy.orm
+import opersist.models
+import opersist.models.thing
+import opersist.utils
+
+
+class ThingStats(opersist.models.Base):
+    __tablename__ = "thing_stats"
+    format_id = sqlalchemy.Column(
+        sqlalchemy.String, primary_key=True, doc="DataONE formatId of the things"
+    )
+    day = sqlalchemy.Column(
+        sqlalchemy.String,
+        primary_key=True,
+        doc="UTC day of the things date_modified, YYYY-MM-DD",
+    )
+    count = sqlalchemy.Column(
+        sqlalchemy.Integer, nullable=False, default=0, doc="Number of things"
+    )
+    oldest_uploaded = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=True),
+        nullable=True,
+        doc="Oldest date_uploaded in the bucket, None if it must be recomputed",
+    )
+    newest_uploaded = sqlalchemy.Column(
+        sqlalchemy.DateTime(timezone=True),
+        nullable=True,
+        doc="Newest date_uploaded in the bucket, None if it must be recomputed",
+    )
+
+
+def statsDay(dt):
+    """
+    Bucket key for a datetime, naive values are taken as UTC.
+    """
+    if dt.tzinfo is not None and dt.tzinfo.utcoffset(dt) is not None:
+        dt = dt.astimezone(datetime.timezone.utc)
+    return dt.strftime("%Y-%m-%d")
+
+
+def dayStart(day):
+    """
+    UTC datetime of the start of a bucket day.
+    """
+    return datetime.datetime.strptime(day, "%Y-%m-%d").replace(
+        tzinfo=datetime.timezone.utc
+    )
+
+
+def _naive(dt):
+    if dt is None:
+        return None
+    if dt.tzinfo is not None and dt.tzinfo.utcoffset(dt) is not None:
+        return dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _formatId(v):
+    return v if v is not None else opersist.models.thing.DEFAULT_FORMATID
+
+
+def bucketFormatId():
+    """
+    Thing.format_id as bucketed, things without a format_id are counted
+    under DEFAULT_FORMATID.
+    """
+    Thing = opersist.models.thing.Thing
+    return sqlalchemy.func.coalesce(
+        Thing.format_id, opersist.models.thing.DEFAULT_FORMATID
+    )
+
+
+def updateThingStats(session, flush_context, instances):
+    """
+    before_flush listener applying changes of things to ThingStats.
+    """
+    Thing = opersist.models.thing.Thing
+    delta = collections.defaultdict(int)
+    uploaded = collections.defaultdict(list)
+    for obj in session.new:
+        if isinstance(obj, Thing):
+            if obj.date_modified is None:
+                obj.date_modified = opersist.utils.dtnow()
+            key = (_formatId(obj.format_id), statsDay(obj.date_modified))
+            delta[key] += 1
+            uploaded[key].append(obj.date_uploaded)
+    for obj in session.deleted:
+        if isinstance(obj, Thing):
+            state = sqlalchemy.inspect(obj)
+            fmt = state.attrs.format_id.history.deleted or [obj.format_id]
+            dm = state.attrs.date_modified.history.deleted or [obj.date_modified]
+            delta[(_formatId(fmt[0]), statsDay(dm[0]))] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Thing) or obj in session.deleted:
+            continue
+        state = sqlalchemy.inspect(obj)
+        h_fmt = state.attrs.format_id.history
+        h_dm = state.attrs.date_modified.history
+        if not (h_fmt.has_changes() or h_dm.has_changes()):
+            continue
+        old_fmt = h_fmt.deleted[0] if h_fmt.deleted else obj.format_id
+        old_dm = h_dm.deleted[0] if h_dm.deleted else obj.date_modified
+        old_key = (_formatId(old_fmt), statsDay(old_dm))
+        new_key = (_formatId(obj.format_id), statsDay(obj.date_modified))
+        if old_key != new_key:
+            delta[old_key] -= 1
+            delta[new_key] += 1
+            uploaded[new_key].append(obj.date_uploaded)
+    for key, n in delta.items():
+        if n == 0:
+            continue
+        _applyDelta(session, key, n, [_naive(v) for v in uploaded[key] if v is not None])
+
+
+def _applyDelta(session, key, n, values):
+    """
+    Add n to the count of the bucket key with a single UPDATE.
+
+    The new value is computed by the database rather than from a loaded
+    row, so concurrent writers to the store do not lose increments.
+    """
+    T = ThingStats.__table__
+    lo = min(values) if len(values) > 0 else None
+    hi = max(values) if len(values) > 0 else None
+    where = sqlalchemy.and_(T.c.format_id == key[0], T.c.day == key[1])
+    if n < 0:
+        # Bounds may have been removed, recomputed when next read
+        oldest = sqlalchemy.null()
+        newest = sqlalchemy.null()
+    else:
+        # An empty bucket takes the new bounds, unknown bounds stay unknown
+        p_lo = sqlalchemy.bindparam("lo", lo, type_=T.c.oldest_uploaded.type)
+        p_hi = sqlalchemy.bindparam("hi", hi, type_=T.c.newest_uploaded.type)
+        oldest = sqlalchemy.case(
+            [
+                (T.c.count == 0, p_lo),
+                (T.c.oldest_uploaded == None, sqlalchemy.null()),
+                (T.c.oldest_uploaded > p_lo, p_lo),
+            ],
+            else_=T.c.oldest_uploaded,
+        )
+        newest = sqlalchemy.case(
+            [
+                (T.c.count == 0, p_hi),
+                (T.c.newest_uploaded == None, sqlalchemy.null()),
+                (T.c.newest_uploaded < p_hi, p_hi),
+            ],
+            else_=T.c.newest_uploaded,
+        )
+    res = session.execute(
+        T.update()
+        .where(where)
+        .values(count=T.c.count + n, oldest_uploaded=oldest, newest_uploaded=newest)
+    )
+    if res.rowcount == 0:
+        # The UPDATE holds the sqlite write lock until commit, so no other
+        # writer can add the bucket in between
+        session.execute(
+            T.insert().values(
+                format_id=key[0],
+                day=key[1],
+                count=n,
+                oldest_uploaded=lo,
+                newest_uploaded=hi,
+            )
+        )
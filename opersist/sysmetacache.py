@@ -0,0 +1,128 @@
+"""
+Cache of rendered system metadata documents.
+
+Entries are keyed by the sha256 of a thing and its date_modified, so a
+document is never served for a different revision of the system metadata
+even when the thing was changed by another process. Documents are held in
+an in-process LRU and optionally in a file next to the blob.
+"""
+
+import os
+import datetime
+import threading
+import collections
+import logging
+
+
+class SysmetaCache(object):
+
+    L = logging.getLogger("SysmetaCache")
+    EXTENSION = "sysmeta.xml"
+
+    def __init__(self, ostore, max_entries: int = 1024, on_disk: bool = False):
+        """
+        Args:
+            ostore: FLOB holding the blobs of the things
+            max_entries: Number of documents kept in memory, 0 to disable
+            on_disk: Also keep documents in a file next to the blob
+        """
+        self._ostore = ostore
+        self.max_entries = max_entries
+        self.on_disk = on_disk
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def revision(date_modified):
+        """
+        Revision key for a date_modified, naive values are taken as UTC.
+        """
+        if date_modified is None:
+            return ""
+        if (
+            date_modified.tzinfo is not None
+            and date_modified.tzinfo.utcoffset(date_modified) is not None
+        ):
+            date_modified = date_modified.astimezone(datetime.timezone.utc).replace(
+                tzinfo=None
+            )
+        return date_modified.isoformat()
+
+    def _diskPath(self, sha256):
+        fldr = self._ostore.pathFromHash(sha256)
+        return os.path.join(
+            self._ostore.root_path, fldr, f"{sha256.lower()}.{self.EXTENSION}"
+        )
+
+    def get(self, sha256: str, date_modified):
+        """
+        Get the cached document for a revision of a thing.
+
+        Returns:
+            str or None if not cached
+        """
+        rev = self.revision(date_modified)
+        with self._lock:
+            entry = self._entries.get(sha256)
+            if entry is not None:
+                if entry[0] == rev:
+                    self._entries.move_to_end(sha256)
+                    return entry[1]
+                del self._entries[sha256]
+        if not self.on_disk:
+            return None
+        try:
+            with open(self._diskPath(sha256), "r", encoding="utf-8") as src:
+                disk_rev = src.readline().rstrip("\n")
+                if disk_rev != rev:
+                    return None
+                doc = src.read()
+        except FileNotFoundError:
+            return None
+        self._remember(sha256, rev, doc)
+        return doc
+
+    def _remember(self, sha256, rev, doc):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[sha256] = (rev, doc)
+            self._entries.move_to_end(sha256)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, sha256: str, date_modified, doc: str):
+        """
+        Cache the document for a revision of a thing.
+        """
+        rev = self.revision(date_modified)
+        self._remember(sha256, rev, doc)
+        if not self.on_disk:
+            return
+        f_dest = self._diskPath(sha256)
+        f_tmp = f"{f_dest}.tmp"
+        try:
+            with open(f_tmp, "w", encoding="utf-8") as dest:
+                dest.write(rev)
+                dest.write("\n")
+                dest.write(doc)
+            os.replace(f_tmp, f_dest)
+        except OSError as e:
+            self.L.warning("Could not cache system metadata for %s: %s", sha256, e)
+
+    def invalidate(self, sha256: str):
+        """
+        Drop any cached document of a thing.
+        """
+        with self._lock:
+            self._entries.pop(sha256, None)
+        if not self.on_disk:
+            return
+        try:
+            os.unlink(self._diskPath(sha256))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
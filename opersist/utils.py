@@ -2,6 +2,7 @@ import os
 import re
 import uuid
 import datetime
+import functools
 import dateparser
 import cgi
 import contextlib
@@ -29,6 +30,16 @@ JSON_HASH_INDENT = None
 # Match a space
 RE_SPACE = re.compile("\s")
 
+# W3C datetime / ISO 8601 timestamp as used in sitemaps and API queries
+RE_W3C_DATETIME = re.compile(
+    r"^(\d{4})(?:-(\d{2})(?:-(\d{2})"
+    r"(?:[Tt ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d+))?)?)?)?)?"
+    r"\s*(?:([Zz])|([+-])(\d{2})(?::?(\d{2}))?)?$"
+)
+
+# Number of distinct timestamp strings remembered by parseTimestamp
+TIMESTAMP_MEMO_SIZE = 4096
+
 
 def stringHasSpace(s):
     return RE_SPACE.search(s)
@@ -113,7 +124,7 @@ def floChecksums(flo, sha256=True, sha1=True, md5=True):
         hsha1 = hashlib.sha1()
     if md5:
         hmd5 = hashlib.md5()
-    fbuf = flo.read(HASH_BLOCK_SIZE)
+    fbuf = flo.read(BLOCK_SIZE)
     while len(fbuf) > 0:
         if sha256:
             hsha256.update(fbuf)
@@ -121,13 +132,13 @@ def floChecksums(flo, sha256=True, sha1=True, md5=True):
             hsha1.update(fbuf)
         if md5:
             hmd5.update(fbuf)
-        fbuf = flo.read(HASH_BLOCK_SIZE)
+        fbuf = flo.read(BLOCK_SIZE)
     if sha256:
         hashes["sha256"] = hsha256.hexdigest()
     if sha1:
         hashes["sha1"] = hsha1.hexdigest()
     if md5:
-        hashes["md5"] = md5.hexdigest()
+        hashes["md5"] = hmd5.hexdigest()
     return hashes
 
 
@@ -169,6 +180,75 @@ def dtnow():
     return datetime.datetime.now(datetime.timezone.utc)
 
 
+@functools.lru_cache(maxsize=TIMESTAMP_MEMO_SIZE)
+def _parseW3CDatetime(ds):
+    """
+    Parse a W3C datetime string, None if ds is not one.
+
+    Values without a timezone are taken as local time, as with dateparser.
+    Missing month or day are the first of the period.
+    """
+    match = RE_W3C_DATETIME.match(ds)
+    if match is None:
+        return None
+    (year, month, day, hour, minute, second, fraction, zulu, sign, tzh, tzm) = match.groups()
+    microsecond = 0
+    if fraction is not None:
+        microsecond = int(fraction[:6].ljust(6, "0"))
+    try:
+        dt = datetime.datetime(
+            int(year),
+            int(month or 1),
+            int(day or 1),
+            int(hour or 0),
+            int(minute or 0),
+            int(second or 0),
+            microsecond,
+        )
+    except ValueError:
+        return None
+    if zulu is not None:
+        return dt.replace(tzinfo=datetime.timezone.utc)
+    if sign is not None:
+        offset = datetime.timedelta(hours=int(tzh), minutes=int(tzm or 0))
+        if sign == "-":
+            offset = -offset
+        try:
+            return dt.replace(tzinfo=datetime.timezone(offset))
+        except ValueError:
+            return None
+    return dt.astimezone()
+
+
+def parseTimestamp(ds):
+    """
+    Parse a timestamp to a timezone aware datetime.
+
+    W3C datetime and ISO 8601 values, as found in sitemaps and query
+    parameters, are parsed directly and memoized since the same values
+    recur, e.g. the lastmod of many sitemap entries. Other formats are
+    parsed by dateparser on every call, as relative values such as
+    "yesterday" change with time.
+
+    Args:
+        ds: str, bytes, datetime or None
+
+    Returns:
+        datetime.datetime or None if ds could not be parsed
+    """
+    if ds is None:
+        return None
+    if isinstance(ds, datetime.datetime):
+        return ds
+    if isinstance(ds, bytes):
+        ds = ds.decode("utf-8")
+    ds = ds.strip()
+    dt = _parseW3CDatetime(ds)
+    if dt is not None:
+        return dt
+    return dateparser.parse(ds, settings={"RETURN_AS_TIMEZONE_AWARE": True})
+
+
 def utcFromDateTime(dt, assume_local=True):
     # is dt timezone aware?
     if dt.tzinfo is None or dt.tzinfo.utcoffset(dt) is None:
@@ -193,10 +273,7 @@ def datetimeFromSomething(V, assume_local=True):
             datetime.datetime.fromtimestamp(V), assume_local=assume_local
         )
     if isinstance(V, str):
-        return utcFromDateTime(
-            dateparser.parse(V, settings={"RETURN_AS_TIMEZONE_AWARE": True}),
-            assume_local=assume_local,
-        )
+        return utcFromDateTime(parseTimestamp(V), assume_local=assume_local)
     return None
 
 
@@ -0,0 +1,97 @@
+"""
+Implements a pipeline that drops items whose JSON-LD is already in the store.
+
+This runs before SoscanNormalizePipeline so that unchanged documents found
+on a re-crawl are dropped before any JSON-LD processing. The checksum is
+computed the same way as in OPersistPipeline, over the JSON-LD as
+retrieved, and looked up in the set of checksums held by the store. The
+set is loaded when the spider opens and extended with content that
+OPersistPipeline confirms written (the soscan.utils.content_persisted
+signal), so content that fails normalization or persistence is not
+dropped on a later copy.
+
+Items modified by normalization before being persisted (e.g. when
+use_at_id is set) will not match here and are checked again by
+OPersistPipeline.
+"""
+
+import os
+import json
+import logging
+from pathlib import Path
+import opersist
+import sonormal.checksums
+import soscan.utils
+import scrapy.exceptions
+
+
+class SoscanChecksumFilterPipeline:
+    def __init__(self, fs_path, enabled=True):
+        self.logger = logging.getLogger("SoscanChecksumFilter")
+        self.fs_path = fs_path
+        self.enabled = enabled
+        # Digests as 32 byte values to keep the set compact
+        self._known = set()
+
+    @classmethod
+    def from_crawler(cls, crawler, **kwargs):
+        fs_path = crawler.settings.get("STORE_PATH", None)
+        if fs_path is None:
+            raise Exception("STORE_PATH configuration is required!")
+        mn_settings = Path(f"{fs_path}/settings.json")
+        if mn_settings.exists():
+            with open(mn_settings) as cs:
+                _cs: dict = json.loads(cs.read())
+            if "checksum_prefilter" in _cs:
+                kwargs["enabled"] = bool(_cs["checksum_prefilter"])
+        pipeline = cls(fs_path, **kwargs)
+        crawler.signals.connect(
+            pipeline.contentPersisted, signal=soscan.utils.content_persisted
+        )
+        return pipeline
+
+    def open_spider(self, spider):
+        if not self.enabled or not os.path.exists(self.fs_path):
+            return
+        op = opersist.OPersist(self.fs_path, engine_profile="serve")
+        try:
+            op.open(allow_create=False)
+        except ValueError as e:
+            self.logger.info(f"No store to prefilter against: {e}")
+            return
+        try:
+            for checksum_sha256 in op.getChecksumsSha256():
+                self._known.add(bytes.fromhex(checksum_sha256))
+        finally:
+            op.close()
+        self.logger.info(f"Loaded {len(self._known)} known checksums")
+
+    def close_spider(self, spider):
+        self._known = set()
+
+    def contentPersisted(self, spider, checksum_sha256):
+        """
+        Add the checksum of content written to the store during the crawl.
+        """
+        if self.enabled:
+            self._known.add(bytes.fromhex(checksum_sha256))
+
+    def process_item(self, item, spider):
+        if not self.enabled:
+            return item
+        hashes, _canonical = sonormal.checksums.jsonChecksums(
+            item["jsonld"], canonicalize=False
+        )
+        checksum_sha256 = hashes.get("sha256", None)
+        if checksum_sha256 is None:
+            return item
+        digest = bytes.fromhex(checksum_sha256)
+        if digest in self._known:
+            soscan.utils.recordStoredContent(spider, item, checksum_sha256)
+            raise scrapy.exceptions.DropItem(
+                f"Item already in store: {item['url']} sha256:{checksum_sha256}"
+            )
+        # Added to the known checksums by contentPersisted once written.
+        # Repeats while the first copy is pending are left to
+        # OPersistPipeline.
+        return item
@@ -60,6 +60,7 @@ class SoscanItem(scrapy.Item):
     """
 
     url = scrapy.Field()
+    loc = scrapy.Field()  # sitemap loc the item was retrieved for, before redirects
     status = scrapy.Field()  # http status
     time_retrieved = scrapy.Field()
     time_loc = scrapy.Field()  # From the sitemap, if available
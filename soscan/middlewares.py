@@ -5,6 +5,7 @@
 
 from scrapy import signals
 import scrapy.http
+import scrapy.exceptions
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -115,3 +116,44 @@ class SoscanDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class SoscanConditionalMiddleware:
+    """
+    Revalidates landing pages with the validators recorded in the crawl ledger.
+
+    Requests for sitemap locs whose content is in the store are sent with
+    If-None-Match and If-Modified-Since from the last response. A 304
+    response is recorded in the ledger and the request is dropped, so the
+    unchanged page never reaches the spider or the item pipeline.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_request(self, request, spider):
+        ledger = getattr(spider, "crawl_ledger", None)
+        if ledger is None or "loc_timestamp" not in request.meta:
+            return None
+        validators = ledger.validators(spider.locOf(request))
+        if validators is None:
+            return None
+        if "etag" in validators:
+            request.headers.setdefault("If-None-Match", validators["etag"])
+        if "last_modified" in validators:
+            request.headers.setdefault("If-Modified-Since", validators["last_modified"])
+        return None
+
+    def process_response(self, request, response, spider):
+        if response.status != 304:
+            return response
+        ledger = getattr(spider, "crawl_ledger", None)
+        if ledger is None or "loc_timestamp" not in request.meta:
+            return response
+        ledger.recordNotModified(spider.locOf(request), request.meta["loc_timestamp"])
+        self.stats.inc_value("conditional/not_modified", spider=spider)
+        raise scrapy.exceptions.IgnoreRequest(f"Not modified: {request.url}")
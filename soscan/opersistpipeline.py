@@ -17,20 +17,32 @@ from pathlib import Path
 import logging
 import opersist
 import opersist.utils
+import opersist.dedup
 import sonormal.checksums
 import scrapy.exceptions
+import soscan.utils
 
 
 class OPersistPipeline:
     def __init__(self, fs_path, **kwargs):
-        self._op = opersist.OPersist(fs_path)
+        self._op = opersist.OPersist(fs_path, engine_profile=kwargs.get("engine_profile", "harvest"))
         self.logger = logging.getLogger("OPersistPipeline")
         self.dedup_nodes = []
+        self.dedup_indexes = {}
+        self.dedup_refresh = kwargs.get("dedup_refresh", 60.0)
+        # Number of items buffered before writing to the store in one transaction
+        self.batch_size = kwargs.get("batch_size", 1)
+        self._batch = []
+        # sha256 -> index in _batch of the buffered items
+        self._batch_sha256 = {}
+        # (batch index, spider, item, sha256) of the buffered items and
+        # their pending duplicates, recorded in the crawl ledger once stored
+        self._batch_sources = []
         if kwargs.get("dedup_nodes", False):
             self.logger.debug(f"Deduplication nodes: {kwargs['dedup_nodes']}")
             dedup_nodes = 0
             for n in kwargs["dedup_nodes"]:
-                self.dedup_nodes.append(opersist.OPersist(n))
+                self.dedup_nodes.append(opersist.OPersist(n, engine_profile="serve"))
                 dedup_nodes += 1
             self.logger.info(f"Added {dedup_nodes} deduplication node(s)")
 
@@ -62,19 +74,37 @@ class OPersistPipeline:
                             kwargs["dedup_nodes"].append(_cs[s])
                         else:
                             raise ValueError(f"Deduplication node directory {_cs[s]} not found.")
+                if s == "persist_batch_size":
+                    kwargs["batch_size"] = int(_cs[s])
+                if s == "dedup_refresh":
+                    kwargs["dedup_refresh"] = float(_cs[s])
+                if s == "engine_profile":
+                    kwargs["engine_profile"] = _cs[s]
         return cls(fs_path, **kwargs)
 
     def open_spider(self, spider):
         self.logger.debug("open_spider")
         self._op.open(allow_create=True)
         self.logger.debug(f"OPersist {self._op} opened")
+        # Migrate stores created before the identifier index existed
+        self._op.migrateThingIdentifiers()
         for dedup_node in self.dedup_nodes:
             dedup_node.open(allow_create=False)
+            dedup_node.migrateThingIdentifiers()
             dedup_node_name = Path(dedup_node.fs_path).name
             self.logger.debug(f"Deduplication node {dedup_node_name} opened")
+            dedup_index = opersist.dedup.DedupIndex(
+                dedup_node, refresh_interval=self.dedup_refresh
+            )
+            dedup_index.refresh()
+            self.dedup_indexes[dedup_node.fs_path] = dedup_index
+            self.logger.info(
+                f"Loaded {len(dedup_index)} identifiers from deduplication node {dedup_node_name}"
+            )
 
     def close_spider(self, spider):
         self.logger.debug("close_spider")
+        self.flush()
         self._op.close()
         self.logger.debug("OPersist connection closed")
         for dedup_node in self.dedup_nodes:
@@ -82,6 +112,25 @@ class OPersistPipeline:
             dedup_node_name = Path(dedup_node.fs_path).name
             self.logger.debug(f"Deduplication node {dedup_node_name} closed")
 
+    def flush(self):
+        """
+        Write buffered items to the store in a single transaction.
+        """
+        if len(self._batch) == 0:
+            return
+        self.logger.debug("Persisting batch of %s items", len(self._batch))
+        results = self._op.addThingsBatch(self._batch)
+        for res in results:
+            if res["error"] is not None:
+                self.logger.error(f"Could not store item {res['identifier']}: {res['error']}")
+        for i, spider, item, checksum_sha256 in self._batch_sources:
+            if results[i]["error"] is None:
+                soscan.utils.recordStoredContent(spider, item, checksum_sha256)
+                soscan.utils.contentPersisted(spider, checksum_sha256)
+        self._batch = []
+        self._batch_sha256 = {}
+        self._batch_sources = []
+
     def process_item(self, item, spider):
         try:
             #hashes, _canonical = sonormal.checksums.jsonChecksums(item["normalized"])
@@ -89,11 +138,20 @@ class OPersistPipeline:
             checksum_sha256 = hashes.get("sha256", None)
             if checksum_sha256 is None:
                 raise scrapy.exceptions.DropItem(f"No checksum for item: {item['url']}")
+            if checksum_sha256 in self._batch_sha256:
+                # Recorded in the ledger when the buffered copy is stored
+                self._batch_sources.append(
+                    (self._batch_sha256[checksum_sha256], spider, item, checksum_sha256)
+                )
+                raise scrapy.exceptions.DropItem(
+                    f"Item already pending in store: {item['url']} sha256:{checksum_sha256}"
+                )
             existing = self._op.getThingSha256(checksum_sha256)
             if existing is not None:
                 self.logger.debug(
                     f"Found existing entry:\n{item['url']}\n{checksum_sha256}\n{existing.series_id}\n{existing.file_name}\n==="
                 )
+                soscan.utils.recordStoredContent(spider, item, checksum_sha256)
                 raise scrapy.exceptions.DropItem(
                     f"Item already in store: {item['url']} sha256:{checksum_sha256}"
                 )
@@ -125,11 +183,12 @@ class OPersistPipeline:
                 self.logger.debug(f"Checking for duplicates in {dedup_node_name}")
                 self.logger.debug(f"series_id: {series_id}")
                 self.logger.debug(f"alt_identifiers: {alt_identifiers}")
-                existing = dedup_node.getThingsSIDOrAltIdentifier(series_id=series_id, alt_ids=alt_identifiers)
+                existing = self.dedup_indexes[dedup_node.fs_path].match(series_id, alt_identifiers)
                 if existing is not None:
                     self.logger.debug(
                         f"Found existing entry in dedup node {dedup_node_name}:\n{item['url']}\n{checksum_sha256}\n{existing.series_id}\n{existing.identifiers}\n{existing.file_name}\n==="
                     )
+                    soscan.utils.recordStoredContent(spider, item, checksum_sha256)
                     raise scrapy.exceptions.DropItem(
                         f"Item already in dedup node {dedup_node_name}: {item['url']} sha256:{checksum_sha256}"
                     )
@@ -142,6 +201,34 @@ class OPersistPipeline:
             owner = None
             access_rules = None
 
+            if self.batch_size > 1:
+                self.logger.debug("Buffering %s", identifier)
+                self._batch.append(
+                    {
+                        "obj": _canonical,
+                        "identifier": identifier,
+                        "hashes": hashes,
+                        "format_id": format_id,
+                        "submitter": submitter,
+                        "owner": owner,
+                        "access_rules": access_rules,
+                        "series_id": series_id,
+                        "alt_identifiers": alt_identifiers,
+                        "media_type": media_type,
+                        "source": source,
+                        "metadata": metadata,
+                        "obsoletes": obsoletes,
+                        "date_uploaded": item.get("time_loc", None),
+                    }
+                )
+                self._batch_sha256[checksum_sha256] = len(self._batch) - 1
+                self._batch_sources.append(
+                    (len(self._batch) - 1, spider, item, checksum_sha256)
+                )
+                if len(self._batch) >= self.batch_size:
+                    self.flush()
+                return item
+
             self.logger.debug("Persisting %s", identifier)
 
             res = self._op.addThingBytes(
@@ -160,6 +247,11 @@ class OPersistPipeline:
                 obsoletes=obsoletes,
                 date_uploaded=item.get("time_loc", None),
             )
+            if not res:
+                self.logger.error(f"Could not store item {identifier} from {item['url']}")
+                return
+            soscan.utils.recordStoredContent(spider, item, checksum_sha256)
+            soscan.utils.contentPersisted(spider, checksum_sha256)
 
         except scrapy.exceptions.DropItem as e:
             # passing the dedup DropItem to up to the spider
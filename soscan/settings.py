@@ -26,13 +26,19 @@ ROBOTSTXT_OBEY = True
 REQUEST_FINGERPRINTER_IMPLEMENTATION = '2.7'
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-CONCURRENT_REQUESTS = 1
+# soscan.throttle.SoscanAdaptiveThrottle raises this to its maximum
+# concurrency (throttle_max_concurrency, default 4) when the spider opens.
+CONCURRENT_REQUESTS = 4
 
 REACTOR_THREADPOOL_MAXSIZE = 8
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
+# These are the starting values of a download slot. With the adaptive
+# throttle enabled they are clamped to the throttle_* bounds of the node
+# (default 1 to 4 concurrent requests, 0.25s to 60s delay) when the first
+# response from the repository arrives and are adjusted from then on.
 DOWNLOAD_DELAY = 1
 # The download delay setting will honor only one of:
 CONCURRENT_REQUESTS_PER_DOMAIN = 1
@@ -59,6 +65,7 @@ SPIDER_MIDDLEWARES = {
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
     "soscan.middlewares.SoscanDownloaderMiddleware": 543,
+    "soscan.middlewares.SoscanConditionalMiddleware": 545,
     "scrapy.downloadermiddlewares.redirect.RedirectMiddleware": 543,
     "scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware": 543,
 }
@@ -71,10 +78,15 @@ REDIRECT_ENABLED = True
 # EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
 # }
+# Adapts concurrency and delay per repository, see soscan/throttle.py
+EXTENSIONS = {
+    "soscan.throttle.SoscanAdaptiveThrottle": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
+    "soscan.checksumfilterpipeline.SoscanChecksumFilterPipeline": 400,
     "soscan.sonormalizepipeline.SoscanNormalizePipeline": 500,
     "soscan.opersistpipeline.OPersistPipeline": 1000,
     #'soscan.pipelines.SoscanPersistPipeline': 1000,
@@ -82,7 +94,9 @@ ITEM_PIPELINES = {
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-AUTOTHROTTLE_ENABLED = True
+# Disabled in favor of soscan.throttle.SoscanAdaptiveThrottle, which also
+# adjusts concurrency. AUTOTHROTTLE_MAX_DELAY is its default maximum delay.
+AUTOTHROTTLE_ENABLED = False
 # The initial download delay
 AUTOTHROTTLE_START_DELAY = 2
 # The maximum download delay to be set in case of high latencies
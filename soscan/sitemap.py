@@ -0,0 +1,181 @@
+"""
+Incremental reader for sitemap documents.
+
+The scrapy Sitemap class builds the element tree of the whole document,
+which for repository sitemaps with millions of entries takes gigabytes.
+StreamingSitemap parses the document as it is decompressed and releases
+each entry once it is read, so memory does not grow with the number of
+entries. Entries are the same dicts as produced by scrapy's Sitemap.
+
+The decompressed size is limited as scrapy's gunzip does with
+DOWNLOAD_MAXSIZE, so a small compressed sitemap can not expand without
+bound. Reading stops when the limit is exceeded.
+"""
+
+import io
+import gzip
+import logging
+import lxml.etree
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+DEFAULT_REVERSE_BLOCK = 50000
+"""Entries held in memory when reading in reverse, the sitemap protocol
+limit for the number of URLs in one sitemap file."""
+
+
+def _localName(tag):
+    if not isinstance(tag, str):
+        # comments and processing instructions
+        return None
+    if "}" in tag:
+        return tag.split("}", 1)[1]
+    return tag
+
+
+class SitemapTooLarge(ValueError):
+    pass
+
+
+class _SizeLimitedReader(object):
+    """
+    File like reader raising SitemapTooLarge once more than max_size bytes are read.
+    """
+
+    def __init__(self, src, max_size=0, warn_size=0):
+        self._src = src
+        self.max_size = max_size
+        self.warn_size = warn_size
+        self.size = 0
+        self._warned = False
+
+    def read(self, n=-1):
+        data = self._src.read(n)
+        self.size += len(data)
+        if self.max_size and self.size > self.max_size:
+            raise SitemapTooLarge(
+                f"Sitemap larger than download maxsize ({self.max_size} bytes)"
+            )
+        if self.warn_size and self.size > self.warn_size and not self._warned:
+            self._warned = True
+            logger.warning(
+                "Sitemap larger than download warnsize (%s bytes)", self.warn_size
+            )
+        return data
+
+
+class StreamingSitemap(object):
+    def __init__(
+        self,
+        body: bytes,
+        reverse_block: int = DEFAULT_REVERSE_BLOCK,
+        max_size: int = 0,
+        warn_size: int = 0,
+    ):
+        """
+        Args:
+            body: The sitemap document, optionally gzip compressed
+            reverse_block: Entries held in memory per pass when reading in reverse
+            max_size: Largest decompressed size read, 0 for no limit
+            warn_size: Decompressed size above which a warning is logged, 0 for none
+        """
+        self._body = body
+        self.reverse_block = reverse_block
+        self.max_size = max_size
+        self.warn_size = warn_size
+        # Set when reading stopped at max_size
+        self.truncated = False
+        self._type = None
+
+    def _stream(self):
+        src = io.BytesIO(self._body)
+        if self._body[:2] == GZIP_MAGIC:
+            src = gzip.GzipFile(fileobj=src, mode="rb")
+        return _SizeLimitedReader(src, max_size=self.max_size, warn_size=self.warn_size)
+
+    def _events(self, events):
+        return lxml.etree.iterparse(
+            self._stream(),
+            events=events,
+            resolve_entities=False,
+            remove_comments=True,
+            recover=True,
+            huge_tree=True,
+        )
+
+    @property
+    def type(self):
+        """
+        Local name of the root element, "urlset" or "sitemapindex".
+        """
+        if self._type is None:
+            try:
+                for _, elem in self._events(("start",)):
+                    self._type = _localName(elem.tag)
+                    break
+            except (lxml.etree.XMLSyntaxError, SitemapTooLarge):
+                pass
+            if self._type is None:
+                self._type = ""
+        return self._type
+
+    def __iter__(self):
+        depth = 0
+        try:
+            for event, elem in self._events(("start", "end")):
+                if event == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                # a url or sitemap element, a child of the root
+                d = {}
+                for el in elem:
+                    name = _localName(el.tag)
+                    if name is None:
+                        continue
+                    if name == "link":
+                        if "href" in el.attrib:
+                            d.setdefault("alternate", []).append(el.get("href"))
+                    else:
+                        d[name] = el.text.strip() if el.text else ""
+                # release the entry and any preceding siblings
+                elem.clear()
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+                if "loc" in d:
+                    yield d
+        except lxml.etree.XMLSyntaxError:
+            # recover parses what it can, a truncated document ends here
+            return
+        except SitemapTooLarge as e:
+            logger.warning("Stopped reading sitemap: %s", e)
+            self.truncated = True
+            return
+
+    def __reversed__(self):
+        """
+        Entries last to first, reading the document once per reverse_block entries.
+        """
+        n = 0
+        for _ in self:
+            n += 1
+        if self.truncated:
+            # The end of the document is never reached, there is no last entry
+            return
+        hi = n
+        while hi > 0:
+            lo = max(0, hi - self.reverse_block)
+            block = []
+            for i, d in enumerate(self):
+                if i >= hi:
+                    break
+                if i >= lo:
+                    block.append(d)
+            yield from reversed(block)
+            hi = lo
@@ -1,4 +1,5 @@
 import os
+from scrapy import signals
 from scrapy.settings import BaseSettings
 from scrapy.exceptions import NotSupported
 import sonormal
@@ -11,11 +12,12 @@ try:
 except ModuleNotFoundError:
     import json
 
-import dateparser
 import soscan.spiders.ldsitemapspider
 import soscan.items
+import opersist
 import opersist.utils
 import opersist.rdfutils
+import opersist.crawlledger
 from scrapy.utils.project import get_project_settings
 
 # Setup the schema.org contexts for local retrieval
@@ -59,12 +61,13 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
         self.url_match = None
         self.reversed = None
         self.which_jsonld = 0
+        # Ledger of locs retrieved by earlier crawls, see openCrawlLedger
+        self.crawl_ledger = None
+        self._ledger_op = None
         if len(self.sitemap_urls) < 1:
             raise ValueError("At least one sitemap URL is required.")
         if self.lastmod_filter is not None:
-            self.lastmod_filter = dateparser.parse(
-                self.lastmod_filter, settings={"RETURN_AS_TIMEZONE_AWARE": True}
-            )
+            self.lastmod_filter = opersist.utils.parseTimestamp(self.lastmod_filter)
 
     @classmethod
     def from_crawler(cls, crawler, *args, **kwargs):
@@ -89,6 +92,7 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
         )
         spider._set_crawler(crawler)
         # incorporate MN-specific settings
+        use_ledger = True
         mn_settings = Path(f'{node_path}/settings.json')
         if mn_settings.exists():
             with open(mn_settings) as cs:
@@ -97,10 +101,7 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
                 spider.settings.set(s, _cs[s], priority='spider')
                 spider.logger.info(f'Setting override from {mn_settings}: set {s} to {_cs[s]}')
                 if s in "lastmod_filter":
-                    spider.lastmod_filter = dateparser.parse(
-                        _cs[s],
-                        settings={"RETURN_AS_TIMEZONE_AWARE": True},
-                    )
+                    spider.lastmod_filter = opersist.utils.parseTimestamp(_cs[s])
                 if s in "start_point":
                     spider.start_point = _cs.get(s, None)
                 if s in "url_match":
@@ -112,8 +113,60 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
                 if s in "use_at_id":
                     spider.logger.warning(f'Use of "use_at_id" is not recommended for most repositories! Please set this to "false" unless you are certain you need it!')
                     spider.use_at_id = _cs.get(s, None)
+                if s == "crawl_ledger":
+                    use_ledger = bool(_cs[s])
+        if use_ledger and not spider._count_only and node_path is not None:
+            spider.openCrawlLedger(node_path)
+            crawler.signals.connect(spider.ledgerResponse, signal=signals.response_received)
+            crawler.signals.connect(spider.closeCrawlLedger, signal=signals.spider_closed)
         return spider
 
+    def openCrawlLedger(self, node_path):
+        """
+        Load the crawl ledger of the node so unchanged locs are skipped.
+
+        Set "crawl_ledger": false in settings.json to retrieve every loc.
+        """
+        if not os.path.exists(node_path):
+            return
+        self._ledger_op = opersist.OPersist(node_path, engine_profile="harvest")
+        self._ledger_op.open(allow_create=True)
+        self.crawl_ledger = opersist.crawlledger.CrawlLedger(self._ledger_op)
+        n = self.crawl_ledger.load()
+        self.crawl_ledger.startCrawl(" ".join(self.sitemap_urls))
+        self.logger.info(f'Loaded {n} crawl ledger entries')
+
+    def ledgerResponse(self, response, request, spider):
+        """
+        Record the response to a sitemap loc in the crawl ledger.
+        """
+        if "loc_timestamp" not in request.meta:
+            return
+        etag = response.headers.get("ETag", None)
+        last_modified = response.headers.get("Last-Modified", None)
+        self.crawl_ledger.recordResponse(
+            self.locOf(request),
+            response.status,
+            request.meta["loc_timestamp"],
+            etag=etag.decode() if etag is not None else None,
+            last_modified=last_modified.decode() if last_modified is not None else None,
+        )
+
+    def closeCrawlLedger(self, spider, reason):
+        self.crawl_ledger.finishCrawl(self.crawler.stats.get_stats())
+        self.crawl_ledger = None
+        self._ledger_op.close()
+        self._ledger_op = None
+
+    @staticmethod
+    def locOf(request_or_response):
+        """
+        The sitemap loc a request was made for, before any redirects.
+        """
+        return request_or_response.meta.get(
+            "redirect_urls", [request_or_response.url]
+        )[0]
+
     def sitemap_filter(self, entries):
         """
         Filter loc entries by lastmod time.
@@ -122,6 +175,9 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
         reject entries that do not have a lastmod value or
         the lastmod value is older than the lastmod_filter value.
 
+        Entries the crawl ledger records as retrieved and stored at a
+        lastmod not older than the entry lastmod are skipped.
+
         Also converts the entry['lastmod'] value to a
         timezone aware datetime value.
 
@@ -132,9 +188,10 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
         """
         y = 0
         i = 0
+        unchanged = 0
         if self.reversed:
             self.logger.info(f'Reading the sitemap in reverse order')
-            entries = reversed(list(entries.__iter__()))
+            entries = reversed(entries)
         for entry in entries:
             i += 1
             if ((self.start_point is not None) and (self.start_point <= i)) or (self.start_point is None):
@@ -143,13 +200,16 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
                 ts = entry.get("lastmod", None)
                 if not ts is None:
                     # convert TS to a datetime for comparison
-                    ts = dateparser.parse(
-                        ts,
-                        settings={"RETURN_AS_TIMEZONE_AWARE": True},
-                    )
-                    # preserve the converted timestamp in the entry
+                    ts = opersist.utils.parseTimestamp(ts)
+                    # preserve the converted timestamp in the entry, it is
+                    # carried to the request meta as loc_timestamp
                     entry["lastmod"] = ts
 
+                if self.crawl_ledger is not None and self.crawl_ledger.isUnchanged(entry["loc"], ts):
+                    self.logger.debug(f'crawl_ledger skipping unchanged record {i}: (ts {ts}) {entry}')
+                    unchanged += 1
+                    continue
+
                 if self.lastmod_filter is not None and ts is not None:
                     if ts > self.lastmod_filter:
                         if self.url_match:
@@ -183,6 +243,9 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
                 self.logger.debug(f'start_point skipping record {i}: {entry}')
         self.logger.info(f'Total number of sitemap entries: {i}')
         self.logger.info(f'Yielded entries from sitemap: {y}')
+        if unchanged > 0:
+            self.logger.info(f'Unchanged entries skipped: {unchanged}')
+            self.crawler.stats.inc_value("crawl_ledger/unchanged", unchanged, spider=self)
 
     def parse(self, response, **kwargs):
         """
@@ -248,6 +311,7 @@ class JsonldSpider(soscan.spiders.ldsitemapspider.LDSitemapSpider):
                     item = soscan.items.SoscanItem()
                     self.logger.debug("Filling item response values")
                     item["url"] = response.url
+                    item["loc"] = self.locOf(response)
                     item["status"] = response.status
                     item["time_loc"] = response.meta["loc_timestamp"]
                     item["time_modified"] = None
@@ -2,7 +2,10 @@
 This is an adjusted version of the SitemapSpider at:
 https://github.com/scrapy/scrapy/blob/master/scrapy/spiders/sitemap.py
 
-The sitemap loc lastmod property is provided in the request meta
+The sitemap loc lastmod property is provided in the request meta.
+
+Sitemaps are read with soscan.sitemap.StreamingSitemap rather than
+scrapy's Sitemap, so large sitemaps are parsed in bounded memory.
 """
 
 import os
@@ -10,11 +13,12 @@ import re
 import logging
 from scrapy.spiders import Spider
 from scrapy.http import Request, XmlResponse
-from scrapy.utils.sitemap import Sitemap, sitemap_urls_from_robots
-from scrapy.utils.gz import gunzip, gzip_magic_number
+from scrapy.utils.sitemap import sitemap_urls_from_robots
+from scrapy.utils.gz import gzip_magic_number
 
 import soscan.items
 import soscan.utils
+import soscan.sitemap
 
 logger = logging.getLogger(__name__)
 
@@ -81,7 +85,10 @@ class LDSitemapSpider(Spider):
                 )
                 return
 
-            s = Sitemap(body)
+            max_size, warn_size = self._sitemap_size_limits()
+            s = soscan.sitemap.StreamingSitemap(
+                body, max_size=max_size, warn_size=warn_size
+            )
             it = self.sitemap_filter(s)
 
             if s.type == "sitemapindex":
@@ -118,15 +125,30 @@ class LDSitemapSpider(Spider):
                                 yield req
                             break
 
+    def _sitemap_size_limits(self):
+        """Return the (max_size, warn_size) of decompressed sitemaps, as
+        scrapy's SitemapSpider applies DOWNLOAD_MAXSIZE and DOWNLOAD_WARNSIZE.
+        """
+        settings = getattr(self, "settings", None)
+        max_size = settings.getint("DOWNLOAD_MAXSIZE") if settings is not None else 0
+        warn_size = settings.getint("DOWNLOAD_WARNSIZE") if settings is not None else 0
+        return (
+            getattr(self, "download_maxsize", max_size),
+            getattr(self, "download_warnsize", warn_size),
+        )
+
     def _get_sitemap_body(self, response):
         """Return the sitemap body contained in the given response,
         or None if the response is not a sitemap.
+
+        Gzipped bodies are returned as is, StreamingSitemap decompresses
+        them while parsing.
         """
         if isinstance(response, XmlResponse):
             return response.body
         elif gzip_magic_number(response):
-            return gunzip(response.body)
-        # actual gzipped sitemap files are decompressed above ;
+            return response.body
+        # actual gzipped sitemap files are handled above ;
         # if we are here (response body is not gzipped)
         # and have a response for .xml.gz,
         # it usually means that it was already gunzipped
@@ -0,0 +1,187 @@
+"""
+Adaptive concurrency and delay for the download slot of a repository.
+
+Replaces the scrapy AutoThrottle extension, which adjusts only the delay
+and keeps the fixed CONCURRENT_REQUESTS_PER_DOMAIN. The slot starts at
+the configured concurrency and delay, clamped to the bounds below when
+its first response arrives. While responses arrive faster than
+the target latency the delay is reduced and concurrency raised by one
+step at a time. Slow responses step back, and 429 or 503 responses halve
+concurrency and double the delay, waiting at least as long as any
+Retry-After header asks.
+
+Bounds are set per node in settings.json::
+
+  "throttle_min_concurrency": 1,
+  "throttle_max_concurrency": 4,
+  "throttle_min_delay": 0.25,
+  "throttle_max_delay": 60,
+  "throttle_target_latency": 2.0
+
+Set "throttle_enabled": false to crawl with the static settings.
+"""
+
+import json
+import time
+import email.utils
+import logging
+from pathlib import Path
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+BACKOFF_STATUS = (429, 503)
+
+# Weight of the latest response in the latency average
+LATENCY_WEIGHT = 0.2
+
+
+def retryAfterSeconds(value):
+    """
+    Seconds to wait given a Retry-After header value, delay-seconds or HTTP-date.
+
+    Returns:
+        float or None if value can not be parsed
+    """
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("latin-1")
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class _SlotState(object):
+    def __init__(self):
+        self.latency = None
+        self.successes = 0
+        self.backoff_until = 0
+
+
+class SoscanAdaptiveThrottle:
+    def __init__(
+        self,
+        crawler,
+        min_concurrency=1,
+        max_concurrency=4,
+        min_delay=0.25,
+        max_delay=60.0,
+        target_latency=2.0,
+    ):
+        self.logger = logging.getLogger("SoscanAdaptiveThrottle")
+        self.crawler = crawler
+        self.min_concurrency = max(1, int(min_concurrency))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.min_delay = float(min_delay)
+        self.max_delay = max(self.min_delay, float(max_delay))
+        self.target_latency = float(target_latency)
+        self._slots = {}
+
+    @classmethod
+    def from_crawler(cls, crawler, **kwargs):
+        kwargs.setdefault("max_delay", crawler.settings.getfloat("AUTOTHROTTLE_MAX_DELAY", 60.0))
+        fs_path = crawler.settings.get("STORE_PATH", None)
+        if fs_path is not None:
+            mn_settings = Path(f"{fs_path}/settings.json")
+            if mn_settings.exists():
+                with open(mn_settings) as cs:
+                    _cs: dict = json.loads(cs.read())
+                if not _cs.get("throttle_enabled", True):
+                    raise NotConfigured("throttle_enabled is false")
+                for k in (
+                    "min_concurrency",
+                    "max_concurrency",
+                    "min_delay",
+                    "max_delay",
+                    "target_latency",
+                ):
+                    if f"throttle_{k}" in _cs:
+                        kwargs[k] = _cs[f"throttle_{k}"]
+        ext = cls(crawler, **kwargs)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.response_downloaded, signal=signals.response_downloaded)
+        return ext
+
+    def spider_opened(self, spider):
+        downloader = self.crawler.engine.downloader
+        # The global limit would otherwise cap the slot concurrency
+        if downloader.total_concurrency < self.max_concurrency:
+            downloader.total_concurrency = self.max_concurrency
+        self.logger.info(
+            "Concurrency %s to %s, delay %.2fs to %.2fs, target latency %.2fs",
+            self.min_concurrency,
+            self.max_concurrency,
+            self.min_delay,
+            self.max_delay,
+            self.target_latency,
+        )
+
+    def response_downloaded(self, response, request, spider):
+        key = request.meta.get("download_slot")
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is None:
+            return
+        state = self._slots.get(key)
+        if state is None:
+            state = self._slots[key] = _SlotState()
+            # Start from the static settings within the configured bounds
+            slot.concurrency = min(
+                self.max_concurrency, max(self.min_concurrency, slot.concurrency)
+            )
+            slot.delay = min(self.max_delay, max(self.min_delay, slot.delay))
+        concurrency, delay = slot.concurrency, slot.delay
+        now = time.monotonic()
+        if response.status in BACKOFF_STATUS:
+            wait = retryAfterSeconds(response.headers.get("Retry-After"))
+            state.backoff_until = now + (wait if wait is not None else delay * 2)
+            state.successes = 0
+            slot.concurrency = max(self.min_concurrency, concurrency // 2)
+            slot.delay = min(self.max_delay, max(delay * 2, self.min_delay, wait or 0))
+            self.crawler.stats.inc_value("throttle/backoff", spider=spider)
+            self.logger.info(
+                "%s from %s, concurrency %s delay %.2fs, retry after %s",
+                response.status,
+                key,
+                slot.concurrency,
+                slot.delay,
+                wait,
+            )
+            return
+        latency = request.meta.get("download_latency")
+        if latency is None:
+            return
+        if state.latency is None:
+            state.latency = latency
+        else:
+            state.latency = (1 - LATENCY_WEIGHT) * state.latency + LATENCY_WEIGHT * latency
+        if state.latency > self.target_latency:
+            # The server is slowing down, step back
+            state.successes = 0
+            slot.concurrency = max(self.min_concurrency, concurrency - 1)
+            slot.delay = min(self.max_delay, max(delay * 1.25, self.min_delay))
+        elif now >= state.backoff_until and response.status < 400:
+            state.successes += 1
+            # Step up once per round of concurrent requests
+            if state.successes >= concurrency:
+                state.successes = 0
+                slot.delay = max(self.min_delay, delay * 0.75)
+                if slot.delay <= self.min_delay:
+                    slot.concurrency = min(self.max_concurrency, concurrency + 1)
+        if slot.concurrency != concurrency or slot.delay != delay:
+            self.logger.debug(
+                "%s latency %.2fs, concurrency %s delay %.2fs",
+                key,
+                state.latency,
+                slot.concurrency,
+                slot.delay,
+            )
+        self.crawler.stats.max_value("throttle/max_concurrency", slot.concurrency, spider=spider)
@@ -1,5 +1,5 @@
 import datetime
-import dateparser
+import opersist.utils
 
 # raise Exception("don't use this")
 
@@ -7,6 +7,10 @@ JSON_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
 """datetime format string for generating JSON content
 """
 
+content_persisted = object()
+"""Signal sent with spider and checksum_sha256 once content is written to the store
+"""
+
 
 def dtnow():
     """
@@ -32,10 +36,38 @@ def datetimeToJsonStr(dt):
 
 
 def parseDatetimeString(ds):
-    if ds is None:
-        return None
-    if isinstance(ds, datetime.datetime):
-        return ds
-    if isinstance(ds, bytes):
-        ds = ds.decode("utf-8")
-    return dateparser.parse(ds, settings={"RETURN_AS_TIMEZONE_AWARE": True})
+    """
+    Timezone aware datetime from a string, see opersist.utils.parseTimestamp.
+    """
+    return opersist.utils.parseTimestamp(ds)
+
+
+def recordStoredContent(spider, item, checksum_sha256):
+    """
+    Note in the crawl ledger of the spider, if any, that the content of item is in the store.
+
+    Args:
+        spider: The spider that retrieved item
+        item: SoscanItem
+        checksum_sha256: sha256 of the stored content
+    """
+    ledger = getattr(spider, "crawl_ledger", None)
+    if ledger is None:
+        return
+    ledger.recordContent(item.get("loc") or item["url"], checksum_sha256)
+
+
+def contentPersisted(spider, checksum_sha256):
+    """
+    Send the content_persisted signal for content confirmed written to the store.
+
+    Args:
+        spider: The spider that retrieved the content
+        checksum_sha256: sha256 of the stored content
+    """
+    crawler = getattr(spider, "crawler", None)
+    if crawler is None:
+        return
+    crawler.signals.send_catch_log(
+        signal=content_persisted, spider=spider, checksum_sha256=checksum_sha256
+    )
@@ -0,0 +1,71 @@
+import pytest
+import scrapy
+import scrapy.exceptions
+import scrapy.utils.test
+import sonormal.checksums
+import opersist
+import opersist.utils
+import soscan.settings
+import soscan.utils
+import soscan.checksumfilterpipeline
+
+STORED = {"@context": "https://schema.org/", "@type": "Dataset", "name": "stored"}
+NEW = {"@context": "https://schema.org/", "@type": "Dataset", "name": "new"}
+
+
+def sha256Of(jsonld):
+    hashes, _ = sonormal.checksums.jsonChecksums(jsonld, canonicalize=False)
+    return hashes["sha256"]
+
+
+@pytest.fixture
+def crawler(tmp_path):
+    store_path = str(tmp_path / "node")
+    op = opersist.OPersist(store_path)
+    op.open()
+    hashes, _ = opersist.utils.bytesChecksums(b'{"name":"stored"}')
+    hashes["sha256"] = sha256Of(STORED)
+    op.addThingsBatch(
+        [
+            {
+                "obj": b'{"name":"stored"}',
+                "identifier": "stored",
+                "hashes": hashes,
+                "source": "https://example.org/stored",
+                "metadata": {},
+            }
+        ]
+    )
+    op.close()
+    return scrapy.utils.test.get_crawler(settings_dict={"STORE_PATH": store_path})
+
+
+def item(jsonld, url):
+    return {"jsonld": jsonld, "url": url}
+
+
+def test_runs_before_persist():
+    pipelines = soscan.settings.ITEM_PIPELINES
+    priority = pipelines["soscan.checksumfilterpipeline.SoscanChecksumFilterPipeline"]
+    assert priority < pipelines["soscan.sonormalizepipeline.SoscanNormalizePipeline"]
+    assert priority < pipelines["soscan.opersistpipeline.OPersistPipeline"]
+
+
+def test_filter(crawler):
+    Pipeline = soscan.checksumfilterpipeline.SoscanChecksumFilterPipeline
+    pipeline = Pipeline.from_crawler(crawler)
+    spider = scrapy.Spider.from_crawler(crawler, name="test")
+    pipeline.open_spider(spider)
+    assert len(pipeline._known) == 1
+    with pytest.raises(scrapy.exceptions.DropItem):
+        pipeline.process_item(item(STORED, "https://example.org/stored"), spider)
+    new_item = item(NEW, "https://example.org/new")
+    assert pipeline.process_item(new_item, spider) is new_item
+    # not known until the content is written
+    assert bytes.fromhex(sha256Of(NEW)) not in pipeline._known
+    assert pipeline.process_item(new_item, spider) is new_item
+    soscan.utils.contentPersisted(spider, sha256Of(NEW))
+    assert bytes.fromhex(sha256Of(NEW)) in pipeline._known
+    with pytest.raises(scrapy.exceptions.DropItem):
+        pipeline.process_item(item(NEW, "https://example.org/copy"), spider)
+    pipeline.close_spider(spider)
@@ -0,0 +1,21 @@
+import datetime
+import opersist.utils
+import opersist.eventlog
+
+
+def test_event_log(tmp_path):
+    event_log = opersist.eventlog.EventLog(
+        f"sqlite:///{tmp_path / 'eventlog.db'}", batch_size=2, flush_interval=0.05
+    )
+    old = opersist.utils.dtnow() - datetime.timedelta(days=400)
+    event_log.log("sha256:h0", "read", date_logged=old)
+    for i in range(5):
+        event_log.log(f"sha256:h{i}", "create")
+    event_log.flush()
+    total, records = event_log.getRecords(event="create", count=3)
+    assert total == 5 and len(records) == 3
+    total, records = event_log.getRecords(event="create", after_id=records[-1].entry_id)
+    assert [r.identifier for r in records] == ["sha256:h3", "sha256:h4"]
+    assert event_log.getRecords(id_filter="sha256:h0")[0] == 2
+    assert event_log.compact() == 1
+    event_log.close()
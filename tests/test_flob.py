@@ -1,6 +1,7 @@
 import os
+import gzip
 import pytest
-import igsn_lib.flob
+import opersist.flob
 
 hash_tests = [
     [
@@ -22,19 +23,15 @@ hash_tests = [
 
 
 @pytest.mark.parametrize("data,expected_hash,metadata", hash_tests)
-def test_adding(data, expected_hash, metadata):
-    test_folder = "/tmp/test_flob/"
-    os.makedirs(test_folder, exist_ok=True)
-    flobber = igsn_lib.flob.FLOB(test_folder)
+def test_adding(tmp_path, data, expected_hash, metadata):
+    flobber = opersist.flob.FLOB(str(tmp_path))
     res = flobber.add(data, metadata=metadata)
     assert res[0] == f"{expected_hash[0]}/{expected_hash[1]}/{expected_hash[2]}"
     assert res[1] == expected_hash
 
 
-def test_fakehash():
-    test_folder = "/tmp/test_flob/"
-    os.makedirs(test_folder, exist_ok=True)
-    flobber = igsn_lib.flob.FLOB(test_folder)
+def test_fakehash(tmp_path):
+    flobber = opersist.flob.FLOB(str(tmp_path))
     try:
         flobber.add(
             b"fake hash test",
@@ -46,10 +43,13 @@ def test_fakehash():
     raise Exception("failed")
 
 
-def test_listing():
-    test_folder = "/tmp/test_flob/"
-    flobber = igsn_lib.flob.FLOB(test_folder)
+def test_listing(tmp_path):
+    flobber = opersist.flob.FLOB(str(tmp_path))
+    for data, expected_hash, metadata in hash_tests:
+        flobber.add(data, metadata=metadata)
+    n = 0
     for f in flobber.listAllBlobs():
+        n += 1
         print(f.name)
         failed = True
         for ht in hash_tests:
@@ -57,3 +57,15 @@ def test_listing():
                 failed = False
                 break
         assert not failed
+    assert n == len(hash_tests)
+
+
+def test_blob_variants(tmp_path):
+    store = opersist.flob.FLOB(str(tmp_path), encodings=["gzip"])
+    b = b'{"j":"' + b"x" * 1000 + b'"}'
+    fldr, sha256, path = store.add(b)
+    blob_path = os.path.join(str(tmp_path), path)
+    with open(opersist.flob.variantPath(blob_path, "gzip"), "rb") as src:
+        assert gzip.decompress(src.read()) == b
+    store.remove(sha256)
+    assert not os.path.exists(opersist.flob.variantPath(blob_path, "gzip"))
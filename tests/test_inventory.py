@@ -0,0 +1,102 @@
+import json
+import time
+import pytest
+import mnlite.inventory
+
+
+class FakeStore(object):
+    def __init__(self, count=3):
+        self.count = count
+        self.error = None
+        self.calls = 0
+
+    def open(self):
+        pass
+
+    def removeSession(self):
+        pass
+
+    def basicStatsThings(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {"count": self.count, "oldest": "2021-01-01T00:00:00Z", "newest": ""}
+
+
+@pytest.fixture
+def m_nodes(tmp_path):
+    nodes = {}
+    for name in ("mn1", "mn2"):
+        config_path = tmp_path / f"{name}.json"
+        with open(config_path, "w") as dest:
+            json.dump(
+                {
+                    "node": {"node_id": f"urn:node:{name}"},
+                    "spider": {"sitemap_urls": [f"https://{name}.example.org/sitemap.xml"]},
+                },
+                dest,
+            )
+        nodes[name] = {
+            "config": str(config_path),
+            "node_id": f"urn:node:{name}",
+            "persistence": FakeStore(),
+        }
+    return nodes
+
+
+def test_refresh(m_nodes):
+    inventory = mnlite.inventory.Inventory(m_nodes, refresh_interval=300)
+    inventory.refresh()
+    entries = inventory.entries()
+    inventory.stop()
+    assert [e["name"] for e in entries] == ["mn1", "mn2"]
+    assert entries[0]["count"] == 3 and not entries[0]["stale"]
+    assert entries[0]["sitemap"] == "https://mn1.example.org/sitemap.xml"
+
+
+def test_failed_node_kept(m_nodes):
+    inventory = mnlite.inventory.Inventory(m_nodes, refresh_interval=300)
+    inventory.refresh()
+    updated = inventory._entries["mn1"]["updated"]
+    m_nodes["mn1"]["persistence"].count = 5
+    m_nodes["mn1"]["persistence"].error = RuntimeError("database is locked")
+    inventory.refresh()
+    entry = inventory._entries["mn1"]
+    # the last good entry is kept, marked stale
+    assert entry["count"] == 3 and entry["updated"] == updated
+    assert entry["stale"] and entry["error"] == "database is locked"
+    m_nodes["mn1"]["persistence"].error = None
+    inventory.refresh()
+    entry = inventory._entries["mn1"]
+    assert entry["count"] == 5 and not entry["stale"] and entry["error"] is None
+
+
+def test_failed_node_listed(m_nodes):
+    m_nodes["mn2"]["persistence"].error = RuntimeError("no such table")
+    inventory = mnlite.inventory.Inventory(m_nodes, refresh_interval=300)
+    inventory.refresh()
+    entry = inventory._entries["mn2"]
+    assert entry["node_id"] == "urn:node:mn2" and entry["stale"]
+    assert entry["error"] == "no such table"
+
+
+def test_refresher_started_on_first_use(m_nodes):
+    inventory = mnlite.inventory.Inventory(m_nodes, refresh_interval=0.01)
+    # not started at app creation, so it runs in each worker process
+    assert inventory._refresher is None
+    store = m_nodes["mn1"]["persistence"]
+    assert store.calls == 0
+    try:
+        assert len(inventory.entries()) == 2
+        refresher = inventory._refresher
+        assert refresher.is_alive()
+        inventory.entries()
+        assert inventory._refresher is refresher
+        deadline = time.monotonic() + 5
+        while store.calls < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.calls >= 3
+    finally:
+        inventory.stop()
+    refresher.join(timeout=5)
+    assert not refresher.is_alive()
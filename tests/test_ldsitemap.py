@@ -1,7 +1,7 @@
 import os
 import pytest
 import scrapy.http
-import mnlite.soscan.spiders.ldsitemapspider
+import soscan.spiders.ldsitemapspider
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
@@ -29,7 +29,34 @@ def fakeXmlResponse(url, src):
 @pytest.mark.parametrize("smap,expected_log,expected_lastmod", test_1)
 def test_parse(smap, expected_log, expected_lastmod):
     response = fakeXmlResponse("https://example.net/sitemap.xml", smap.encode("utf-8"))
-    spider = mnlite.soscan.spiders.ldsitemapspider.LDSitemapSpider(count_only=True)
+    spider = soscan.spiders.ldsitemapspider.LDSitemapSpider(count_only=True)
     for item in spider._parse_sitemap(response):
         print(item)
-    pass
\ No newline at end of file
+    pass
+
+def test_streaming_sitemap_reversed():
+    import gzip
+    import soscan.sitemap
+
+    smap = test_1[0][0].replace(
+        "</urlset>",
+        "<url><loc>http://www.example.com/bar.html</loc></url></urlset>",
+    )
+    s = soscan.sitemap.StreamingSitemap(gzip.compress(smap.encode("utf-8")), reverse_block=1)
+    assert s.type == "urlset"
+    assert [d["loc"] for d in s] == ["http://www.example.com/foo.html", "http://www.example.com/bar.html"]
+    assert [d["loc"] for d in reversed(s)] == ["http://www.example.com/bar.html", "http://www.example.com/foo.html"]
+
+
+def test_streaming_sitemap_max_size():
+    import gzip
+    import soscan.sitemap
+
+    entry = "<url><loc>http://www.example.com/foo.html</loc></url>"
+    smap = f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entry * 100000}</urlset>'
+    body = gzip.compress(smap.encode("utf-8"))
+    s = soscan.sitemap.StreamingSitemap(body, max_size=100000)
+    assert len(list(s)) < 100000
+    assert s.truncated
+    assert list(reversed(s)) == []
+    assert len(list(soscan.sitemap.StreamingSitemap(body))) == 100000
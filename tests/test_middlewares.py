@@ -0,0 +1,76 @@
+import datetime
+import types
+import pytest
+import scrapy.http
+import scrapy.exceptions
+import opersist
+import opersist.crawlledger
+import soscan.middlewares
+
+T0 = datetime.datetime(2021, 3, 1, tzinfo=datetime.timezone.utc)
+LAST_MODIFIED = "Mon, 01 Mar 2021 00:00:00 GMT"
+
+
+class FakeStats(object):
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1, start=0, spider=None):
+        self.values[key] = self.values.get(key, start) + count
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    op = opersist.OPersist(str(tmp_path / "node"))
+    op.open()
+    ledger = opersist.crawlledger.CrawlLedger(op)
+    ledger.recordResponse(
+        "https://example.org/a", 200, T0, etag='"v1"', last_modified=LAST_MODIFIED
+    )
+    ledger.recordContent("https://example.org/a", "a" * 64)
+    ledger.recordResponse("https://example.org/b", 200, T0, etag='"v1"')
+    yield ledger
+    op.close()
+
+
+def fakeSpider(ledger):
+    return types.SimpleNamespace(
+        crawl_ledger=ledger,
+        locOf=lambda r: r.meta.get("redirect_urls", [r.url])[0],
+    )
+
+
+def locRequest(url, lastmod=T0):
+    return scrapy.http.Request(url, meta={"loc_timestamp": lastmod})
+
+
+def test_conditional_request(ledger):
+    mw = soscan.middlewares.SoscanConditionalMiddleware(FakeStats())
+    spider = fakeSpider(ledger)
+    request = locRequest("https://example.org/a")
+    assert mw.process_request(request, spider) is None
+    assert request.headers["If-None-Match"] == b'"v1"'
+    assert request.headers["If-Modified-Since"] == LAST_MODIFIED.encode()
+    # no stored content for b, and sitemap requests are not locs
+    request = locRequest("https://example.org/b")
+    mw.process_request(request, spider)
+    assert "If-None-Match" not in request.headers
+    request = scrapy.http.Request("https://example.org/a")
+    mw.process_request(request, spider)
+    assert "If-None-Match" not in request.headers
+
+
+def test_not_modified(ledger):
+    stats = FakeStats()
+    mw = soscan.middlewares.SoscanConditionalMiddleware(stats)
+    spider = fakeSpider(ledger)
+    later = T0 + datetime.timedelta(days=1)
+    assert not ledger.isUnchanged("https://example.org/a", later)
+    request = locRequest("https://example.org/a", later)
+    response = scrapy.http.Response(request.url, status=304, request=request)
+    with pytest.raises(scrapy.exceptions.IgnoreRequest):
+        mw.process_response(request, response, spider)
+    assert stats.values["conditional/not_modified"] == 1
+    assert ledger.isUnchanged("https://example.org/a", later)
+    response = scrapy.http.Response(request.url, status=200, request=request)
+    assert mw.process_response(request, response, spider) is response
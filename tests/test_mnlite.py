@@ -1,10 +1,265 @@
 import os
+import re
+import json
 import tempfile
+import flask
 import pytest
+import sqlalchemy.event
 import mnlite
+import mnlite.mnode
+import opersist
+import opersist.models.thing
+
+NODE_ID = "urn:node:mn1"
+N_THINGS = 25
+
+
+def buildNode(node_path, n=N_THINGS):
+    """
+    Node with n Things, a page size of 10 and an event log.
+    """
+    os.makedirs(node_path)
+    config = {
+        "node": {
+            "node_id": NODE_ID,
+            "state": "up",
+            "name": "mn1",
+            "description": "Test node",
+            "base_url": "http://localhost/mn1/",
+            "schedule": {
+                "hour": "*",
+                "day": "*",
+                "min": "0",
+                "mon": "*",
+                "sec": "5",
+                "wday": "?",
+                "year": "*",
+            },
+            "subject": NODE_ID,
+            "contact_subject": NODE_ID,
+        },
+        "content_database": "sqlite:///content.db",
+        "log_database": "sqlite:///eventlog.db",
+        "data_folder": "data",
+        "max_page_size": 10,
+        "created": None,
+        "default_submitter": None,
+        "default_owner": None,
+        "spider": {"sitemap_urls": ["http://example.net/sitemap.xml"]},
+    }
+    with open(os.path.join(node_path, "node.json"), "w") as dest:
+        json.dump(config, dest)
+    op = opersist.OPersist(node_path)
+    op.open()
+    op.getSubject(NODE_ID, name="mn1", create_if_missing=True)
+    op.addThingsBatch(
+        [
+            {
+                "obj": json.dumps({"i": i}).encode(),
+                "identifier": f"sha256:{i}",
+                "series_id": f"doi:{i}",
+                "source": f"http://example.net/{i}",
+                "metadata": {},
+                "submitter": NODE_ID,
+                "owner": NODE_ID,
+                "format_id": "science-on-schema.org/Dataset;ld+json",
+                "media_type": "application/ld+json",
+            }
+            for i in range(n)
+        ]
+    )
+    op.close()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    buildNode(str(tmp_path / "nodes" / "mn1"))
+    monkeypatch.setattr(
+        flask.Flask, "auto_find_instance_path", lambda self: str(tmp_path)
+    )
+    app = mnlite.create_app({"TESTING": True})
+    yield app
+    app.config["m_nodes"]["mn1"]["persistence"].close()
 
 
 @pytest.fixture
-def client():
-    pass
+def client(app):
+    return app.test_client()
+
+
+def test_describe(client):
+    res = client.head("/mn1/v2/object/sha256:3")
+    assert res.status_code == 200
+    assert res.headers["DataONE-formatId"] == "science-on-schema.org/Dataset;ld+json"
+    assert res.headers["DataONE-Checksum"].startswith("MD5,")
+    assert re.fullmatch(r'"[0-9a-f]{64}"', res.headers["ETag"])
+    assert res.data == b""
+    res = client.head("/mn1/v2/object/sha256:missing")
+    assert res.status_code == 404
+    assert res.headers["DataONE-Exception-Name"] == "NotFound"
+    assert res.headers["DataONE-Exception-PID"] == "sha256:missing"
+
+
+def test_get_conditional(client):
+    res = client.get("/mn1/v2/object/sha256:3")
+    assert res.status_code == 200
+    assert json.loads(res.data) == {"i": 3}
+    etag = res.headers["ETag"]
+    res = client.get("/mn1/v2/object/sha256:3", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.data == b""
+    res = client.get("/mn1/v2/object/sha256:3", headers={"If-None-Match": '"other"'})
+    assert res.status_code == 200
+
+
+def test_get_meta_conditional(app, client):
+    res = client.get("/mn1/v2/meta/sha256:3")
+    assert res.status_code == 200
+    etag = res.headers["ETag"]
+    res = client.get("/mn1/v2/meta/sha256:3", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.data == b""
+    op = app.config["m_nodes"]["mn1"]["persistence"]
+    op.open()
+    op.setObsoletedBy("sha256:3", "sha256:4")
+    op.removeSession()
+    res = client.get("/mn1/v2/meta/sha256:3", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert "<obsoletedBy>sha256:4</obsoletedBy>" in res.data.decode()
+
+
+def test_get_range(client):
+    res = client.get("/mn1/v2/object/sha256:3", headers={"Range": "bytes=0-3"})
+    assert res.status_code == 206
+    assert res.data == b'{"i"'
+    assert res.headers["Content-Range"].startswith("bytes 0-3/")
+
+
+def test_list_objects_pages(client):
+    seen = []
+    url = "/mn1/v2/object?count=100"
+    pages = 0
+    while url is not None:
+        res = client.get(url)
+        assert res.status_code == 200
+        seen += re.findall(r"<identifier>(.*?)</identifier>", res.data.decode())
+        pages += 1
+        link = res.headers.get("Link")
+        url = None
+        if link is not None:
+            url = re.match(r'<http://localhost(.*)>; rel="next"', link).group(1)
+    # count is capped at max_page_size
+    assert pages == 3
+    assert sorted(seen) == sorted(f"sha256:{i}" for i in range(N_THINGS))
+    res = client.get("/mn1/v2/object?cursor=not-a-cursor")
+    assert res.status_code == 400
+
+
+def test_list_objects_streams(client, monkeypatch):
+    monkeypatch.setattr(mnlite.mnode, "STREAM_BATCH_SIZE", 2)
+    loaded = []
+
+    def onLoad(target, context):
+        loaded.append(target.identifier)
+
+    Thing = opersist.models.thing.Thing
+    sqlalchemy.event.listen(Thing, "load", onLoad)
+    try:
+        res = client.get("/mn1/v2/object?count=10", buffered=False)
+        body = b""
+        for chunk in res.response:
+            body += chunk
+            if b"<objectInfo>" in body:
+                break
+        # rows are read in batches as the document is written
+        assert len(loaded) <= 2
+        for chunk in res.response:
+            body += chunk
+        res.close()
+    finally:
+        sqlalchemy.event.remove(Thing, "load", onLoad)
+    assert len(loaded) == 10
+    assert body.count(b"<objectInfo>") == 10
+    assert b'count="10"' in body
+
+
+def test_get_by_sha256(app, client):
+    op = app.config["m_nodes"]["mn1"]["persistence"]
+    op.open()
+    sha256 = op.getThingPID("sha256:3").checksum_sha256
+    op.removeSession()
+    res = client.get(f"/sha256/{sha256}")
+    assert res.status_code == 200
+    assert json.loads(res.data) == {"i": 3}
+    assert client.get(f"/sha256/{'0' * 64}").status_code == 404
+    op.open()
+    op.removeThing(sha256)
+    op.removeSession()
+    # still in the index, but no longer held by the node
+    assert client.get(f"/sha256/{sha256}").status_code == 404
+
+
+def test_log_records(app, client):
+    for i in range(3):
+        assert client.get(f"/mn1/v2/object/sha256:{i}").status_code == 200
+    app.config["m_nodes"]["mn1"]["persistence"].getEventLog().flush()
+    res = client.get("/mn1/v2/log?event=read&count=2")
+    assert res.status_code == 200
+    d = res.data.decode()
+    assert re.search(r'total="3"', d)
+    assert len(re.findall(r"<logEntry>", d)) == 2
+    link = res.headers["Link"]
+    url = re.match(r'<http://localhost(.*)>; rel="next"', link).group(1)
+    res = client.get(url)
+    assert len(re.findall(r"<logEntry>", res.data.decode())) == 1
+    res = client.get("/mn1/v2/log?event=read&idFilter=sha256:2")
+    assert re.findall(r"<identifier>(.*?)</identifier>", res.data.decode()) == [
+        "sha256:2"
+    ]
+
+
+def test_listing_statements(app, client):
+    op = app.config["m_nodes"]["mn1"]["persistence"]
+    statements = []
+
+    def onExecute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def countStatements(url):
+        statements.clear()
+        res = client.get(url)
+        assert res.status_code == 200
+        return len(statements)
+
+    # open the store before listening
+    assert client.get("/mn1/v2/object?count=1").status_code == 200
+    sqlalchemy.event.listen(op._engine, "before_cursor_execute", onExecute)
+    try:
+        # no per row queries for the related entities
+        for url in ("/mn1/v2/object?count={}", "/mn1/v2/_page?size={}"):
+            small = countStatements(url.format(2))
+            assert small > 0
+            assert countStatements(url.format(5)) == small
+            assert countStatements(url.format(10)) == small
+    finally:
+        sqlalchemy.event.remove(op._engine, "before_cursor_execute", onExecute)
+
 
+def test_node_reload(tmp_path, client, monkeypatch):
+    monkeypatch.setattr(mnlite.mnode, "NODE_CHECK_INTERVAL", 0)
+    res = client.get("/mn1/v2/node")
+    assert res.status_code == 200
+    assert "<name>mn1</name>" in res.data.decode()
+    config_path = str(tmp_path / "nodes" / "mn1" / "node.json")
+    with open(config_path) as src:
+        config = json.load(src)
+    config["node"]["name"] = "renamed"
+    with open(config_path, "w") as dest:
+        json.dump(config, dest)
+    # a distinct mtime even where the file system resolution is coarse
+    mtime = os.stat(config_path).st_mtime + 10
+    os.utime(config_path, (mtime, mtime))
+    res = client.get("/mn1/v2/node")
+    assert res.status_code == 200
+    assert "<name>renamed</name>" in res.data.decode()
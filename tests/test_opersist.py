@@ -0,0 +1,383 @@
+import os
+import datetime
+import sqlite3
+import pytest
+import sqlalchemy.exc
+import opersist
+import opersist.dedup
+import opersist.models.thing
+import opersist.models.thingstats
+import opersist.crawlledger
+import opersist.models
+
+
+@pytest.fixture
+def op(tmp_path):
+    store = opersist.OPersist(str(tmp_path / "node"))
+    store.open()
+    yield store
+    store.close()
+
+
+def batchItem(obj, identifier, series_id=None, **kwargs):
+    item = {
+        "obj": obj,
+        "identifier": identifier,
+        "series_id": series_id,
+        "source": f"https://example.net/{identifier}",
+        "metadata": {},
+    }
+    item.update(kwargs)
+    return item
+
+
+def test_batch_series(op):
+    res = op.addThingsBatch(
+        [
+            batchItem(b'{"a":1}', "sha256:a1", series_id="doi:1"),
+            batchItem(b'{"a":2}', "sha256:a2", series_id="doi:1"),
+        ]
+    )
+    assert [r["error"] for r in res] == [None, None]
+    assert res[0]["thing"].obsoleted_by == "sha256:a2"
+    assert res[1]["thing"].obsoletes == "sha256:a1"
+    res = op.addThingsBatch([batchItem(b'{"a":3}', "sha256:a3", series_id="doi:1")])
+    assert res[0]["thing"].obsoletes == "sha256:a2"
+    assert op.countThings() == 3
+
+
+def test_batch_item_errors(op):
+    res = op.addThingsBatch(
+        [
+            batchItem(b'{"b":1}', "sha256:b1", series_id="doi:2"),
+            batchItem(b'{"b":1}', "sha256:b2"),
+            batchItem(b'{"b":3}', "doi:2"),
+            batchItem(b'{"b":4}', "sha256:b4", source=None),
+        ]
+    )
+    assert res[0]["error"] is None
+    assert res[1]["error"] is not None
+    assert res[2]["error"] is not None
+    assert "source" in res[3]["error"]
+    assert op.countThings() == 1
+
+
+def test_batch_item_new_thing_error(op, monkeypatch):
+    new_thing = op._newThing
+
+    def failingNewThing(sha256, *args, **kwargs):
+        if kwargs.get("identifier") == "sha256:c2":
+            raise ValueError("Bad identifier")
+        return new_thing(sha256, *args, **kwargs)
+
+    monkeypatch.setattr(op, "_newThing", failingNewThing)
+    res = op.addThingsBatch(
+        [batchItem(b'{"c":1}', "sha256:c1"), batchItem(b'{"c":2}', "sha256:c2")]
+    )
+    assert res[0]["error"] is None
+    assert res[1]["error"] == "Bad identifier"
+    assert op.countThings() == 1
+    assert op.getThingPID("sha256:c2") is None
+    # the blob of the rejected item is removed
+    n_blobs = len(list(op._ostore.listAllBlobs()))
+    assert n_blobs == 1
+
+
+def test_add_bytes(op):
+    the_thing = op.addThingBytes(
+        b'{"c":1}', "sha256:c1", source="https://example.net/c1", metadata={}
+    )
+    assert the_thing.size_bytes == 7
+    with open(op.contentAbsPath(the_thing.content), "rb") as src:
+        assert src.read() == b'{"c":1}'
+    blob_dir = os.path.dirname(op.contentAbsPath(the_thing.content))
+    assert not [f for f in os.listdir(blob_dir) if f.endswith(".tmp")]
+
+
+def test_identifier_index(op):
+    op.addThingsBatch(
+        [
+            batchItem(
+                b'{"d":1}',
+                "sha256:d1",
+                series_id="doi:4",
+                alt_identifiers=["https://doi.org/4", "ark:/4"],
+            ),
+        ]
+    )
+    assert op.getThingsIdentifier("ark:/4").first().identifier == "sha256:d1"
+    assert op.getThingsIdentifier("ark:/").first() is None
+    assert op.getThingsSIDOrAltIdentifier("doi:4").identifier == "sha256:d1"
+    match = op.getThingsSIDOrAltIdentifier("doi:x", alt_ids=["https://doi.org/4"])
+    assert match.identifier == "sha256:d1"
+    op.getSession().query(opersist.models.thing.ThingIdentifier).delete()
+    op.commit()
+    assert op.getThingsIdentifier("ark:/4").first() is None
+    assert op.indexThingIdentifiers() == 1
+    assert op.getThingsIdentifier("ark:/4").first().identifier == "sha256:d1"
+    # New stores are marked as indexed, the migration is skipped
+    assert op.migrateThingIdentifiers() == 0
+    conf = op.getConfig()
+    del conf["identifiers_indexed"]
+    op.setConfig(conf)
+    op.getSession().query(opersist.models.thing.ThingIdentifier).delete()
+    op.commit()
+    # as a store created before the index, opened by the server
+    legacy = opersist.OPersist(op.fs_path, engine_profile="serve")
+    legacy.open()
+    try:
+        # things are scanned until the store is migrated
+        assert legacy.getThingsIdentifier("ark:/4").first().identifier == "sha256:d1"
+        assert legacy.getThingsIdentifier("doi:4").first().identifier == "sha256:d1"
+        assert legacy.migrateThingIdentifiers() == 1
+        assert legacy.migrateThingIdentifiers() == 0
+        assert legacy.getThingsIdentifier("ark:/").first() is None
+    finally:
+        legacy.close()
+    assert op.getConfig()["identifiers_indexed"]
+    # indexing directly, as the index command does, also records completion
+    conf = op.getConfig()
+    del conf["identifiers_indexed"]
+    op.setConfig(conf)
+    other = opersist.OPersist(op.fs_path)
+    other.open()
+    try:
+        assert other.indexThingIdentifiers(rebuild=True) == 1
+        assert other.migrateThingIdentifiers() == 0
+    finally:
+        other.close()
+    assert op.getConfig()["identifiers_indexed"]
+    op.removeThing(op.getThingPID("sha256:d1").checksum_sha256)
+    assert op.getSession().query(opersist.models.thing.ThingIdentifier).count() == 0
+
+
+def test_dedup_index(op):
+    op.addThingsBatch(
+        [
+            batchItem(
+                b'{"e":1}', "sha256:e1", series_id="doi:5", alt_identifiers=["ark:/5"]
+            )
+        ]
+    )
+    index = opersist.dedup.DedupIndex(op, refresh_interval=3600)
+    index.refresh()
+    assert index.match("doi:5").identifier == "sha256:e1"
+    assert index.match("doi:x", ["ark:/5"]).identifier == "sha256:e1"
+    assert index.match("doi:6") is None
+    op.addThingsBatch([batchItem(b'{"e":2}', "sha256:e2", series_id="doi:6")])
+    assert not index.mayContain("doi:6")
+    assert index.refresh() == 1
+    assert index.match("doi:6").identifier == "sha256:e2"
+
+
+def test_thing_stats(op):
+    op.addThingsBatch(
+        [
+            batchItem(b'{"f":1}', "sha256:f1", format_id="science-on-schema.org/Dataset;ld+json"),
+            batchItem(b'{"f":2}', "sha256:f2", format_id="eml://ecoinformatics.org/eml-2.1.1"),
+        ]
+    )
+    assert op.countThings() == 2
+    assert op.countThingsFiltered(format_id="science-on-schema.org") == 1
+    stats = op.basicStatsThings()
+    assert stats["count"] == 2 and stats["oldest"] != ""
+    the_thing = op.getThingPID("sha256:f1")
+    assert op.countThingsFiltered(from_date=the_thing.date_modified) == 2
+    assert op.countThingsFiltered(to_date=the_thing.date_modified) == 0
+    op.removeThing(the_thing.checksum_sha256)
+    assert op.countThings() == 1
+    assert op.basicStatsThings()["count"] == 1
+    assert op.rebuildThingStats() == 1
+    assert op.countThings() == 1
+
+
+def test_thing_stats_two_writers(op):
+    other = opersist.OPersist(op.fs_path, engine_profile="harvest")
+    other.open()
+    try:
+        for i in range(3):
+            op.addThingsBatch([batchItem(f'{{"w":{i}}}'.encode(), f"sha256:w{i}")])
+            other.addThingsBatch([batchItem(f'{{"o":{i}}}'.encode(), f"sha256:o{i}")])
+        assert op.countThings() == 6
+        assert other.countThings() == 6
+        assert op.basicStatsThings()["oldest"] != ""
+    finally:
+        other.close()
+
+
+def test_thing_stats_default_format(op):
+    op.addThingsBatch(
+        [batchItem(b'{"n":1}', "sha256:n1"), batchItem(b'{"n":2}', "sha256:n2")]
+    )
+    # rows written without a format_id, counted in the default bucket
+    T = opersist.models.thing.Thing.__table__
+    op.getSession().execute(T.update().values(format_id=None))
+    op.commit()
+    op.getSession().expire_all()
+    the_thing = op.getThingPID("sha256:n1")
+    assert the_thing.format_id is None
+    # partial days are counted from the thing table
+    assert op.countThingsFiltered(
+        format_id="application/octet-stream", from_date=the_thing.date_modified
+    ) == 2
+    op.removeThing(the_thing.checksum_sha256)
+    bounds = list(op._staleStatsBounds())
+    assert len(bounds) == 1 and bounds[0][1] is not None
+    assert op.basicStatsThings()["oldest"] != ""
+
+
+def test_thing_stats_missing(op):
+    op.addThingsBatch(
+        [batchItem(f'{{"m":{i}}}'.encode(), f"sha256:m{i}") for i in range(3)]
+    )
+    # as in a store created before thing_stats existed
+    op.getSession().query(opersist.models.thingstats.ThingStats).delete()
+    op.commit()
+    server = opersist.OPersist(op.fs_path, engine_profile="serve")
+    server.open()
+    try:
+        assert server.countThings() == 3
+        stats = server.basicStatsThings()
+        assert stats["count"] == 3 and stats["oldest"] != ""
+        assert server.getSession().query(opersist.models.thingstats.ThingStats).count() == 0
+    finally:
+        server.close()
+    assert op.rebuildThingStats() == 3
+    assert op.countThings() == 3
+
+
+def test_sysmeta_cache(op):
+    op.addThingsBatch([batchItem(b'{"g":1}', "sha256:g1")])
+    the_thing = op.getThingPID("sha256:g1")
+    cache = op.sysmeta_cache
+    cache.on_disk = True
+    cache.put(the_thing.checksum_sha256, the_thing.date_modified, "<sysmeta/>")
+    cache.clear()
+    assert cache.get(the_thing.checksum_sha256, the_thing.date_modified) == "<sysmeta/>"
+    op.setObsoletedBy("sha256:g1", "sha256:g2")
+    assert cache.get(the_thing.checksum_sha256, the_thing.date_modified) is None
+
+
+def test_crawl_ledger(op):
+    t0 = datetime.datetime(2021, 3, 1, tzinfo=datetime.timezone.utc)
+    later = t0 + datetime.timedelta(days=1)
+    ledger = opersist.crawlledger.CrawlLedger(op, batch_size=2)
+    ledger.startCrawl("https://example.org/sitemap.xml")
+    ledger.recordResponse("https://example.org/a", 200, t0, etag='"v1"')
+    ledger.recordResponse("https://example.org/b", 200, t0)
+    ledger.recordResponse("https://example.org/c", 404, t0)
+    ledger.recordContent("https://example.org/a", "a" * 64)
+    ledger.finishCrawl({"finish_time": later})
+    ledger = opersist.crawlledger.CrawlLedger(op)
+    assert ledger.load() == 3
+    assert ledger.isUnchanged("https://example.org/a", t0)
+    assert not ledger.isUnchanged("https://example.org/a", later)
+    # retrieved without stored content, or failed
+    assert not ledger.isUnchanged("https://example.org/b", t0)
+    assert not ledger.isUnchanged("https://example.org/c", t0)
+    assert not ledger.isUnchanged("https://example.org/d", t0)
+    assert ledger.validators("https://example.org/a") == {"etag": '"v1"'}
+    assert ledger.validators("https://example.org/b") is None
+    ledger.recordNotModified("https://example.org/a", later)
+    assert ledger.isUnchanged("https://example.org/a", later)
+    ledger.recordResponse("https://example.org/a", 200, later)
+    assert not ledger.isUnchanged("https://example.org/a", later)
+
+
+def lockError():
+    return sqlalchemy.exc.OperationalError(
+        "COMMIT", {}, sqlite3.OperationalError("database is locked")
+    )
+
+
+@pytest.mark.parametrize("name", sorted(opersist.models.ENGINE_PROFILES))
+def test_engine_profile_pragmas(tmp_path, name):
+    profile = opersist.models.ENGINE_PROFILES[name]
+    store = opersist.OPersist(str(tmp_path / "node"), engine_profile=name)
+    store.open()
+    try:
+        with store._engine.connect() as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode").scalar()
+            busy_timeout = conn.execute("PRAGMA busy_timeout").scalar()
+    finally:
+        store.close()
+    assert journal_mode.lower() == profile["journal_mode"].lower()
+    assert busy_timeout == profile["busy_timeout"]
+
+
+def test_batch_lock_retries(tmp_path, monkeypatch):
+    store = opersist.OPersist(str(tmp_path / "node"), engine_profile="harvest")
+    store.open()
+    delays = []
+    commits = []
+    rollbacks = []
+    monkeypatch.setattr(opersist, "sleep", delays.append)
+
+    def lockedCommit():
+        commits.append(1)
+        raise lockError()
+
+    rollback = store._session.rollback
+
+    def countedRollback():
+        rollbacks.append(1)
+        rollback()
+
+    monkeypatch.setattr(store, "commit", lockedCommit)
+    monkeypatch.setattr(store._session, "rollback", countedRollback)
+    res = store.addThingsBatch([batchItem(b'{"c":1}', "sha256:c1")])
+    retries = store._profile["write_retries"]
+    assert len(commits) == retries + 1
+    assert len(rollbacks) == retries + 1
+    assert delays == [store._retryDelay(i) for i in range(retries)]
+    # doubling from retry_delay, capped at retry_max_delay
+    assert delays == [0.5, 1.0, 2.0, 4.0, 8.0]
+    assert "locked" in res[0]["error"]
+    assert res[0]["thing"] is None
+    assert store.countThings() == 0
+    assert len(list(store._ostore.listAllBlobs())) == 0
+    store.close()
+
+
+def test_crawl_ledger_lock_retries(op, monkeypatch):
+    t0 = datetime.datetime(2021, 3, 1, tzinfo=datetime.timezone.utc)
+    monkeypatch.setitem(op._profile, "write_retries", 2)
+    delays = []
+    writes = []
+    rollbacks = []
+    monkeypatch.setattr(opersist.crawlledger.time, "sleep", delays.append)
+    rollback = op._session.rollback
+
+    def countedRollback():
+        rollbacks.append(1)
+        rollback()
+
+    monkeypatch.setattr(op._session, "rollback", countedRollback)
+    ledger = opersist.crawlledger.CrawlLedger(op)
+    write = ledger._write
+    locked = {"writes": 2}
+
+    def lockedWrite(pending):
+        writes.append(1)
+        if len(writes) <= locked["writes"]:
+            raise lockError()
+        write(pending)
+
+    monkeypatch.setattr(ledger, "_write", lockedWrite)
+    ledger.recordResponse("https://example.org/a", 200, t0)
+    ledger.flush()
+    assert len(writes) == 3
+    assert len(rollbacks) == 2
+    assert delays == [op._retryDelay(0), op._retryDelay(1)]
+    assert opersist.crawlledger.CrawlLedger(op).load() == 1
+    # after write_retries the pending entries are rolled back and dropped
+    writes.clear()
+    rollbacks.clear()
+    delays.clear()
+    locked["writes"] = 10
+    ledger.recordResponse("https://example.org/b", 200, t0)
+    ledger.flush()
+    assert len(writes) == 3
+    assert len(rollbacks) == 3
+    assert len(delays) == 2
+    assert opersist.crawlledger.CrawlLedger(op).load() == 1
@@ -0,0 +1,82 @@
+import pytest
+import opersist
+import mnlite.shaindex
+
+
+def addThing(op, obj, identifier):
+    res = op.addThingsBatch(
+        [
+            {
+                "obj": obj,
+                "identifier": identifier,
+                "source": f"https://example.net/{identifier}",
+                "metadata": {},
+            }
+        ]
+    )
+    return res[0]["thing"].checksum_sha256
+
+
+@pytest.fixture
+def m_nodes(tmp_path):
+    nodes = {}
+    for name in ("mn1", "mn2"):
+        op = opersist.OPersist(str(tmp_path / name))
+        op.open()
+        nodes[name] = {"persistence": op}
+    yield nodes
+    for mn_config in nodes.values():
+        mn_config["persistence"].close()
+
+
+def test_lookup(m_nodes):
+    op1 = m_nodes["mn1"]["persistence"]
+    op2 = m_nodes["mn2"]["persistence"]
+    digests = {}
+    for i in range(20):
+        digests[addThing(op1, f'{{"a":{i}}}'.encode(), f"a{i}")] = "mn1"
+        digests[addThing(op2, f'{{"b":{i}}}'.encode(), f"b{i}")] = "mn2"
+    index = mnlite.shaindex.Sha256Index(m_nodes, refresh_interval=3600)
+    assert index.build() == 40
+    assert len(index._buffer) == 40 * mnlite.shaindex.RECORD_SIZE
+    for sha256, mn_name in digests.items():
+        assert index.lookup(sha256) == mn_name
+        assert index.lookup(sha256.upper()) == mn_name
+    assert index.lookup("0" * 64) is None
+    assert index.lookup("f" * 64) is None
+    assert index.lookup("not hex") is None
+    assert index.lookup("abcd") is None
+
+
+def test_added_after_build(m_nodes):
+    op2 = m_nodes["mn2"]["persistence"]
+    first = addThing(op2, b'{"c":1}', "c1")
+    index = mnlite.shaindex.Sha256Index(m_nodes, refresh_interval=0)
+    assert index.build() == 1
+    added = addThing(op2, b'{"c":2}', "c2")
+    # a miss reads the things added since the build
+    assert index.lookup(added) == "mn2"
+    assert index._recent == {bytes.fromhex(added): "mn2"}
+    assert len(index) == 2
+    assert index.lookup(first) == "mn2"
+    # misses are only refreshed once per refresh_interval
+    index.refresh_interval = 3600
+    index._last_refresh = float("inf")
+    late = addThing(op2, b'{"c":3}', "c3")
+    assert index.lookup(late) is None
+    index.refresh_interval = 0
+    index._last_refresh = 0
+    assert index.lookup(late) == "mn2"
+
+
+def test_removed(m_nodes):
+    op1 = m_nodes["mn1"]["persistence"]
+    sha256 = addThing(op1, b'{"d":1}', "d1")
+    index = mnlite.shaindex.Sha256Index(m_nodes, refresh_interval=0)
+    index.build()
+    op1.removeThing(sha256)
+    # the entry remains until the next build, the node no longer has the thing
+    assert index.lookup(sha256) == "mn1"
+    assert op1.getThingSha256(sha256) is None
+    assert index.build() == 0
+    assert index.lookup(sha256) is None
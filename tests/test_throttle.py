@@ -0,0 +1,103 @@
+import time
+import email.utils
+import types
+import pytest
+import scrapy.http
+import soscan.throttle
+
+
+class FakeStats(object):
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1, start=0, spider=None):
+        self.values[key] = self.values.get(key, start) + count
+
+    def max_value(self, key, value, spider=None):
+        self.values[key] = max(self.values.get(key, value), value)
+
+
+def fakeThrottle(concurrency=1, delay=1.0, **kwargs):
+    slot = types.SimpleNamespace(concurrency=concurrency, delay=delay)
+    downloader = types.SimpleNamespace(slots={"repo": slot}, total_concurrency=1)
+    crawler = types.SimpleNamespace(
+        engine=types.SimpleNamespace(downloader=downloader), stats=FakeStats()
+    )
+    return soscan.throttle.SoscanAdaptiveThrottle(crawler, **kwargs), slot
+
+
+def respond(throttle, status=200, latency=0.1, headers=None):
+    request = scrapy.http.Request(
+        "https://example.org/a",
+        meta={"download_slot": "repo", "download_latency": latency},
+    )
+    response = scrapy.http.Response(
+        request.url, status=status, headers=headers, request=request
+    )
+    throttle.response_downloaded(response, request, None)
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("120", 120.0),
+        (b"30", 30.0),
+        (" 5 ", 5.0),
+        ("-3", 0.0),
+        (None, None),
+        ("soon", None),
+        ("", None),
+    ],
+)
+def test_retry_after_seconds(value, expected):
+    assert soscan.throttle.retryAfterSeconds(value) == expected
+
+
+def test_retry_after_date():
+    future = email.utils.formatdate(time.time() + 100, usegmt=True)
+    assert 95 <= soscan.throttle.retryAfterSeconds(future) <= 100
+    past = email.utils.formatdate(time.time() - 100, usegmt=True)
+    assert soscan.throttle.retryAfterSeconds(past) == 0.0
+
+
+def test_first_response_clamps_slot():
+    throttle, slot = fakeThrottle(
+        concurrency=16, delay=0, min_concurrency=2, max_concurrency=4, min_delay=0.5
+    )
+    respond(throttle, latency=10)
+    # clamped to the bounds, then one step back for the slow response
+    assert slot.concurrency == 3
+    assert slot.delay == 0.625
+    throttle, slot = fakeThrottle(concurrency=1, delay=120, max_delay=60)
+    respond(throttle, latency=None)
+    assert slot.concurrency == 1
+    assert slot.delay == 60
+
+
+def test_step_up():
+    throttle, slot = fakeThrottle(concurrency=1, delay=1.0, max_concurrency=3)
+    for _ in range(50):
+        respond(throttle)
+    assert slot.concurrency == 3
+    assert slot.delay == throttle.min_delay
+    assert throttle.crawler.stats.values["throttle/max_concurrency"] == 3
+
+
+def test_backoff():
+    throttle, slot = fakeThrottle(concurrency=4, delay=0.25)
+    respond(throttle, status=429, headers={"Retry-After": "10"})
+    assert slot.concurrency == 2
+    assert slot.delay == 10
+    assert throttle.crawler.stats.values["throttle/backoff"] == 1
+    # no step up until the Retry-After period has passed
+    for _ in range(10):
+        respond(throttle)
+    assert slot.concurrency == 2
+    assert slot.delay == 10
+    respond(throttle, status=503)
+    assert slot.concurrency == 1
+    assert slot.delay == 20
+    throttle._slots["repo"].backoff_until = 0
+    for _ in range(50):
+        respond(throttle)
+    assert slot.concurrency > 1
@@ -0,0 +1,36 @@
+import datetime
+import dateparser
+import opersist.utils
+
+
+def test_parse_timestamp():
+    utc = datetime.timezone.utc
+    assert opersist.utils.parseTimestamp("2024-03-06T10:11:12Z") == datetime.datetime(
+        2024, 3, 6, 10, 11, 12, tzinfo=utc
+    )
+    assert opersist.utils.parseTimestamp(b"2024-03-06T10:11:12.5-05:00") == datetime.datetime(
+        2024, 3, 6, 15, 11, 12, 500000, tzinfo=utc
+    )
+    assert opersist.utils.parseTimestamp("2024-03-06").tzinfo is not None
+    # not W3C, parsed by dateparser
+    assert opersist.utils.parseTimestamp("March 6, 2024 10:11 UTC") == datetime.datetime(
+        2024, 3, 6, 10, 11, tzinfo=utc
+    )
+    assert opersist.utils.parseTimestamp("2024-02-30") is None
+
+
+def test_parse_timestamp_relative(monkeypatch):
+    assert opersist.utils.parseTimestamp("2 hours ago") is not None
+    calls = []
+
+    def parse(ds, settings=None):
+        calls.append(ds)
+        return datetime.datetime(2024, 3, 6, tzinfo=datetime.timezone.utc)
+
+    monkeypatch.setattr(dateparser, "parse", parse)
+    # relative values are parsed again on every call
+    opersist.utils.parseTimestamp("2 hours ago")
+    opersist.utils.parseTimestamp("2 hours ago")
+    assert calls == ["2 hours ago", "2 hours ago"]
+    opersist.utils.parseTimestamp("2024-03-06T10:11:12Z")
+    assert len(calls) == 2